@@ -0,0 +1,96 @@
+""" Compare two benchmark result files written by run_benchmarks.py.
+
+	Usage: python compare.py baseline.json candidate.json [threshold]
+
+	Throughput is better when higher, times, memory and errors listed below
+	are better when lower. Changes worse than threshold (default 0.1, i.e.
+	10%) are flagged as regressions. Count metrics describe the work done
+	and must be equal, any change is flagged. Other metrics are ignored
+"""
+import json
+import sys
+
+higherIsBetter = ('throughput',)
+lowerIsBetter = ('total', 'update', 'add', 'select', 'peakMemory', 'peakMemoryDelta', 'rmsError', 'meanError')
+lowerIsBetterGroups = ('stages', 'stagesP95')
+countMetrics = ('numTracks', 'numSelected', 'numMeasurements')
+
+def _direction(metric):
+	""" Returns 'higher', 'lower', 'equal' or None for metrics not compared
+
+	"""
+	parts = metric.split('.')
+	if parts[-1] in countMetrics:
+		return 'equal'
+	if parts[-1] in higherIsBetter:
+		return 'higher'
+	if parts[-1] in lowerIsBetter or (len(parts) > 1 and parts[-2] in lowerIsBetterGroups):
+		return 'lower'
+	return None
+
+def _flatten(metrics, prefix=''):
+	flat = {}
+	for key, value in metrics.items():
+		if isinstance(value, dict):
+			flat.update(_flatten(value, f"{prefix}{key}."))
+		elif isinstance(value, (int, float)) and not isinstance(value, bool):
+			flat[f"{prefix}{key}"] = float(value)
+	return flat
+
+def _caseKey(result):
+	return result['benchmark'], json.dumps(result['params'], sort_keys=True)
+
+def compare(baseline, candidate, threshold=0.1):
+	""" Returns list of (benchmark, params, metric, old, new, ratio, regressed)
+
+	"""
+	baseCases = {_caseKey(r): r for r in baseline['results'] if r['status'] == 'ok'}
+
+	rows = []
+	for result in candidate['results']:
+		key = _caseKey(result)
+		if result['status'] != 'ok' or key not in baseCases:
+			continue
+
+		old = _flatten(baseCases[key]['metrics'])
+		new = _flatten(result['metrics'])
+		for metric in sorted(old.keys() & new.keys()):
+			direction = _direction(metric)
+			if direction is None:
+				continue
+
+			if direction == 'equal':
+				ratio = new[metric] / old[metric] if old[metric] != 0 else float('nan')
+				regressed = new[metric] != old[metric]
+			elif old[metric] == 0:
+				continue
+			else:
+				ratio = new[metric] / old[metric]
+				regressed = ratio < 1 - threshold if direction == 'higher' else ratio > 1 + threshold
+
+			rows.append((key[0], key[1], metric, old[metric], new[metric], ratio, regressed))
+
+	return rows
+
+if __name__ == '__main__':
+	with open(sys.argv[1], mode='r') as f:
+		baseline = json.load(f)
+	with open(sys.argv[2], mode='r') as f:
+		candidate = json.load(f)
+	threshold = float(sys.argv[3]) if len(sys.argv) > 3 else 0.1
+
+	print(f"Baseline {baseline['commit']} ({baseline['created']}), candidate {candidate['commit']} ({candidate['created']})")
+
+	rows = compare(baseline, candidate, threshold)
+	for benchmark, params, metric, old, new, ratio, regressed in rows:
+		if not regressed:
+			flag = ''
+		elif _direction(metric) == 'equal':
+			flag = 'MISMATCH'
+		else:
+			flag = 'REGRESSION'
+		print(f"{benchmark:16s} {params:60s} {metric:24s} {old:12.4g} {new:12.4g} {ratio:8.3f} {flag}")
+
+	numRegressions = sum(r[-1] for r in rows)
+	print(f"{numRegressions} regressions in {len(rows)} metrics")
+	sys.exit(1 if numRegressions > 0 else 0)
@@ -0,0 +1,322 @@
+""" Headless benchmarks for the LSPIV pipeline stages on synthetic data.
+
+	Usage: python run_benchmarks.py [small|medium|large] [output.json]
+
+	Each case runs in a fresh process so peak memory is per case. Results
+	are written as json, compare two result files with compare.py
+"""
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+from context import lspiv_toolkit
+
+from lspiv_toolkit.config import PipelineConfig, ApproximationConfig
+from lspiv_toolkit.filtering.tracks import TrackDB, ColumnarTrackDB
+from lspiv_toolkit.filtering.measurements import MeasurementDB, ArrayMeasurementDB, arraysToMeasurements
+
+from primitives.grid import Grid
+
+from synthetic import ChannelFlow, SyntheticCamera, SyntheticDataset, syntheticTracks
+
+scales = {
+	'small': {'frameSizes': [(640, 360)], 'numFrames': 60, 'trackCounts': [1000],
+				'measurementCounts': [20000], 'gridDims': [(120, 54)], 'approxTracks': [200]},
+	'medium': {'frameSizes': [(640, 360), (1280, 720)], 'numFrames': 120, 'trackCounts': [1000, 5000],
+				'measurementCounts': [100000], 'gridDims': [(120, 54), (240, 108)], 'approxTracks': [500, 1000]},
+	'large': {'frameSizes': [(1280, 720), (1920, 1080)], 'numFrames': 300, 'trackCounts': [5000, 20000],
+				'measurementCounts': [100000, 500000], 'gridDims': [(240, 108), (480, 216)], 'approxTracks': [1000, 4000]},
+}
+
+# Every approximationMethod of ApproximationConfig
+approximationMethods = ('simple', 'coregionalized', 'sparse', 'integral', 'online', 'tiled')
+
+def _peakMemory():
+	""" Peak resident set size of this process in bytes
+
+	"""
+	peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+	return peak if sys.platform == 'darwin' else peak * 1024
+
+def benchSlimPipeline(imgSize, numFrames, trackStorage='list', detectionThreads=0):
+	from lspiv_toolkit.pipeline.lspiv import SlimPipeline
+
+	with tempfile.TemporaryDirectory() as outputDir:
+		config = PipelineConfig('synthetic', outputDir)
+		config.detectionGridDim = (imgSize[0] // 32, imgSize[1] // 24)
+		config.maxCellFeatures = max(config.maxFeatures // (config.detectionGridDim[0] * config.detectionGridDim[1]), 1)
+		config.borderBuffer = 10
+		config.trackStorage = trackStorage
+		config.detectionThreads = detectionThreads
+		config.consoleInterval = 0
+
+		data = SyntheticDataset(imgSize, numFrames)
+
+		startTime = time.perf_counter()
+		pipeline = SlimPipeline(config, data)
+		pipeline.initialize()
+		pipeline.run()
+		totalTime = time.perf_counter() - startTime
+
+		summary = pipeline.monitor.summary()
+
+	return {'total': totalTime, 'throughput': summary['numFrames'] / totalTime,
+			'stages': {stage: stats['mean'] for stage, stats in summary['stages'].items()},
+			'stagesP95': {stage: stats.get('p95', 0.0) for stage, stats in summary['stages'].items()},
+			'numTracks': pipeline.trackDB.getNumHistoricalTracks()}
+
+def benchTrackDB(storage, numTracks, numFrames, fps=30.0, lossRate=0.01):
+	""" Track update throughput with a synthetic tracker that moves every
+		endpoint with the flow and loses a fraction of tracks per frame
+
+	"""
+	imgSize = (1920, 1080)
+	flow = ChannelFlow(imgSize)
+	rng = np.random.default_rng(0)
+
+	if storage == 'columnar':
+		tDB = ColumnarTrackDB(minAge=0.5, minDisplacement=10, capacity=numTracks)
+	else:
+		tDB = TrackDB(minAge=0.5, minDisplacement=10)
+
+	tDB.addNewPoints(rng.uniform((0, 0), imgSize, size=(numTracks, 2)), 0.0)
+
+	updateTime = 0.0
+	startTime = time.perf_counter()
+	for frame in range(1, numFrames):
+		timestamp = frame / fps
+		endPoints = np.asarray(tDB.getActiveEndpoints()).reshape(-1, 2)
+		newPoints = endPoints + flow.velocity(endPoints) / fps
+		lost = rng.random(len(newPoints)) < lossRate
+
+		if storage == 'columnar':
+			newPoints[lost] = np.nan
+		else:
+			newPoints = [None if l else p for p, l in zip(newPoints, lost)]
+
+		updateStart = time.perf_counter()
+		tDB.updateActiveTracks(newPoints, timestamp)
+		updateTime += time.perf_counter() - updateStart
+
+		# Replenish like detection would
+		numMissing = numTracks - tDB.getNumActiveTracks()
+		if numMissing > 0:
+			tDB.addNewPoints(rng.uniform((0, 0), imgSize, size=(numMissing, 2)), timestamp)
+
+	tDB.terminateActiveTracks()
+	totalTime = time.perf_counter() - startTime
+
+	return {'total': totalTime, 'update': updateTime / (numFrames - 1),
+			'throughput': numTracks * (numFrames - 1) / updateTime,
+			'numTracks': tDB.getNumHistoricalTracks()}
+
+def benchMeasurementDB(storage, numMeasurements, gridDim, binCapacity=100):
+	imgSize = (1920, 1080)
+	rng = np.random.default_rng(0)
+
+	points = rng.uniform((0, 0), imgSize, size=(numMeasurements, 2))
+	vectors = rng.normal(size=(numMeasurements, 2))
+	scores = -rng.uniform(0, 10, size=numMeasurements)
+	ids = rng.integers(0, numMeasurements // 50 + 1, size=numMeasurements)
+
+	if storage == 'array':
+		mDB = ArrayMeasurementDB(imgSize, gridDim, binCapacity, 'max')
+		addStart = time.perf_counter()
+		mDB.addMeasurementArrays(points, vectors, scores, ids)
+	else:
+		mDB = MeasurementDB(Grid(*imgSize, *gridDim), binCapacity, 'max')
+		measurements = arraysToMeasurements(points, vectors, scores, ids)
+		addStart = time.perf_counter()
+		mDB.addMeasurements(measurements)
+	addTime = time.perf_counter() - addStart
+
+	selectStart = time.perf_counter()
+	selected = mDB.getMeasurements(1)
+	selectTime = time.perf_counter() - selectStart
+
+	return {'add': addTime, 'select': selectTime, 'throughput': numMeasurements / addTime,
+			'numSelected': len(selected)}
+
+def benchApproximation(method, numTracks, gridDim, numPoints=90):
+	""" ApproximationPipeline run with approximationMethod method on
+		synthetic tracks with known flow, saved as the raw training set of
+		a temporary input folder. The synthetic camera has no distortion
+		and the flow is symmetric about mid height, so the field is
+		compared with the flow at the same points
+
+	"""
+	from lspiv_toolkit.pipeline.approx import ApproximationPipeline
+	from lspiv_toolkit.storage.archive import TrackBatch
+	from lspiv_toolkit.analysis.integrate import sampleField
+
+	imgSize = (1280, 720)
+	flow = ChannelFlow(imgSize)
+	timings = {}
+
+	with tempfile.TemporaryDirectory() as inputDir:
+		startTime = time.perf_counter()
+		os.makedirs(f"{inputDir}/tracks/raw")
+		syntheticTracks(flow, imgSize, numTracks, numPoints).save(f"{inputDir}/tracks/raw/tracks{TrackBatch.extension}")
+		timings['tracks'] = time.perf_counter() - startTime
+
+		config = ApproximationConfig(inputDir)
+		config.approximationMethod = method
+		config.measurementGridDim = gridDim
+		config.measurementStorage = 'array'
+		config.kernelParams = {'lengthScale': 100.0, 'signalVariance': 100.0, 'noiseVariance': 1.0}
+		config.tileGridDim = (4, 2)
+
+		stageTime = time.perf_counter()
+		pipeline = ApproximationPipeline(config, SyntheticCamera(imgSize))
+		pipeline.initialize()
+		pipeline.run()
+		field = pipeline.fieldApprox
+		timings['run'] = time.perf_counter() - stageTime
+
+		# Error against the known flow on a regular grid of query points
+		queryX, queryY = np.meshgrid(np.linspace(0, imgSize[0], 64), np.linspace(0, imgSize[1], 36))
+		queries = np.column_stack((queryX.ravel(), queryY.ravel()))
+
+		stageTime = time.perf_counter()
+		estimates = sampleField(field, queries)
+		timings['sample'] = time.perf_counter() - stageTime
+
+		totalTime = time.perf_counter() - startTime
+
+	error = np.linalg.norm(estimates - flow.velocity(queries), axis=1)
+
+	return {'total': totalTime, 'stages': timings, 'throughput': numTracks * numPoints / timings['run'],
+			'numSelected': len(pipeline.trainingMeasurements), 'rmsError': float(np.sqrt(np.mean(error**2)))}
+
+def benchDrift(integration, numTracks, numPoints=90, numFieldTracks=50):
+	""" Drift analysis of synthetic test tracks through a GP field fit to
+		a separate set of synthetic tracks, evaluating one track at a time
+		with DriftAnalysis or all tracks in lockstep
+
+	"""
+	from lspiv_toolkit.approx.online import OnlineGPApproximator
+	from field_toolkit.analysis.drift import DriftAnalysis
+	from lspiv_toolkit.analysis.integrate import LockstepDriftAnalysis
+
+	imgSize = (1280, 720)
+	flow = ChannelFlow(imgSize)
+	config = ApproximationConfig('.')
+	timings = {}
+
+	startTime = time.perf_counter()
+	measurements = []
+	for t in syntheticTracks(flow, imgSize, numFieldTracks, numPoints, seed=1).toTracks():
+		measurements.extend(t.measureVelocity(**config.getMeasurementParams(), **config.measurementMethodParams))
+
+	approximator = OnlineGPApproximator([0, imgSize[0], 0, imgSize[1]], lengthScale=100.0, signalVariance=100.0, noiseVariance=1.0)
+	approximator.addMeasurements(measurements[::10])
+	field = approximator.approximate()
+	tracks = syntheticTracks(flow, imgSize, numTracks, numPoints)
+	timings['setup'] = time.perf_counter() - startTime
+
+	stageTime = time.perf_counter()
+	if integration == 'lockstep':
+		results = LockstepDriftAnalysis(field).evaluateBatch(tracks)
+	else:
+		da = DriftAnalysis(field)
+		results = [da.evaluate(t, mass=0.00001) for t in tracks.toTracks()]
+	timings['integrate'] = time.perf_counter() - stageTime
+
+	return {'total': time.perf_counter() - startTime, 'stages': timings,
+			'throughput': numTracks * numPoints / timings['integrate'],
+			'meanError': float(np.mean([np.mean(errors) for simTrack, x, y, errors, normErrors in results]))}
+
+benchmarks = {'slim_pipeline': benchSlimPipeline, 'track_db': benchTrackDB,
+			'measurement_db': benchMeasurementDB, 'approximation': benchApproximation,
+			'drift': benchDrift}
+
+def _runCase(name, params):
+	baseline = _peakMemory()
+	metrics = benchmarks[name](**params)
+	metrics['peakMemory'] = _peakMemory()
+	metrics['peakMemoryDelta'] = metrics['peakMemory'] - baseline
+	return metrics
+
+def buildCases(scale):
+	s = scales[scale]
+	cases = []
+
+	for imgSize in s['frameSizes']:
+		for storage in ('list', 'columnar'):
+			cases.append(('slim_pipeline', {'imgSize': imgSize, 'numFrames': s['numFrames'], 'trackStorage': storage}))
+		cases.append(('slim_pipeline', {'imgSize': imgSize, 'numFrames': s['numFrames'], 'trackStorage': 'columnar',
+										'detectionThreads': 4}))
+
+	for numTracks in s['trackCounts']:
+		for storage in ('list', 'columnar'):
+			cases.append(('track_db', {'storage': storage, 'numTracks': numTracks, 'numFrames': s['numFrames']}))
+
+	for numMeasurements in s['measurementCounts']:
+		for gridDim in s['gridDims']:
+			for storage in ('sorted', 'array'):
+				cases.append(('measurement_db', {'storage': storage, 'numMeasurements': numMeasurements, 'gridDim': gridDim}))
+
+	for numTracks in s['approxTracks']:
+		for method in approximationMethods:
+			cases.append(('approximation', {'method': method, 'numTracks': numTracks, 'gridDim': s['gridDims'][0]}))
+		for integration in ('serial', 'lockstep'):
+			cases.append(('drift', {'integration': integration, 'numTracks': numTracks}))
+
+	return cases
+
+def _commit():
+	try:
+		return subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=os.path.dirname(os.path.abspath(__file__)),
+										stderr=subprocess.DEVNULL).decode('utf-8').strip()
+	except (OSError, subprocess.CalledProcessError):
+		return None
+
+def runBenchmarks(scale='small', outputFile=None):
+	commit = _commit()
+	results = {'created': time.strftime('%Y-%m-%d %H:%M:%S'), 'commit': commit, 'scale': scale,
+				'python': platform.python_version(), 'numpy': np.__version__,
+				'platform': platform.platform(), 'cpuCount': os.cpu_count(), 'results': []}
+
+	cases = buildCases(scale)
+	for i, (name, params) in enumerate(cases):
+		print(f"[{i+1}/{len(cases)}] {name} {params}")
+
+		# Fresh process per case so peak memory is not shared between cases
+		with ProcessPoolExecutor(max_workers=1, mp_context=get_context('spawn')) as executor:
+			try:
+				metrics = executor.submit(_runCase, name, params).result()
+				status = 'ok'
+			except Exception as e:
+				metrics = {'error': repr(e)}
+				status = 'failed'
+
+		results['results'].append({'benchmark': name, 'params': params, 'status': status, 'metrics': metrics})
+		if status == 'ok':
+			print("\tok: " + ', '.join(f"{k}={v:.4g}" for k, v in metrics.items() if isinstance(v, (int, float))))
+		else:
+			print(f"\tfailed: {metrics['error']}")
+
+	if outputFile is None:
+		resultsDir = f"{os.path.dirname(os.path.abspath(__file__))}/results"
+		os.makedirs(resultsDir, exist_ok=True)
+		outputFile = f"{resultsDir}/{scale}_{(commit or 'unknown')[:8]}_{time.strftime('%Y_%m_%d_%H_%M_%S')}.json"
+
+	with open(outputFile, mode='w') as f:
+		json.dump(results, f, indent=4)
+
+	print(f"Results written to {outputFile}")
+	return results
+
+if __name__ == '__main__':
+	scale = sys.argv[1] if len(sys.argv) > 1 else 'small'
+	outputFile = os.path.abspath(sys.argv[2]) if len(sys.argv) > 2 else None
+	runBenchmarks(scale, outputFile)
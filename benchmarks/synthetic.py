@@ -0,0 +1,152 @@
+import cv2
+import yaml
+import numpy as np
+
+from lspiv_toolkit.storage.archive import TrackBatch
+
+class ChannelFlow(object):
+	""" Steady channel flow along the x axis with a parabolic profile
+		across the image, fastest at mid height and still at the edges
+
+	"""
+
+	def __init__(self, imgSize, maxSpeed=60.0):
+		self._width, self._height = imgSize
+		self._maxSpeed = maxSpeed
+
+	def speed(self, y):
+		""" Speed in px/s along x at image row y
+
+		"""
+		halfHeight = self._height / 2
+		return self._maxSpeed * np.clip(1.0 - ((y - halfHeight) / halfHeight)**2, 0.0, None)
+
+	def velocity(self, points):
+		""" Velocity (vx, vy) in px/s at each row of points
+
+		"""
+		points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+		return np.column_stack((self.speed(points[:, 1]), np.zeros(len(points))))
+
+class SyntheticCamera(object):
+	""" Stand in for a camera without lens distortion, saveable alongside
+		outputs. Undistortion with it leaves points unchanged
+
+	"""
+
+	def __init__(self, imgSize):
+		self.imgSize = tuple(imgSize)
+
+		width, height = imgSize
+		self.camMatrix = np.array([[width, 0.0, width / 2], [0.0, width, height / 2], [0.0, 0.0, 1.0]])
+		self.distCoeffs = np.zeros(4)
+
+	def save(self, filename):
+		with open(filename, mode='w') as f:
+			yaml.dump({'imgSize': list(self.imgSize), 'synthetic': True}, f)
+
+class SyntheticDataset(object):
+	""" Frame sequence of a random texture advected by a known flow. Since
+		the flow is steady and along x, frame t is the texture with each row
+		shifted by speed(y) * t, so frames are exact and cheap to render.
+		Mirrors the parts of the Dataset interface used by SlimPipeline
+
+	"""
+
+	def __init__(self, imgSize=(1280, 720), numFrames=90, fps=30.0, maxSpeed=60.0, seed=0):
+		self._imgSize = tuple(imgSize)
+		self._numFrames = numFrames
+		self._fps = fps
+		self._flow = ChannelFlow(imgSize, maxSpeed)
+
+		width, height = imgSize
+		rng = np.random.default_rng(seed)
+
+		# Blurred noise with sparse bright speckles gives plenty of corners
+		texture = rng.uniform(0, 255, (height, width)).astype(np.float32)
+		texture = cv2.GaussianBlur(texture, (0, 0), 2.0)
+		speckles = rng.random((height, width)) < 0.002
+		texture[speckles] = 255.0
+		self._texture = cv2.GaussianBlur(texture, (0, 0), 1.0)
+
+		self._gridX, self._mapY = np.meshgrid(np.arange(width, dtype=np.float32), np.arange(height, dtype=np.float32))
+		self._rowSpeed = self._flow.speed(self._mapY[:, :1]).astype(np.float32)
+
+		self._mask = np.full((height, width), 255, dtype=np.uint8)
+		self._camera = SyntheticCamera(imgSize)
+		self._frame = 0
+
+	def render(self, timestamp):
+		mapX = self._gridX - self._rowSpeed * np.float32(timestamp)
+		gray = cv2.remap(self._texture, mapX, self._mapY, cv2.INTER_LINEAR, borderMode=cv2.BORDER_WRAP)
+		return cv2.cvtColor(np.clip(gray, 0, 255).astype(np.uint8), cv2.COLOR_GRAY2BGR)
+
+	def read(self):
+		timestamp = self._frame / self._fps
+		self._frame += 1
+		return self.render(timestamp), timestamp
+
+	def more(self):
+		return self._frame < self._numFrames
+
+	def reset(self):
+		self._frame = 0
+
+	def seek(self, frame):
+		""" Continue reading at frame without rendering the frames before it
+
+		"""
+		self._frame = frame
+
+	def save(self, filename):
+		with open(filename, mode='w') as f:
+			yaml.dump({'imgSize': list(self._imgSize), 'numFrames': self._numFrames, 'fps': self._fps}, f)
+
+	@property
+	def progress(self):
+		return 100.0 * self._frame / self._numFrames
+
+	@property
+	def mask(self):
+		return self._mask
+
+	@property
+	def imgSize(self):
+		return self._imgSize
+
+	@property
+	def name(self):
+		return f"synthetic_{self._imgSize[0]}x{self._imgSize[1]}"
+
+	@property
+	def camera(self):
+		return self._camera
+
+	@property
+	def flow(self):
+		return self._flow
+
+def syntheticTracks(flow, imgSize, numTracks, numPoints, fps=30.0, noise=0.1, seed=0):
+	""" TrackBatch of particles advected through flow from uniformly random
+		start points, with gaussian position noise of noise pixels
+
+	"""
+	rng = np.random.default_rng(seed)
+	width, height = imgSize
+
+	starts = rng.uniform((0, 0), (width, height), size=(numTracks, 2))
+	startTimes = rng.uniform(0, 10, size=numTracks)
+
+	# Flow is steady and along x so particles keep their row
+	steps = np.arange(numPoints) / fps
+	x = starts[:, 0, np.newaxis] + flow.speed(starts[:, 1])[:, np.newaxis] * steps
+	y = np.repeat(starts[:, 1, np.newaxis], numPoints, axis=1)
+
+	positions = np.stack((x, y), axis=2).reshape(-1, 2)
+	positions += rng.normal(scale=noise, size=positions.shape)
+	times = (startTimes[:, np.newaxis] + steps).ravel()
+
+	offsets = np.arange(numTracks + 1, dtype=np.int64) * numPoints
+	ids = np.arange(numTracks, dtype=np.int64)
+
+	return TrackBatch(ids, offsets, times, positions, {'synthetic': True})
@@ -14,10 +14,10 @@ from field_toolkit.analysis.drift import DriftAnalysis
 from viz_toolkit.view import OverlayView, FieldOverlayView
 
 from cv_toolkit.data import Dataset
-from cv_toolkit.transform.camera import UndistortionTransform
-from cv_toolkit.transform.common import PixelCoordinateTransform
 
 from lspiv_toolkit.config import PipelineConfig
+from lspiv_toolkit.transform.camera import CameraTransform
+from lspiv_toolkit.transform.cache import CameraTransformCache
 from lspiv_toolkit.filtering.measurements import MeasurementDB
 
 """ Want to process output from pipeline runs
@@ -31,6 +31,8 @@ from lspiv_toolkit.filtering.measurements import MeasurementDB
 
 # Parse output folder
 outputDir = os.path.abspath(sys.argv[1])
+# Transform with lookup tables cached under the output folder if requested
+cacheTransforms = '--cache-transforms' in sys.argv
 
 # Create output file names
 trackPlotFilename = f"{outputDir}/track_plot.pdf"
@@ -46,8 +48,10 @@ data = Dataset.from_file(config.datasetFile)
 imageView = OverlayView(grid=None)
 
 # Setup transformation objects
-undistortTransform = UndistortionTransform(data.camera)
-pxTransform = PixelCoordinateTransform(data.imgSize)
+if cacheTransforms:
+	camTrans = CameraTransformCache(data.camera, f"{outputDir}/transform_cache", data.imgSize)
+else:
+	camTrans = CameraTransform(data.camera, data.imgSize)
 
 # Load training tracks
 trackDir = f"{outputDir}/tracks/good"
@@ -55,13 +59,11 @@ trackFiles = sorted(glob.glob(f"{trackDir}/track_*.yaml"))
 tracks = [Track.from_file(t) for t in trackFiles]
 
 # Unwarp tracks
-undistortedTracks = [undistortTransform.transformTrack(t) for t in tracks]
-transformedTracks = [pxTransform.transformTrack(t) for t in undistortedTracks]
+transformedTracks = camTrans.transformTracks(tracks)
 
 # Load and transform background image
 img, timestamp = data.read()
-undistortedImg = undistortTransform.transformImage(img)
-transformedImg = pxTransform.transformImage(undistortedImg)
+transformedImg = camTrans.transformImage(img)
 
 # Initialize field approximator
 gp = field_approx.gp.GPApproximator()
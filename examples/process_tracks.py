@@ -15,14 +15,16 @@ from field_toolkit.analysis.drift import DriftAnalysis
 from viz_toolkit.view import OverlayView, FieldOverlayView
 
 from cv_toolkit.data import Dataset
-from cv_toolkit.transform.camera import UndistortionTransform
-from cv_toolkit.transform.common import PixelCoordinateTransform
 
 from lspiv_toolkit.config import PipelineConfig
+from lspiv_toolkit.transform.camera import CameraTransform
+from lspiv_toolkit.transform.cache import CameraTransformCache
 from lspiv_toolkit.filtering.measurements import MeasurementDB
 
 # Parse output folder
 outputDir = os.path.abspath(sys.argv[1])
+# Transform with lookup tables cached under the output folder if requested
+cacheTransforms = '--cache-transforms' in sys.argv
 
 # Create output file names
 trackPlotFilename = f"{outputDir}/raw_track_plot.pdf"
@@ -38,8 +40,10 @@ data = Dataset.from_file(config.datasetFile)
 imageView = OverlayView(grid=None)
 
 # Setup transformation objects
-undistortTransform = UndistortionTransform(data.camera)
-pxTransform = PixelCoordinateTransform(data.imgSize)
+if cacheTransforms:
+	camTrans = CameraTransformCache(data.camera, f"{outputDir}/transform_cache", data.imgSize)
+else:
+	camTrans = CameraTransform(data.camera, data.imgSize)
 
 # Load training tracks
 print("Loading track files...")
@@ -49,13 +53,12 @@ tracks = np.asarray([Track.from_file(t) for t in trackFiles])
 
 # Unwarp tracks
 print("Transforming Tracks...")
-transformedTracks = np.asarray([pxTransform.transformTrack(undistortTransform.transformTrack(t)) for t in tracks])
+transformedTracks = np.asarray(camTrans.transformTracks(tracks))
 
 # Load and transform background image
 print("Plotting all tracks...")
 img, timestamp = data.read()
-undistortedImg = undistortTransform.transformImage(img)
-transformedImg = pxTransform.transformImage(undistortedImg)
+transformedImg = camTrans.transformImage(img)
 
 # Add image background
 imageView.updateImage(transformedImg, timestamp)
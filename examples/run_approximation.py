@@ -15,10 +15,10 @@ from field_toolkit.analysis.drift import DriftAnalysis
 from viz_toolkit.view import OverlayView, FieldOverlayView
 
 from cv_toolkit.data import Dataset
-from cv_toolkit.transform.camera import UndistortionTransform
-from cv_toolkit.transform.common import PixelCoordinateTransform
 
 from lspiv_toolkit.config import PipelineConfig, ApproximationConfig
+from lspiv_toolkit.transform.camera import CameraTransform
+from lspiv_toolkit.transform.cache import CameraTransformCache
 from lspiv_toolkit.filtering.measurements import MeasurementDB
 
 
@@ -60,8 +60,11 @@ print("Intializing necessary processing, approximation, and analysis components.
 imgDB = Dataset.from_file(config.datasetFile)
 
 # Setup transformation objects
-unTrans = UndistortionTransform(imgDB.camera)
-pxTrans = PixelCoordinateTransform(imgDB.imgSize)
+if approxConfig.cacheTransforms:
+	cacheDir = approxConfig.transformCacheDir or f"{outputDir}/transform_cache"
+	camTrans = CameraTransformCache(imgDB.camera, cacheDir, imgDB.imgSize)
+else:
+	camTrans = CameraTransform(imgDB.camera, imgDB.imgSize)
 
 # Initialize specified field approximator
 if approxConfig.approximationMethod == 'simple':
@@ -95,8 +98,7 @@ print("Images...")
 img, timestamp = imgDB.read()
 
 # Undistort image and transform for plotting
-warpImg = unTrans.transformImage(img)
-transImg = pxTrans.transformImage(warpImg)
+transImg = camTrans.transformImage(img)
 
 # Load tracks from disk (may take some time if there are alot)
 print("Training Track Data...")
@@ -104,7 +106,7 @@ trainingFiles = glob.glob(f"{trainingDataDir}/track_*.yaml")
 trainTracks = Track.from_file_list(trainingFiles)
 
 # Unwarp tracks for processing and plotting
-trainTracksWarped = pxTrans.transformTracks(unTrans.transformTracks(trainTracks))
+trainTracksWarped = camTrans.transformTracks(trainTracks)
 
 
 """
@@ -0,0 +1,19 @@
+import sys
+
+from context import lspiv_toolkit
+
+from lspiv_toolkit.pipeline.batch import BatchRunner
+from lspiv_toolkit.config import PipelineConfig
+
+if __name__ == '__main__':
+	# Usage: run_batch.py config.yaml "datasets/*.yaml" [numWorkers]
+	config = PipelineConfig.from_file(sys.argv[1])
+
+	numWorkers = None
+	if len(sys.argv) > 3:
+		numWorkers = int(sys.argv[3])
+
+	runner = BatchRunner.from_glob(config, sys.argv[2], numWorkers)
+	runner.run()
+
+	print(f"Batch manifest saved to {runner.batchDir}/manifest.json")
\ No newline at end of file
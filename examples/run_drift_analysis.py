@@ -10,21 +10,22 @@ from primitives.track import Track
 from primitives.grid import Grid
 
 import field_toolkit.approx as field_approx
-from field_toolkit.analysis.drift import DriftAnalysis
-from field_toolkit.core.fields import VectorField
 
 from viz_toolkit.view import OverlayView, FieldOverlayView
 
 from cv_toolkit.data import Dataset
-from cv_toolkit.transform.camera import UndistortionTransform
-from cv_toolkit.transform.common import PixelCoordinateTransform
 
 from lspiv_toolkit.config import PipelineConfig, ApproximationConfig
+from lspiv_toolkit.transform.camera import CameraTransform
+from lspiv_toolkit.transform.cache import CameraTransformCache
 from lspiv_toolkit.filtering.measurements import MeasurementDB
+from lspiv_toolkit.analysis.drift import DriftEvaluator
 
 
 # Parse output folder and generate other folder names
 outputDir = os.path.abspath(sys.argv[1])
+# Transform with lookup tables cached under the output folder if requested
+cacheTransforms = '--cache-transforms' in sys.argv
 trackDir = f"{outputDir}/tracks"
 testTrackDir = f"{trackDir}/test"
 trainTrackDir = f"{trackDir}/train"
@@ -33,8 +34,11 @@ evalTrackDir = f"{trackDir}/eval"
 # Parse field filename
 fieldFile = os.path.abspath(sys.argv[2])
 
-# Load field
-field = VectorField.from_file(fieldFile)
+# Optional number of drift workers (0 uses all cores), plotting skipped with --no-plot
+# and --lockstep batches the field queries of all particles of a worker
+numWorkers = int(sys.argv[3]) if len(sys.argv) > 3 and sys.argv[3].isdigit() else 0
+plotResults = '--no-plot' not in sys.argv
+method = 'lockstep' if '--lockstep' in sys.argv else 'driftAnalysis'
 
 # Load config file
 configFile = f"{outputDir}/config.yaml"
@@ -47,51 +51,46 @@ data = Dataset.from_file(config.datasetFile)
 imageView = OverlayView(grid=None)
 
 # Setup transformation objects
-unTrans = UndistortionTransform(data.camera)
-pxTrans = PixelCoordinateTransform(data.imgSize)
+if cacheTransforms:
+	camTrans = CameraTransformCache(data.camera, f"{outputDir}/transform_cache", data.imgSize)
+else:
+	camTrans = CameraTransform(data.camera, data.imgSize)
 
 # Load tracks
 testTrackFiles = glob.glob(f"{testTrackDir}/track_*.yaml")
 testTracks = Track.from_file_list(testTrackFiles)
 
 # Unwarp tracks
-warpedTestTracks = [unTrans.transformTrack(t) for t in testTracks]
-transformedTestTracks = [pxTrans.transformTrack(t) for t in warpedTestTracks]
-
-# Load and transform background image
-img, timestamp = data.read()
-undistortedImg = unTrans.transformImage(img)
-transformedImg = pxTrans.transformImage(undistortedImg)
-
-# Setup visualization of drift analysis
-driftView = OverlayView(grid=None)
-driftView.updateImage(transformedImg, timestamp)
-
-# Run Drift analysis on known tracks
-da = DriftAnalysis(field)
-
-# Initialize lists to store different metrics for each track
-meanErrors = []
-maxErrors = []
-meanNormErrors = []
-maxNormErrors = []
-
-for t in transformedTestTracks:
-	print(f"Processing Test track {t.id}...")
-	simTrack, x, y, errors, normErrors = da.evaluate(t, mass=0.00001)
-
-	meanErrors.append(np.mean(errors))
-	maxErrors.append(np.max(errors))
-	meanNormErrors.append(np.mean(normErrors))
-	maxNormErrors.append(np.max(normErrors))
-
-	driftView.plotTracks([t,simTrack], [(0.,1.,0.), (1.,0.,0.)])
-	driftView.plotAnnotatedLine(x,y)
-	driftView.plot()
+transformedTestTracks = camTrans.transformTracks(testTracks)
+
+# Run drift analysis on known tracks in worker processes
+evaluator = DriftEvaluator(fieldFile, mass=0.00001, numWorkers=numWorkers, method=method)
+results = evaluator.evaluate(transformedTestTracks)
+
+for row in results.table():
+	print(f"Test track {row['id']}: mean {row['meanError']:.3f} max {row['maxError']:.3f} "
+		f"normalized mean {row['meanNormError']:.3f} max {row['maxNormError']:.3f}")
+
+summary = results.summary()
+print(f"Mean over {summary['numTracks']} tracks ({summary['method']}): mean {summary['meanError']:.3f} max {summary['maxError']:.3f} "
+	f"normalized mean {summary['meanNormError']:.3f} max {summary['maxNormError']:.3f}")
 
-print(meanErrors, np.mean(meanErrors))
-print(maxErrors, np.mean(maxErrors))
-print(meanNormErrors, np.mean(meanNormErrors))
-print(maxNormErrors, np.mean(maxNormErrors))
+results.save(f"{outputDir}/eval_drift_analysis.csv")
+results.saveErrors(f"{outputDir}/eval_drift_errors.npz")
 
-driftView.save(f"{outputDir}/eval_drift_analysis.pdf")
\ No newline at end of file
+if plotResults:
+	# Load and transform background image
+	img, timestamp = data.read()
+	transformedImg = camTrans.transformImage(img)
+
+	# Setup visualization of drift analysis
+	driftView = OverlayView(grid=None)
+	driftView.updateImage(transformedImg, timestamp)
+
+	for t in transformedTestTracks:
+		r = results[t.id]
+		driftView.plotTracks([t, results.simulatedTrack(t.id)], [(0.,1.,0.), (1.,0.,0.)])
+		driftView.plotAnnotatedLine(r['x'], r['y'])
+
+	driftView.plot()
+	driftView.save(f"{outputDir}/eval_drift_analysis.pdf")
@@ -10,17 +10,18 @@ from primitives.track import Track
 from primitives.grid import Grid
 
 import field_toolkit.approx as field_approx
-from field_toolkit.analysis.drift import DriftAnalysis
 from field_toolkit.core.fields import VectorField
 
 from viz_toolkit.view import OverlayView, FieldOverlayView
 
 from cv_toolkit.data import Dataset
-from cv_toolkit.transform.camera import UndistortionTransform
-from cv_toolkit.transform.common import PixelCoordinateTransform
 
 from lspiv_toolkit.config import PipelineConfig, ApproximationConfig
+from lspiv_toolkit.transform.camera import CameraTransform
+from lspiv_toolkit.transform.cache import CameraTransformCache
 from lspiv_toolkit.filtering.measurements import MeasurementDB
+from lspiv_toolkit.approx.online import OnlineGPApproximator
+from lspiv_toolkit.analysis.drift import DriftEvaluator
 
 
 """
@@ -64,8 +65,11 @@ print("Intializing necessary processing, approximation, and analysis components.
 imgDB = Dataset.from_file(config.datasetFile)
 
 # Setup transformation objects
-unTrans = UndistortionTransform(imgDB.camera)
-pxTrans = PixelCoordinateTransform(imgDB.imgSize)
+if approxConfig.cacheTransforms:
+	cacheDir = approxConfig.transformCacheDir or f"{outputDir}/transform_cache"
+	camTrans = CameraTransformCache(imgDB.camera, cacheDir, imgDB.imgSize)
+else:
+	camTrans = CameraTransform(imgDB.camera, imgDB.imgSize)
 
 # Initialize specified field approximator
 if approxConfig.approximationMethod == 'simple':
@@ -76,6 +80,8 @@ elif approxConfig.approximationMethod == 'sparse':
 	gp = field_approx.gp.SparseGPApproximator()
 elif approxConfig.approximationMethod == 'integral':
 	gp = field_approx.gp.IntegralGPApproximator()
+elif approxConfig.approximationMethod == 'online':
+	gp = OnlineGPApproximator([0, imgDB.imgSize[0], 0, imgDB.imgSize[1]], **approxConfig.getOnlineParams())
 else:
 	print("Error: Unknown approximation method")
 	exit()
@@ -87,9 +93,6 @@ measurementsPerCell = approxConfig.measurementsPerCell
 # Initialize measurement filtering database
 mDB = MeasurementDB(measurementGrid, measurementsPerCell)
 
-# Initialize drift analysis tool
-da = DriftAnalysis()
-
 
 """
 	Load data from disk and process for usage
@@ -101,8 +104,7 @@ print("Images...")
 img, timestamp = imgDB.read()
 
 # Undistort image and transform for plotting
-warpImg = unTrans.transformImage(img)
-transImg = pxTrans.transformImage(warpImg)
+transImg = camTrans.transformImage(img)
 
 # Load tracks from disk (may take some time if there are alot)
 print("Training Track Data...")
@@ -116,9 +118,9 @@ evalFiles = glob.glob(f"{evalDataDir}/track_*.yaml")
 evalTracks = Track.from_file_list(evalFiles)
 
 # Unwarp tracks for processing and plotting
-trainTracksWarped = [pxTrans.transformTrack(unTrans.transformTrack(t)) for t in trainTracks]
-testTracksWarped = [pxTrans.transformTrack(unTrans.transformTrack(t))  for t in testTracks]
-evalTracksWarped = [pxTrans.transformTrack(unTrans.transformTrack(t))  for t in evalTracks]
+trainTracksWarped = camTrans.transformTracks(trainTracks)
+testTracksWarped = camTrans.transformTracks(testTracks)
+evalTracksWarped = camTrans.transformTracks(evalTracks)
 
 
 """
@@ -147,6 +149,7 @@ for t in trainTracksWarped:
 	mDB.addMeasurements(t.measureVelocity(scoring=approxConfig.scoringMethod))
 
 trainMeasurements = mDB.getMeasurements()
+mDB.snapshot('training')
 
 # Run GPR
 if len(trainMeasurements) > 0:
@@ -194,11 +197,14 @@ ax = fig.add_subplot(111)
 
 # Run drift analysis with test data
 print("Running drift analysis with test data...")
-da.updateField(approxField)
+results = DriftEvaluator(f"{trainingResultsDir}/approx.field", mass=0.00001).evaluate(testTracksWarped)
+results.save(f"{trainingResultsDir}/drift_analysis.csv")
 
 for t in testTracksWarped:
 	print(f"Processing test track {t.id}...")
-	simTrack, x, y, errors, normErrors = da.evaluate(t, mass=0.00001)
+	r = results[t.id]
+	simTrack, x, y = results.simulatedTrack(t.id), r['x'], r['y']
+	errors, normErrors = r['errors'], r['normErrors']
 
 	ax.plot(t.times[-len(normErrors):], normErrors, color='red', label='Normalized Error')
 	ax.plot(t.times, errors, label='Error')
@@ -230,10 +236,19 @@ print("Extracting evaluation measurements")
 for t in evalTracksWarped:
 	mDB.addMeasurements(t.measureVelocity(scoring=approxConfig.scoringMethod))
 
-augmentedMeasurements = mDB.getMeasurements()
+# Only bins touched by evaluation tracks are reselected
+addedMeasurements, removedMeasurements = mDB.getMeasurementDelta('training')
+print(f"Evaluation tracks added {len(addedMeasurements)} and replaced {len(removedMeasurements)} training measurements")
 
-# Run GPR
-if len(augmentedMeasurements) > 0:
+removedIDs = set(map(id, removedMeasurements))
+augmentedMeasurements = [m for m in trainMeasurements if id(m) not in removedIDs] + addedMeasurements
+
+# Run GPR, online approximator applies delta to its factorization, others
+# do not support removing measurements so refit
+if isinstance(gp, OnlineGPApproximator):
+	gp.updateMeasurements(addedMeasurements, removedMeasurements)
+	approxField = gp.approximate()
+elif len(addedMeasurements) > 0 or len(removedMeasurements) > 0:
 	gp.clearMeasurements()
 	gp.addMeasurements(augmentedMeasurements)
 	approxField = gp.approximate()
@@ -272,10 +287,13 @@ fieldView.save(f"{evalResultsDir}/y_field_variance.pdf")
 
 # Run drift analysis with test data
 print("Running drift analysis with test data...")
-da.updateField(approxField)
+results = DriftEvaluator(f"{evalResultsDir}/approx.field", mass=0.00001).evaluate(testTracksWarped)
+results.save(f"{evalResultsDir}/drift_analysis.csv")
 
 for t in testTracksWarped:
-	simTrack, x, y, errors, normErrors = da.evaluate(t, mass=0.00001)
+	r = results[t.id]
+	simTrack, x, y = results.simulatedTrack(t.id), r['x'], r['y']
+	errors, normErrors = r['errors'], r['normErrors']
 
 	ax.plot(t.times[-len(normErrors):], normErrors, color='red', label='Normalized Error')
 	ax.plot(t.times, errors, label='Error')
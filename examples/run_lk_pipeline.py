@@ -1,3 +1,5 @@
+import sys
+
 from context import lspiv_toolkit
 
 from lspiv_toolkit.pipeline import SlimPipeline
@@ -9,7 +11,11 @@ if __name__ == '__main__':
 
 	pipeline = SlimPipeline(config)
 
-	pipeline.initialize()
+	# Continue an interrupted run from its latest checkpoint if a run dir is given
+	if len(sys.argv) > 1:
+		pipeline.resume(sys.argv[1])
+	else:
+		pipeline.initialize()
 	pipeline.run()
 	pipeline.saveTracks()
 
@@ -16,14 +16,17 @@ from field_toolkit.analysis.drift import DriftAnalysis
 from viz_toolkit.view import OverlayView, FieldOverlayView
 
 from cv_toolkit.data import Dataset
-from cv_toolkit.transform.camera import UndistortionTransform
-from cv_toolkit.transform.common import PixelCoordinateTransform
 
 from lspiv_toolkit.config import PipelineConfig, ApproximationConfig
+from lspiv_toolkit.transform.camera import CameraTransform
+from lspiv_toolkit.transform.cache import CameraTransformCache
 from lspiv_toolkit.filtering.measurements import MeasurementDB
+from lspiv_toolkit.storage.reader import TrackReader
 
 # Parse output directory
 outputDir = os.path.abspath(sys.argv[1])
+# Transform with lookup tables cached under the output folder if requested
+cacheTransforms = '--cache-transforms' in sys.argv
 
 # Load pipeline config
 configFile = f"{outputDir}/config.yaml"
@@ -33,13 +36,14 @@ config = PipelineConfig.from_file(configFile)
 data = Dataset.from_file(config.datasetFile)
 
 # Setup transformation objects
-unTrans = UndistortionTransform(data.camera)
-pxTrans = PixelCoordinateTransform(data.imgSize)
+if cacheTransforms:
+	camTrans = CameraTransformCache(data.camera, f"{outputDir}/transform_cache", data.imgSize)
+else:
+	camTrans = CameraTransform(data.camera, data.imgSize)
 
 # Load tracks
 trackDir = f"{outputDir}/tracks"
-trackFiles = glob.glob(f"{trackDir}/simple_coverage/track_*.yaml")
-tracks = Track.from_file_list(trackFiles)
+tracks = TrackReader(f"{trackDir}/simple_coverage")
 
 
 # Setup partition boundaries along x axis
@@ -51,21 +55,24 @@ for dirName in trackFolders:
 	if not os.path.exists(dirName):
 		os.makedirs(dirName)
 
+# Transformed tracks are kept for plotting each partition
+transTracksByID = {}
 for t in tracks:
-	transTrack = pxTrans.transformTrack(unTrans.transformTrack(t))
+	transTrack = camTrans.transformTrack(t)
+	transTracksByID[t.id] = transTrack
 	startTime, startPoint = transTrack.getFirstObservation()
 	endTime, endPoint = transTrack.getLastObservation()
 
 	startBin = np.searchsorted(boundaries, startPoint[0], side="right")-1
 	endBin = np.searchsorted(boundaries, endPoint[0], side="right")-1
 
-	trackPartitions[trackFolders[startBin]].append(t)
+	trackPartitions[trackFolders[startBin]].append(t.id)
 
-	if startBin == endBin:
-		t.save(f"{trackFolders[startBin]}/track_{t.id}.yaml")
-	else:
+	if startBin != endBin:
 		print("Track spans multiple bins, saving to starting bin...")
-		t.save(f"{trackFolders[startBin]}/track_{t.id}.yaml")
+
+for folder, ids in trackPartitions.items():
+	tracks.export(folder, ids, extension='.yaml')
 
 print("Done partitioning tracks. Plotting each partition...")
 
@@ -74,12 +81,11 @@ imageView = OverlayView(grid=None)
 
 # Add image background
 img, timestamp = data.read()
-undistortedImg = unTrans.transformImage(img)
-transformedImg = pxTrans.transformImage(undistortedImg)
+transformedImg = camTrans.transformImage(img)
 imageView.updateImage(transformedImg, timestamp)
 
 for folder in trackFolders:
-	transTracks = np.asarray([pxTrans.transformTrack(unTrans.transformTrack(t)) for t in trackPartitions[folder]])
+	transTracks = np.asarray([transTracksByID[tID] for tID in trackPartitions[folder]])
 
 	imageView.plotTracks(transTracks, labelled=True)
 	imageView.setTitle(f"Tracks in {folder} bin")
@@ -13,14 +13,20 @@ from field_toolkit.core.fields import VectorField
 from field_toolkit.analysis.drift import DriftAnalysis
 
 from cv_toolkit.data import Dataset
-from cv_toolkit.transform.camera import UndistortionTransform
-from cv_toolkit.transform.common import PixelCoordinateTransform
 
 from lspiv_toolkit.config import PipelineConfig, ApproximationConfig
+from lspiv_toolkit.transform.camera import CameraTransform
+from lspiv_toolkit.transform.cache import CameraTransformCache
 from lspiv_toolkit.filtering.measurements import MeasurementDB
+from lspiv_toolkit.filtering.coverage import CoverageSelector
+from lspiv_toolkit.storage.reader import TrackReader
 
-# Parse output directory
+# Parse output directory and optional budget on number of tracks
 outputDir = os.path.abspath(sys.argv[1])
+maxTracks = int(sys.argv[2]) if len(sys.argv) > 2 and sys.argv[2].isdigit() else None
+
+# Transform with lookup tables cached under the output folder if requested
+cacheTransforms = '--cache-transforms' in sys.argv
 
 # Load pipeline config
 configFile = f"{outputDir}/config.yaml"
@@ -30,15 +36,15 @@ config = PipelineConfig.from_file(configFile)
 data = Dataset.from_file(config.datasetFile)
 
 # Setup transformation objects
-unTrans = UndistortionTransform(data.camera)
-pxTrans = PixelCoordinateTransform(data.imgSize)
+if cacheTransforms:
+	camTrans = CameraTransformCache(data.camera, f"{outputDir}/transform_cache", data.imgSize)
+else:
+	camTrans = CameraTransform(data.camera, data.imgSize)
 
-# Load tracks
-print("Loading tracks...")
+# Index tracks, they are only loaded from disk when accessed
+print("Indexing tracks...")
 trackDir = f"{outputDir}/tracks/good"
-trackFiles = glob.glob(f"{trackDir}/track_*.yaml")
-tracks = Track.from_file_list(trackFiles)
-trackDict = {t.id: t for t in tracks}
+tracks = TrackReader(trackDir)
 
 # Initialize measurement filtering database
 measurementGrid = Grid(*data.imgSize, 384, 216)
@@ -48,18 +54,22 @@ mDB = MeasurementDB(measurementGrid, measurementBinCapacity)
 
 # Extract and filter measurements
 print("Extracting measurements...")
-for t in trackDict.values():
-	unwarpedTrack = pxTrans.transformTrack(unTrans.transformTrack(t))
+for t in tracks:
+	unwarpedTrack = camTrans.transformTrack(t)
 	mDB.addMeasurements(unwarpedTrack.measureVelocity(scoring='time'))
 
+# Greedily pick the tracks that cover the most cells, a track covers every
+# cell where it has a retained measurement
 print("Computing measurement coverage...")
-measurementCoverage = mDB.getUniqueCoverage(measurementsPerCell)
+selector = CoverageSelector.from_measurement_db(mDB, measurementsPerCell=measurementsPerCell)
+selection = selector.select(maxTracks=maxTracks)
+measurementCoverage = [tID for tID, gain in selection]
+
+print(f"Selected {len(selection)} of {selector.numTracks} tracks covering {sum(gain for tID, gain in selection)} of {selector.numCells} cells")
+for tID, gain in selection:
+	print(f"Track {tID}: +{gain} cells")
 
 # Save track coverage to folder
 print("Saving tracks...")
 coverageDir = f"{outputDir}/tracks/unique_coverage"
-if not os.path.exists(coverageDir):
-	os.makedirs(coverageDir)
-
-for tID in measurementCoverage:
-	trackDict[tID].save(f"{coverageDir}/track_{tID}.yaml")
\ No newline at end of file
+tracks.export(coverageDir, measurementCoverage, extension='.yaml')
\ No newline at end of file
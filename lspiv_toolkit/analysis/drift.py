@@ -0,0 +1,185 @@
+import csv
+import os
+import numpy as np
+
+from concurrent.futures import ProcessPoolExecutor
+
+from field_toolkit.analysis.drift import DriftAnalysis
+
+from ..approx.raster import loadField
+from ..storage.archive import TrackBatch, buildTrack
+from .integrate import LockstepDriftAnalysis
+
+# Per process drift analysis, set up by initializer
+_worker = {}
+
+def _initDriftWorker(fieldFile, mass, method='driftAnalysis'):
+	field = loadField(fieldFile)
+	if method == 'lockstep':
+		_worker['da'] = LockstepDriftAnalysis(field)
+	else:
+		_worker['da'] = DriftAnalysis(field)
+	_worker['mass'] = mass
+	_worker['method'] = method
+
+def _driftResult(track, simTrack, x, y, errors, normErrors):
+	return {'id': track.id, 'errors': np.asarray(errors, dtype=np.float64),
+			'normErrors': np.asarray(normErrors, dtype=np.float64),
+			'simTimes': np.asarray(simTrack.times, dtype=np.float64),
+			'simPositions': np.asarray(simTrack.positions, dtype=np.float64).reshape(-1, 2),
+			'x': np.asarray(x), 'y': np.asarray(y)}
+
+def _evaluateShard(shard):
+	""" Evaluate all tracks of a TrackBatch shard against the worker field
+
+	"""
+	da = _worker['da']
+	tracks = [shard.getTrack(i) for i in range(len(shard))]
+
+	if _worker['method'] == 'lockstep':
+		outputs = da.evaluateBatch(tracks, mass=_worker['mass'])
+	else:
+		outputs = [da.evaluate(track, mass=_worker['mass']) for track in tracks]
+
+	return [_driftResult(track, *output) for track, output in zip(tracks, outputs)]
+
+class DriftResults(object):
+	""" Per track drift errors from a DriftEvaluator run with aggregate
+		metrics over all tracks
+
+	"""
+
+	columns = ('id', 'meanError', 'maxError', 'meanNormError', 'maxNormError')
+
+	def __init__(self, results, method='driftAnalysis'):
+		self._results = results
+		self._method = method
+		self._index = {r['id']: i for i, r in enumerate(results)}
+
+	def __len__(self):
+		return len(self._results)
+
+	def __iter__(self):
+		return iter(self._results)
+
+	def __getitem__(self, tID):
+		return self._results[self._index[tID]]
+
+	def table(self):
+		""" Returns list of rows with aggregate errors of each track
+
+		"""
+		rows = []
+		for r in self._results:
+			errors, normErrors = r['errors'], r['normErrors']
+			rows.append({'id': r['id'],
+						'meanError': float(np.mean(errors)) if len(errors) > 0 else np.nan,
+						'maxError': float(np.max(errors)) if len(errors) > 0 else np.nan,
+						'meanNormError': float(np.mean(normErrors)) if len(normErrors) > 0 else np.nan,
+						'maxNormError': float(np.max(normErrors)) if len(normErrors) > 0 else np.nan})
+		return rows
+
+	def summary(self):
+		""" Mean over tracks of each aggregate error
+
+		"""
+		rows = self.table()
+		summary = {'method': self._method, 'numTracks': len(rows)}
+		for column in self.columns[1:]:
+			values = [row[column] for row in rows]
+			summary[column] = float(np.nanmean(values)) if len(values) > 0 else np.nan
+		return summary
+
+	def simulatedTrack(self, tID):
+		""" Simulated track of the given test track, for plotting
+
+		"""
+		r = self[tID]
+		return buildTrack(tID, r['simTimes'], r['simPositions'])
+
+	def save(self, filename):
+		""" Write per track table to csv, the last row holds the means
+
+		"""
+		with open(filename, mode='w', newline='') as f:
+			writer = csv.DictWriter(f, fieldnames=self.columns)
+			writer.writeheader()
+			writer.writerows(self.table())
+
+			summary = self.summary()
+			writer.writerow({c: ('mean' if c == 'id' else summary[c]) for c in self.columns})
+
+	def saveErrors(self, filename):
+		""" Write per track error arrays to an npz archive
+
+		"""
+		arrays = {'method': np.array(self._method)}
+		for r in self._results:
+			arrays[f"errors_{r['id']}"] = r['errors']
+			arrays[f"normErrors_{r['id']}"] = r['normErrors']
+		np.savez(filename, **arrays)
+
+	@property
+	def method(self):
+		return self._method
+
+class DriftEvaluator(object):
+	""" Headless drift analysis of a set of test tracks against a saved
+		field or RasterField. Tracks are shipped to a process pool as
+		TrackBatch shards and every worker loads the field once. numWorkers
+		0 uses one worker per core and 1 evaluates in this process.
+
+		Method 'driftAnalysis' runs field_toolkit's DriftAnalysis on one
+		track at a time. Method 'lockstep' runs the same DriftAnalysis for
+		all tracks of a shard together with LockstepDriftAnalysis, so each
+		step queries the field once for every live particle
+
+	"""
+
+	methods = ('driftAnalysis', 'lockstep')
+
+	def __init__(self, fieldFile, mass=0.00001, numWorkers=0, shardSize=None, method='driftAnalysis'):
+		if method not in self.methods:
+			raise ValueError(f"Unknown drift method {method}, expected one of {self.methods}")
+
+		self._fieldFile = os.path.abspath(fieldFile)
+		self._mass = mass
+		self._method = method
+		self._numWorkers = numWorkers
+		self._shardSize = shardSize
+
+	def _shards(self, batch, numWorkers):
+		shardSize = self._shardSize
+		if shardSize is None and self._method == 'lockstep':
+			# Lockstep integration gains from large shards, one per worker
+			shardSize = -(-len(batch) // numWorkers)
+		elif shardSize is None:
+			shardSize = max(-(-len(batch) // (4 * numWorkers)), 1)
+
+		return [batch.subset(np.arange(i, min(i + shardSize, len(batch)))) for i in range(0, len(batch), shardSize)]
+
+	def evaluate(self, tracks):
+		""" Evaluate tracks, given as a list of Track objects or a TrackBatch,
+			returns DriftResults in the order of the input tracks
+
+		"""
+		batch = tracks if isinstance(tracks, TrackBatch) else TrackBatch.from_tracks(list(tracks))
+		if len(batch) == 0:
+			return DriftResults([], self._method)
+
+		if self._numWorkers == 1:
+			_initDriftWorker(self._fieldFile, self._mass, self._method)
+			return DriftResults(_evaluateShard(batch), self._method)
+
+		numWorkers = self._numWorkers or os.cpu_count()
+		results = []
+		with ProcessPoolExecutor(max_workers=numWorkers, initializer=_initDriftWorker,
+								initargs=(self._fieldFile, self._mass, self._method)) as executor:
+			for shardResults in executor.map(_evaluateShard, self._shards(batch, numWorkers)):
+				results.extend(shardResults)
+
+		return DriftResults(results, self._method)
+
+	@property
+	def method(self):
+		return self._method
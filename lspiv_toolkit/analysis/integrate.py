@@ -0,0 +1,176 @@
+import threading
+import numpy as np
+
+from concurrent.futures import ThreadPoolExecutor
+
+from field_toolkit.core.fields import VectorField
+from field_toolkit.analysis.drift import DriftAnalysis
+
+from ..storage.archive import TrackBatch
+
+def sampleField(field, points):
+	""" Field velocity at each row of points, with a single vectorized
+		query when the field supports it
+
+	"""
+	points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+	if hasattr(field, 'sampleAtPoints'):
+		return np.asarray(field.sampleAtPoints(points), dtype=np.float64).reshape(-1, 2)
+
+	return np.array([field[tuple(p)] for p in points], dtype=np.float64).reshape(-1, 2)
+
+class LockstepField(VectorField):
+	""" Stand in for a field shared by the particles of a lockstep drift
+		analysis, one thread per particle. A query blocks until every live
+		particle has queried, then all of them are answered with a single
+		vectorized query of the wrapped field. Particles retire when their
+		evaluation ends so the remaining ones are not held up
+
+	"""
+
+	def __init__(self, field, numParticles):
+		self._field = field
+		self._live = numParticles
+		self._lock = threading.Lock()
+
+		# Pending points, answers and wake up locks by thread
+		self._queries = {}
+		self._answers = {}
+		self._waiters = {}
+		self._numBatches = 0
+
+	def __getattr__(self, name):
+		# Everything but point queries comes from the wrapped field
+		if name == '_field':
+			raise AttributeError(name)
+		return getattr(self._field, name)
+
+	def _dispatch(self):
+		""" Answer all pending queries once every live particle is waiting,
+			called with the lock held
+
+		"""
+		if len(self._queries) == 0 or len(self._queries) < self._live:
+			return
+
+		keys = list(self._queries)
+		points = [self._queries[key] for key in keys]
+		self._queries.clear()
+
+		try:
+			values = np.split(sampleField(self._field, np.concatenate(points)), np.cumsum([len(p) for p in points])[:-1])
+		except Exception as e:
+			# Raise the error in every waiting particle thread
+			values = [e] * len(keys)
+
+		self._answers.update(zip(keys, values))
+		self._numBatches += 1
+
+		# Each particle only wakes on its own lock, so they do not contend
+		for key in keys:
+			self._waiters[key].release()
+
+	def _query(self, points):
+		key = threading.get_ident()
+		waiter = self._waiters.get(key)
+		if waiter is None:
+			waiter = self._waiters[key] = threading.Lock()
+			waiter.acquire()
+
+		with self._lock:
+			self._queries[key] = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+			self._dispatch()
+
+		# Released by the dispatching thread, possibly this one
+		waiter.acquire()
+		values = self._answers.pop(key)
+
+		if isinstance(values, Exception):
+			raise values
+		return values
+
+	def retire(self):
+		with self._lock:
+			self._live -= 1
+			self._dispatch()
+
+	def sampleAtPoints(self, points):
+		return self._query(points)
+
+	def sampleAtPoint(self, point):
+		return tuple(self._query(point)[0])
+
+	def _sample(self, point):
+		return self.sampleAtPoint(point)
+
+	def __getitem__(self, point):
+		return self.sampleAtPoint(point)
+
+	@property
+	def numBatches(self):
+		return self._numBatches
+
+class LockstepDriftAnalysis(object):
+	""" Runs field_toolkit's DriftAnalysis for many tracks at once. Each
+		track is evaluated by its own DriftAnalysis on a worker thread and
+		all of them share a LockstepField, so the particles advance in
+		lockstep and every step issues one vectorized field query for all
+		live particles instead of one query per particle. The integration
+		itself is DriftAnalysis's, so per track results match evaluating the
+		tracks one at a time. At most maxParticles tracks run together
+
+	"""
+
+	def __init__(self, field, maxParticles=256):
+		self._field = field
+		self._maxParticles = maxParticles
+		self._numBatches = 0
+
+	def evaluate(self, track, mass=0.00001):
+		return DriftAnalysis(self._field).evaluate(track, mass=mass)
+
+	def evaluateBatch(self, tracks, mass=0.00001):
+		""" Evaluate tracks, given as a list of Track objects or a TrackBatch.
+			Returns the output of DriftAnalysis.evaluate for each track in
+			input order
+
+		"""
+		if isinstance(tracks, TrackBatch):
+			tracks = [tracks.getTrack(i) for i in range(len(tracks))]
+
+		results = []
+		for i in range(0, len(tracks), self._maxParticles):
+			results.extend(self._evaluateGroup(tracks[i:i+self._maxParticles], mass))
+
+		return results
+
+	def _evaluateGroup(self, tracks, mass):
+		field = LockstepField(self._field, len(tracks))
+
+		def evaluate(track):
+			try:
+				return DriftAnalysis(field).evaluate(track, mass=mass)
+			finally:
+				field.retire()
+
+		# Every particle needs its own thread or the lockstep never completes
+		with ThreadPoolExecutor(max_workers=len(tracks)) as executor:
+			results = list(executor.map(evaluate, tracks))
+
+		self._numBatches += field.numBatches
+		return results
+
+	@property
+	def field(self):
+		return self._field
+
+	@field.setter
+	def field(self, field):
+		self._field = field
+
+	@property
+	def numBatches(self):
+		""" Vectorized field queries issued so far
+
+		"""
+		return self._numBatches
@@ -0,0 +1,159 @@
+import numpy as np
+
+from scipy.linalg import solve_triangular
+
+from field_toolkit.core.fields import VectorField
+
+from ..analysis.integrate import sampleField
+
+def squaredExponential(a, b, lengthScale, signalVariance):
+	""" Squared exponential kernel matrix between point arrays a and b
+
+	"""
+	a = np.asarray(a, dtype=np.float64).reshape(-1, 2)
+	b = np.asarray(b, dtype=np.float64).reshape(-1, 2)
+	sqDist = (a[:, 0, np.newaxis] - b[:, 0])**2 + (a[:, 1, np.newaxis] - b[:, 1])**2
+	return signalVariance * np.exp(-0.5 * sqDist / lengthScale**2)
+
+class GPMeanField(VectorField):
+	""" Vector field given by the posterior of a GP with a squared
+		exponential kernel shared by both velocity components. Holds a copy
+		of the training points, weights and Cholesky factor so it is not
+		affected by later updates of the approximator that produced it
+
+	"""
+
+	def __init__(self, points, alpha, mean, cholesky, kernelParams, extents):
+		super().__init__(extents)
+		self._points = points
+		self._alpha = alpha
+		self._mean = mean
+		self._cholesky = cholesky
+		self._kernelParams = kernelParams
+		self._extents = extents
+
+	def sampleAtPoints(self, points):
+		""" Posterior mean velocity at each row of points
+
+		"""
+		Ks = squaredExponential(points, self._points, **self._kernelParams)
+		return self._mean + Ks @ self._alpha
+
+	def sampleVariance(self, points):
+		""" Posterior variance at each row of points, shared by both
+			velocity components
+
+		"""
+		Ks = squaredExponential(points, self._points, **self._kernelParams)
+		v = solve_triangular(self._cholesky, Ks.T, lower=True, check_finite=False)
+		return self._kernelParams['signalVariance'] - np.einsum('ij,ij->j', v, v)
+
+	def sampleAtPoint(self, point):
+		return tuple(self.sampleAtPoints(point)[0])
+
+	def _sample(self, point):
+		return self.sampleAtPoint(point)
+
+	def __getitem__(self, point):
+		return self.sampleAtPoint(point)
+
+	@property
+	def extents(self):
+		return self._extents
+
+	@property
+	def numPoints(self):
+		return len(self._points)
+
+class TiledGPField(VectorField):
+	""" Vector field blended from local fields approximated on overlapping
+		tiles. Along each axis a tile is weighted by a linear ramp over twice
+		the overlap margin, rising from zero at the outer edge of its overlap
+		to one a margin inside its core region. The weight is one half on
+		the core edge, where the ramp of the neighbouring tile mirrors it,
+		and weights are normalized across all tiles covering a point. Points
+		not covered by any fitted tile take the global mean velocity. The
+		variance is only available when the tile fields provide one
+
+	"""
+
+	def __init__(self, fields, tiles, margins, mean, extents):
+		super().__init__(extents)
+		self._fields = fields
+		self._tiles = tiles
+		self._margins = margins
+		self._mean = mean
+		self._extents = extents
+
+	def _tileWeights(self, points, tile):
+		left, right, top, bottom = tile
+		x, y = points[:, 0], points[:, 1]
+		wx = np.clip(np.minimum(x - left, right - x) / (2 * self._margins[0]), 0.0, 1.0)
+		wy = np.clip(np.minimum(y - top, bottom - y) / (2 * self._margins[1]), 0.0, 1.0)
+		return wx * wy
+
+	def _blend(self, points, sample):
+		points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+		total = None
+		weightSum = np.zeros(len(points))
+
+		for field, tile in zip(self._fields, self._tiles):
+			if field is None:
+				continue
+
+			weights = self._tileWeights(points, tile)
+			inTile = np.flatnonzero(weights > 0)
+			if len(inTile) == 0:
+				continue
+
+			values = sample(field, points[inTile])
+			if total is None:
+				total = np.zeros((len(points),) + values.shape[1:])
+
+			total[inTile] += weights[inTile].reshape((-1,) + (1,) * (values.ndim - 1)) * values
+			weightSum[inTile] += weights[inTile]
+
+		return total, weightSum
+
+	def sampleAtPoints(self, points):
+		total, weightSum = self._blend(points, sampleField)
+
+		values = np.tile(self._mean, (len(weightSum), 1))
+		covered = weightSum > 0
+		if total is not None:
+			values[covered] = total[covered] / weightSum[covered, np.newaxis]
+
+		return values
+
+	@property
+	def sampleVariance(self):
+		if not all(hasattr(field, 'sampleVariance') for field in self._fields if field is not None):
+			raise AttributeError("Tile fields do not provide sampleVariance")
+
+		return self._sampleVariance
+
+	def _sampleVariance(self, points):
+		total, weightSum = self._blend(points, lambda field, p: np.asarray(field.sampleVariance(p), dtype=np.float64))
+
+		if total is None:
+			return np.full(len(weightSum), np.inf)
+
+		# Variances may be shared or given per velocity component
+		variance = np.full(total.shape, np.inf)
+		covered = weightSum > 0
+		variance[covered] = total[covered] / weightSum[covered].reshape((-1,) + (1,) * (total.ndim - 1))
+
+		return variance
+
+	def sampleAtPoint(self, point):
+		return tuple(self.sampleAtPoints(point)[0])
+
+	def _sample(self, point):
+		return self.sampleAtPoint(point)
+
+	def __getitem__(self, point):
+		return self.sampleAtPoint(point)
+
+	@property
+	def extents(self):
+		return self._extents
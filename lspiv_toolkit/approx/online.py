@@ -0,0 +1,165 @@
+import numpy as np
+
+from scipy.linalg import cho_solve, cholesky, solve_triangular
+
+from field_toolkit.core.extents import FieldExtents
+
+from .fields import GPMeanField, squaredExponential
+
+def _cholUpdate(L, x):
+	""" In place rank one update of lower Cholesky factor L so that
+		L L^T becomes L L^T + x x^T
+
+	"""
+	x = x.copy()
+	for k in range(len(x)):
+		r = np.hypot(L[k, k], x[k])
+		c = r / L[k, k]
+		s = x[k] / L[k, k]
+		L[k, k] = r
+		L[k+1:, k] = (L[k+1:, k] + s * x[k+1:]) / c
+		x[k+1:] = c * x[k+1:] - s * L[k+1:, k]
+
+class OnlineGPApproximator(object):
+	""" Exact GP regression of both velocity components with fixed kernel
+		hyperparameters that keeps the Cholesky factor of the training
+		kernel matrix between updates. Added measurements extend the factor
+		with a rank-k block update and removed measurements are deleted
+		with rank one updates of the trailing block, both quadratic in the
+		number of training points. Each deleted row costs a python level
+		loop over the factor, so removing more than maxDeleteFraction of
+		the rows refits instead. The factor is recomputed from scratch
+		every refitInterval updates to bound accumulated numerical error.
+		The prior mean does not enter the factor and is recomputed from
+		the training vectors on every update
+
+	"""
+
+	def __init__(self, bounds, lengthScale=100.0, signalVariance=1.0, noiseVariance=0.1, refitInterval=10, maxDeleteFraction=0.01):
+		self._extents = FieldExtents.from_bounds_list(bounds)
+		self._kernelParams = {'lengthScale': lengthScale, 'signalVariance': signalVariance}
+		self._noiseVariance = noiseVariance
+		self._refitInterval = refitInterval
+		self._maxDeleteFraction = maxDeleteFraction
+
+		self.clearMeasurements()
+
+	def clearMeasurements(self):
+		self._measurements = []
+		self._rows = {}
+		self._points = np.empty((0, 2))
+		self._vectors = np.empty((0, 2))
+		self._mean = np.zeros(2)
+		self._L = np.empty((0, 0))
+		self._alpha = np.empty((0, 2))
+		self._numUpdates = 0
+
+	def _kernel(self, a, b):
+		return squaredExponential(a, b, **self._kernelParams)
+
+	def _refit(self):
+		""" Recompute Cholesky factor from all measurements
+
+		"""
+		self._numUpdates = 0
+		if len(self._points) == 0:
+			self._L = np.empty((0, 0))
+			return
+
+		K = self._kernel(self._points, self._points)
+		K[np.diag_indices_from(K)] += self._noiseVariance
+		self._L = cholesky(K, lower=True, check_finite=False)
+
+	def _append(self, points):
+		""" Extend factor with new rows, [[L, 0], [B^T, C]] where
+			B = L^-1 K(X, Xn) and C C^T = K(Xn, Xn) - B^T B
+
+		"""
+		Knn = self._kernel(points, points)
+		Knn[np.diag_indices_from(Knn)] += self._noiseVariance
+
+		n = len(self._L)
+		if n == 0:
+			self._L = cholesky(Knn, lower=True, check_finite=False)
+			return
+
+		B = solve_triangular(self._L, self._kernel(self._points[:n], points), lower=True, check_finite=False)
+		C = cholesky(Knn - B.T @ B, lower=True, check_finite=False)
+
+		k = len(points)
+		L = np.zeros((n + k, n + k))
+		L[:n, :n] = self._L
+		L[n:, :n] = B.T
+		L[n:, n:] = C
+		self._L = L
+
+	def _delete(self, rows):
+		""" Remove rows and columns from factor, highest index first so the
+			remaining indices stay valid
+
+		"""
+		L = self._L
+		for i in sorted(rows, reverse=True):
+			if i + 1 < len(L):
+				_cholUpdate(L[i+1:, i+1:], L[i+1:, i])
+			L = np.delete(np.delete(L, i, axis=0), i, axis=1)
+
+		self._L = L
+
+	def _solve(self):
+		if len(self._points) == 0:
+			self._mean = np.zeros(2)
+			self._alpha = np.empty((0, 2))
+		else:
+			self._mean = self._vectors.mean(axis=0)
+			self._alpha = cho_solve((self._L, True), self._vectors - self._mean, check_finite=False)
+
+	def addMeasurements(self, measurements):
+		self.updateMeasurements(added=measurements)
+
+	def removeMeasurements(self, measurements):
+		self.updateMeasurements(removed=measurements)
+
+	def updateMeasurements(self, added=(), removed=()):
+		""" Apply a batch of added and removed measurements. Measurements are
+			identified by object identity, removing a measurement that is
+			not part of the training set is ignored
+
+		"""
+		added = list(added)
+		removedRows = {self._rows[id(m)] for m in removed if id(m) in self._rows}
+		if len(added) == 0 and len(removedRows) == 0:
+			return
+
+		keep = np.ones(len(self._measurements), dtype=bool)
+		keep[list(removedRows)] = False
+
+		self._measurements = [m for m, k in zip(self._measurements, keep) if k] + added
+		self._rows = {id(m): i for i, m in enumerate(self._measurements)}
+
+		newPoints = np.asarray([m.point for m in added], dtype=np.float64).reshape(-1, 2)
+		newVectors = np.asarray([m.vector for m in added], dtype=np.float64).reshape(-1, 2)
+		self._points = np.concatenate((self._points[keep], newPoints))
+		self._vectors = np.concatenate((self._vectors[keep], newVectors))
+
+		self._numUpdates += 1
+		if self._numUpdates >= self._refitInterval or len(self._L) == 0 or len(removedRows) > self._maxDeleteFraction * len(self._L):
+			self._refit()
+		else:
+			try:
+				self._delete(removedRows)
+				if len(added) > 0:
+					self._append(newPoints)
+			except np.linalg.LinAlgError:
+				# Lost positive definiteness, start over from the kernel matrix
+				self._refit()
+
+		self._solve()
+
+	def approximate(self):
+		return GPMeanField(self._points.copy(), self._alpha.copy(), self._mean.copy(), self._L.copy(),
+							dict(self._kernelParams), self._extents)
+
+	@property
+	def numMeasurements(self):
+		return len(self._measurements)
@@ -0,0 +1,174 @@
+import numpy as np
+
+from field_toolkit.core.fields import VectorField
+from field_toolkit.core.extents import FieldExtents
+
+from ..analysis.integrate import sampleField
+
+def _sampleChunks(sample, points, chunkSize):
+	""" Evaluate sample over points in chunks so kernel matrices of GP
+		fields stay small
+
+	"""
+	return np.concatenate([sample(points[i:i+chunkSize]) for i in range(0, len(points), chunkSize)])
+
+def loadField(filename):
+	""" Load a field saved by VectorField.save or a RasterField
+
+	"""
+	if filename.endswith(RasterField.extension):
+		return RasterField.from_file(filename)
+
+	return VectorField.from_file(filename)
+
+class RasterField(VectorField):
+	""" Mean and, when the source field provides it, variance of a field
+		sampled once on a regular grid and stored as compact float32 arrays.
+		Point queries are vectorized bilinear lookups, points outside the
+		grid take the value at the nearest edge. Built from an exact field
+		with from_field, which doubles the grid resolution until lookups of
+		random points are within tolerance of the exact field, and raises
+		when it cannot get there
+
+	"""
+
+	extension = '.npz'
+
+	def __init__(self, bounds, mean, variance=None, maxError=np.nan):
+		self._bounds = [float(b) for b in bounds]
+		self._mean = np.asarray(mean, dtype=np.float32)
+		self._variance = None if variance is None else np.asarray(variance, dtype=np.float32)
+		self._maxError = float(maxError)
+		self._extents = FieldExtents.from_bounds_list(self._bounds)
+		super().__init__(self._extents)
+
+	@classmethod
+	def from_field(cls, field, bounds, gridDim=(160, 90), tolerance=None, maxRefinements=2,
+					numSamples=1000, chunkSize=4096):
+		""" Rasterize field over bounds [xmin, xmax, ymin, ymax] with gridDim
+			cells. With a tolerance the grid is refined up to maxRefinements
+			times until the max error of numSamples random lookups is below it,
+			ValueError is raised if the error is still above tolerance
+
+		"""
+		xMin, xMax, yMin, yMax = bounds
+		rng = np.random.default_rng(0)
+		samples = rng.uniform((xMin, yMin), (xMax, yMax), size=(numSamples, 2))
+		exact = _sampleChunks(lambda p: sampleField(field, p), samples, chunkSize)
+
+		cols, rows = gridDim
+		for refinement in range(maxRefinements + 1):
+			gridX, gridY = np.meshgrid(np.linspace(xMin, xMax, cols + 1), np.linspace(yMin, yMax, rows + 1))
+			gridPoints = np.column_stack((gridX.ravel(), gridY.ravel()))
+
+			mean = _sampleChunks(lambda p: sampleField(field, p), gridPoints, chunkSize)
+			variance = None
+			if hasattr(field, 'sampleVariance'):
+				variance = _sampleChunks(field.sampleVariance, gridPoints, chunkSize)
+				variance = variance.reshape(rows + 1, cols + 1, *variance.shape[1:])
+
+			raster = cls(bounds, mean.reshape(rows + 1, cols + 1, 2), variance)
+			raster._maxError = float(np.linalg.norm(raster.sampleAtPoints(samples) - exact, axis=1).max())
+
+			if tolerance is None or raster._maxError <= tolerance:
+				break
+
+			if refinement < maxRefinements:
+				cols, rows = 2 * cols, 2 * rows
+
+		if tolerance is not None and raster._maxError > tolerance:
+			raise ValueError(f"Rasterized field on {cols}x{rows} grid has max error {raster._maxError:.4f} above tolerance {tolerance}")
+
+		print(f"Rasterized field on {cols}x{rows} grid, max error {raster._maxError:.4f}")
+		return raster
+
+	@classmethod
+	def from_file(cls, filename):
+		with np.load(filename) as raster:
+			variance = raster['variance'] if 'variance' in raster.files else None
+			return cls(raster['bounds'], raster['mean'], variance, float(raster['maxError']))
+
+	def save(self, filename):
+		arrays = {'bounds': np.asarray(self._bounds), 'mean': self._mean, 'maxError': self._maxError}
+		if self._variance is not None:
+			arrays['variance'] = self._variance
+
+		np.savez(filename, **arrays)
+
+	def _interpolate(self, grid, points):
+		points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+		rows, cols = grid.shape[0] - 1, grid.shape[1] - 1
+		xMin, xMax, yMin, yMax = self._bounds
+
+		fx = np.clip((points[:, 0] - xMin) / (xMax - xMin) * cols, 0, cols)
+		fy = np.clip((points[:, 1] - yMin) / (yMax - yMin) * rows, 0, rows)
+		i = np.minimum(np.floor(fx).astype(np.intp), cols - 1)
+		j = np.minimum(np.floor(fy).astype(np.intp), rows - 1)
+
+		shape = (-1,) + (1,) * (grid.ndim - 2)
+		tx = (fx - i).reshape(shape)
+		ty = (fy - j).reshape(shape)
+
+		top = (1 - tx) * grid[j, i] + tx * grid[j, i+1]
+		bottom = (1 - tx) * grid[j+1, i] + tx * grid[j+1, i+1]
+		return (1 - ty) * top + ty * bottom
+
+	def sampleAtPoints(self, points):
+		""" Interpolated mean velocity at each row of points
+
+		"""
+		return self._interpolate(self._mean, points)
+
+	def sampleVariance(self, points):
+		""" Interpolated variance at each row of points, None if the source
+			field had no variance
+
+		"""
+		if self._variance is None:
+			return None
+
+		return self._interpolate(self._variance, points)
+
+	def checkError(self, field, numSamples=1000, seed=0):
+		""" Compare lookups against the exact field at random points, returns
+			max and mean error of the mean velocity and of the variance
+
+		"""
+		xMin, xMax, yMin, yMax = self._bounds
+		rng = np.random.default_rng(seed)
+		samples = rng.uniform((xMin, yMin), (xMax, yMax), size=(numSamples, 2))
+
+		errors = np.linalg.norm(self.sampleAtPoints(samples) - sampleField(field, samples), axis=1)
+		report = {'maxError': float(errors.max()), 'meanError': float(errors.mean())}
+
+		if self._variance is not None and hasattr(field, 'sampleVariance'):
+			varErrors = np.abs(self.sampleVariance(samples) - field.sampleVariance(samples))
+			report['maxVarianceError'] = float(varErrors.max())
+			report['meanVarianceError'] = float(varErrors.mean())
+
+		return report
+
+	def sampleAtPoint(self, point):
+		return tuple(self.sampleAtPoints(point)[0])
+
+	def _sample(self, point):
+		return self.sampleAtPoint(point)
+
+	def __getitem__(self, point):
+		return self.sampleAtPoint(point)
+
+	@property
+	def extents(self):
+		return self._extents
+
+	@property
+	def bounds(self):
+		return self._bounds
+
+	@property
+	def gridDim(self):
+		return (self._mean.shape[1] - 1, self._mean.shape[0] - 1)
+
+	@property
+	def maxError(self):
+		return self._maxError
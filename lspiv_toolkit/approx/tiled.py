@@ -0,0 +1,122 @@
+import dill
+import numpy as np
+
+from concurrent.futures import ProcessPoolExecutor
+
+import field_toolkit.approx as field_approx
+from field_toolkit.core.extents import FieldExtents
+
+from ..filtering.measurements import measurementsToArrays, arraysToMeasurements
+from .fields import TiledGPField
+
+# field_approx approximator used for each tile by approximation method
+tileApproximators = {'simple': 'GPApproximator', 'coregionalized': 'CoregionalizedGPApproximator',
+					'sparse': 'SparseGPApproximator', 'integral': 'IntegralGPApproximator'}
+
+def _fitTile(task):
+	""" Approximate the field of one tile with a field_approx approximator.
+		Measurements arrive as arrays and the field is returned serialized
+		with dill, as VectorField.save does
+
+	"""
+	method, arrays = task
+	gp = getattr(field_approx.gp, tileApproximators[method])()
+	gp.clearMeasurements()
+	gp.addMeasurements(arraysToMeasurements(*arrays))
+	return dill.dumps(gp.approximate())
+
+class TiledGPApproximator(object):
+	""" Partitions the image plane into a grid of overlapping tiles and
+		approximates each tile independently in a process pool, with the
+		field_approx GP approximator given by tileMethod. Tile predictions
+		are blended with weights that ramp down across the overlap, so cost
+		grows with the number of tiles instead of cubically with the total
+		number of measurements
+
+	"""
+
+	def __init__(self, bounds, tileGridDim=(8, 4), tileOverlap=0.25, maxTilePoints=2000, tileMethod='simple', numWorkers=0):
+		if tileMethod not in tileApproximators:
+			raise ValueError(f"Unknown tile approximation method {tileMethod}, expected one of {tuple(tileApproximators)}")
+
+		self._bounds = tuple(bounds)
+		self._extents = FieldExtents.from_bounds_list(bounds)
+		self._tileGridDim = tuple(tileGridDim)
+		self._tileOverlap = tileOverlap
+		self._maxTilePoints = maxTilePoints
+		self._tileMethod = tileMethod
+		self._numWorkers = numWorkers
+
+		self._tiles, self._margins = self._buildTiles()
+		self.clearMeasurements()
+
+	def _buildTiles(self):
+		""" Returns array of tile bounds (xMin, xMax, yMin, yMax) including
+			overlap and the per axis overlap margin. Bounds on the outer edge
+			of the image are unbounded so border weights never ramp down
+
+		"""
+		xMin, xMax, yMin, yMax = self._bounds
+		cellsX, cellsY = self._tileGridDim
+		tileWidth = (xMax - xMin) / cellsX
+		tileHeight = (yMax - yMin) / cellsY
+		margins = (self._tileOverlap * tileWidth, self._tileOverlap * tileHeight)
+
+		tiles = []
+		for j in range(cellsY):
+			for i in range(cellsX):
+				left = xMin + i * tileWidth - margins[0] if i > 0 else -np.inf
+				right = xMin + (i + 1) * tileWidth + margins[0] if i < cellsX - 1 else np.inf
+				top = yMin + j * tileHeight - margins[1] if j > 0 else -np.inf
+				bottom = yMin + (j + 1) * tileHeight + margins[1] if j < cellsY - 1 else np.inf
+				tiles.append((left, right, top, bottom))
+
+		return np.array(tiles), margins
+
+	def clearMeasurements(self):
+		self._measurements = []
+
+	def addMeasurements(self, measurements):
+		self._measurements.extend(measurements)
+
+	def addMeasurement(self, measurement):
+		self._measurements.append(measurement)
+
+	def _tileTasks(self, points, vectors, scores, ids):
+		tasks = []
+		fitted = []
+		for left, right, top, bottom in self._tiles:
+			inTile = np.flatnonzero((points[:, 0] >= left) & (points[:, 0] < right)
+									& (points[:, 1] >= top) & (points[:, 1] < bottom))
+			if len(inTile) == 0:
+				fitted.append(False)
+				continue
+
+			# Keep best scoring measurements to bound the cost of each tile
+			if len(inTile) > self._maxTilePoints:
+				inTile = inTile[np.argsort(scores[inTile], kind='stable')[:self._maxTilePoints]]
+
+			tasks.append((self._tileMethod, (points[inTile], vectors[inTile], scores[inTile], ids[inTile])))
+			fitted.append(True)
+
+		return tasks, fitted
+
+	def approximate(self):
+		points, vectors, scores, ids = measurementsToArrays(self._measurements)
+		tasks, fitted = self._tileTasks(points, vectors, scores, ids)
+
+		if self._numWorkers == 1:
+			results = [_fitTile(task) for task in tasks]
+		else:
+			with ProcessPoolExecutor(max_workers=self._numWorkers or None) as executor:
+				results = list(executor.map(_fitTile, tasks))
+
+		results = iter(results)
+		fields = [dill.loads(next(results)) if isFitted else None for isFitted in fitted]
+
+		globalMean = vectors.mean(axis=0) if len(vectors) > 0 else np.zeros(2)
+		return TiledGPField(fields, self._tiles, self._margins, globalMean, self._extents)
+
+	@property
+	def numTiles(self):
+		return len(self._tiles)
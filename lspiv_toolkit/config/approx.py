@@ -31,16 +31,57 @@ class ApproximationConfig(yaml.YAMLObject):
 		self._measurementBinCapacity = 100
 		self._measurementsPerCell = 1
 		self._filteringMethod = 'max'
+		# Measurement database backend, 'sorted' or 'array'
+		self._measurementStorage = 'sorted'
+
+		# Number of tracks to load and measure at a time, 0 loads all at once
+		self._streamingChunkSize = 0
+
+		# Worker processes for measurement extraction, 0 measures serially
+		self._measurementWorkers = 0
+
+		# Transform tracks with lookup tables cached on disk instead of the
+		# exact transforms, tables go to transformCacheDir or, if unset,
+		# under the input directory
+		self._cacheTransforms = False
+		self._transformCacheDir = None
 
 		# Relevant to gp reconstruction
 		self._approximationMethod = 'simple'
 		# Eventually would like to add some kernel stuff here
 
+		# Fixed kernel and update schedule used by 'online' approximation
+		self._kernelParams = {'lengthScale': 100.0, 'signalVariance': 1.0, 'noiseVariance': 0.1}
+		self._refitInterval = 10
+		# Seconds between published fields while measurements stream in
+		self._publishInterval = 5.0
+
+		# Overlapping tiles approximated independently by 'tiled'
+		# approximation, each with the field_approx method tileMethod
+		self._tileGridDim = (8, 4)
+		self._tileOverlap = 0.25
+		self._maxTilePoints = 2000
+		self._tileMethod = 'simple'
+		# Worker processes for tile fitting, 0 uses one per core
+		self._tileWorkers = 0
+
+		# Optional rasterized copy of the field saved next to approx.field
+		# for fast repeated queries, grid refined until lookups are within
+		# tolerance or no raster is saved
+		self._saveRaster = False
+		self._rasterGridDim = (160, 90)
+		self._rasterTolerance = 0.1
+
 	@classmethod
 	def from_file(cls, filename):
 		with open(filename, mode='r') as f:
 			return yaml.load(f)
 
+	def __setstate__(self, state):
+		# Fill in defaults for settings added after the config file was written
+		self.__init__(state.get('_inputDir', '.'), state.get('_camFile'))
+		self.__dict__.update(state)
+
 	def save(self, filename=None):
 		if (filename is None):
 			filename = f"{self._inputDir}/approx_config.yaml"
@@ -57,6 +98,21 @@ class ApproximationConfig(yaml.YAMLObject):
 		params = {'method':self._measurementMethod, 'scoring':self._scoringMethod}
 		return params
 
+	def getTiledParams(self):
+		params = {'tileGridDim': self._tileGridDim, 'tileOverlap': self._tileOverlap,
+					'maxTilePoints': self._maxTilePoints, 'tileMethod': self._tileMethod,
+					'numWorkers': self._tileWorkers}
+		return params
+
+	def getRasterParams(self):
+		params = {'gridDim': self._rasterGridDim, 'tolerance': self._rasterTolerance}
+		return params
+
+	def getOnlineParams(self):
+		params = dict(self._kernelParams)
+		params['refitInterval'] = self._refitInterval
+		return params
+
 	@property
 	def inputDir(self):
 		return self._inputDir
@@ -121,6 +177,46 @@ class ApproximationConfig(yaml.YAMLObject):
 	def measurementsPerCell(self, measurementLimit):
 		self._measurementsPerCell = measurementLimit
 
+	@property
+	def streamingChunkSize(self):
+		return self._streamingChunkSize
+
+	@streamingChunkSize.setter
+	def streamingChunkSize(self, numTracks):
+		self._streamingChunkSize = numTracks
+
+	@property
+	def measurementWorkers(self):
+		return self._measurementWorkers
+
+	@measurementWorkers.setter
+	def measurementWorkers(self, numWorkers):
+		self._measurementWorkers = numWorkers
+
+	@property
+	def cacheTransforms(self):
+		return self._cacheTransforms
+
+	@cacheTransforms.setter
+	def cacheTransforms(self, enabled):
+		self._cacheTransforms = enabled
+
+	@property
+	def transformCacheDir(self):
+		return self._transformCacheDir
+
+	@transformCacheDir.setter
+	def transformCacheDir(self, directory):
+		self._transformCacheDir = directory
+
+	@property
+	def measurementStorage(self):
+		return self._measurementStorage
+
+	@measurementStorage.setter
+	def measurementStorage(self, storage):
+		self._measurementStorage = storage
+
 	@property
 	def filteringMethod(self):
 		return self._filteringMethod
@@ -144,3 +240,91 @@ class ApproximationConfig(yaml.YAMLObject):
 	@approximationMethod.setter
 	def approximationMethod(self, method):
 		self._approximationMethod = method
+
+	@property
+	def kernelParams(self):
+		return self._kernelParams
+
+	@kernelParams.setter
+	def kernelParams(self, params):
+		self._kernelParams = params
+
+	@property
+	def refitInterval(self):
+		return self._refitInterval
+
+	@refitInterval.setter
+	def refitInterval(self, numUpdates):
+		self._refitInterval = numUpdates
+
+	@property
+	def publishInterval(self):
+		return self._publishInterval
+
+	@publishInterval.setter
+	def publishInterval(self, seconds):
+		self._publishInterval = seconds
+
+	@property
+	def tileGridDim(self):
+		return self._tileGridDim
+
+	@tileGridDim.setter
+	def tileGridDim(self, dimensions):
+		self._tileGridDim = dimensions
+
+	@property
+	def tileOverlap(self):
+		return self._tileOverlap
+
+	@tileOverlap.setter
+	def tileOverlap(self, fraction):
+		self._tileOverlap = fraction
+
+	@property
+	def maxTilePoints(self):
+		return self._maxTilePoints
+
+	@maxTilePoints.setter
+	def maxTilePoints(self, numPoints):
+		self._maxTilePoints = numPoints
+
+	@property
+	def tileMethod(self):
+		return self._tileMethod
+
+	@tileMethod.setter
+	def tileMethod(self, method):
+		self._tileMethod = method
+
+	@property
+	def tileWorkers(self):
+		return self._tileWorkers
+
+	@tileWorkers.setter
+	def tileWorkers(self, numWorkers):
+		self._tileWorkers = numWorkers
+
+	@property
+	def saveRaster(self):
+		return self._saveRaster
+
+	@saveRaster.setter
+	def saveRaster(self, enabled):
+		self._saveRaster = enabled
+
+	@property
+	def rasterGridDim(self):
+		return self._rasterGridDim
+
+	@rasterGridDim.setter
+	def rasterGridDim(self, dimensions):
+		self._rasterGridDim = dimensions
+
+	@property
+	def rasterTolerance(self):
+		return self._rasterTolerance
+
+	@rasterTolerance.setter
+	def rasterTolerance(self, tolerance):
+		self._rasterTolerance = tolerance
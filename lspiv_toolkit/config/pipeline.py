@@ -19,6 +19,11 @@ class PipelineConfig(yaml.YAMLObject):
 		self._qualityLevel = 0.3
 		self._minFeatureDistance = 10.
 		self._blockSize = 10
+		# Radius around active track end points excluded from detection
+		self._exclusionRadius = 5
+		# Tiled detection settings, 0 threads uses the serial grid detector
+		self._detectionThreads = 0
+		self._detectionBands = 8
 
 		# Track Filtering settings
 		self._historicalThreshold = 0.004
@@ -28,6 +33,36 @@ class PipelineConfig(yaml.YAMLObject):
 		self._meanderingRatio = 0.9
 		self._maxTracks = 20000
 
+		# Track storage settings, 'list' or 'columnar'
+		self._trackStorage = 'list'
+		self._activeTrackCapacity = 2048
+
+		# Output format for saved tracks, 'json' or 'archive'
+		self._trackFormat = 'json'
+
+		# Write tracks to the raw track folder from a background thread as
+		# they become historical instead of all at the end of the run.
+		# Archive output is split into chunks of streamChunkSize tracks
+		self._streamTracks = False
+		self._streamQueueSize = 16
+		self._streamChunkSize = 1000
+
+		# Number of decoded frames to buffer ahead of tracking, 0 disables
+		self._prefetchDepth = 0
+
+		# Instrumentation settings, frames between samples kept for the
+		# timing dump and seconds between console updates (0 disables)
+		self._monitorCapacity = 10000
+		self._monitorSampleInterval = 1
+		self._consoleInterval = 1.0
+		# Print track db state on every update
+		self._verbose = False
+
+		# Seconds between checkpoints of track db state during a run
+		# (0 disables) and number of most recent checkpoints kept
+		self._checkpointInterval = 0.
+		self._checkpointsKept = 2
+
 		# LK Settings
 		self._windowSize = (21,21)
 		self._maxLevel = 5
@@ -39,6 +74,11 @@ class PipelineConfig(yaml.YAMLObject):
 		with open(filename, mode='r') as f:
 			return yaml.load(f)
 
+	def __setstate__(self, state):
+		# Fill in defaults for settings added after the config file was written
+		self.__init__(state['_datasetFile'], state['_outputDir'])
+		self.__dict__.update(state)
+
 	def save(self, filename=None):
 		if (filename is None):
 			filename = f"{self._outputDir}/config.yaml"
@@ -57,6 +97,23 @@ class PipelineConfig(yaml.YAMLObject):
 				'minDistance':self._minFeatureDistance, 'blockSize':self._blockSize}
 		return params
 
+	def getTiledDetectionParams(self):
+		params = {'numBands':self._detectionBands, 'numThreads':self._detectionThreads}
+		return params
+
+	def getTrackStorageParams(self):
+		params = {'capacity':self._activeTrackCapacity}
+		return params
+
+	def getStreamParams(self):
+		params = {'queueSize':self._streamQueueSize, 'chunkSize':self._streamChunkSize}
+		return params
+
+	def getMonitorParams(self):
+		params = {'capacity':self._monitorCapacity, 'sampleInterval':self._monitorSampleInterval,
+				'consoleInterval':self._consoleInterval}
+		return params
+
 	def getLKFlowParams(self):
 		params = {'winSize':self._windowSize, 'maxLevel':self._maxLevel,
 				'maxIter':self._maxIter, 'epsilon':self._epsilon}
@@ -150,6 +207,30 @@ class PipelineConfig(yaml.YAMLObject):
 	def blockSize(self, size):
 		self._blockSize = size
 
+	@property
+	def exclusionRadius(self):
+		return self._exclusionRadius
+
+	@exclusionRadius.setter
+	def exclusionRadius(self, radius):
+		self._exclusionRadius = radius
+
+	@property
+	def detectionThreads(self):
+		return self._detectionThreads
+
+	@detectionThreads.setter
+	def detectionThreads(self, numThreads):
+		self._detectionThreads = numThreads
+
+	@property
+	def detectionBands(self):
+		return self._detectionBands
+
+	@detectionBands.setter
+	def detectionBands(self, numBands):
+		self._detectionBands = numBands
+
 	@property
 	def historicalThreshold(self):
 		return self._historicalThreshold
@@ -191,6 +272,110 @@ class PipelineConfig(yaml.YAMLObject):
 		self._maxTracks = maxTracks
 
 
+	@property
+	def trackStorage(self):
+		return self._trackStorage
+
+	@trackStorage.setter
+	def trackStorage(self, storage):
+		self._trackStorage = storage
+
+	@property
+	def activeTrackCapacity(self):
+		return self._activeTrackCapacity
+
+	@activeTrackCapacity.setter
+	def activeTrackCapacity(self, capacity):
+		self._activeTrackCapacity = capacity
+
+	@property
+	def trackFormat(self):
+		return self._trackFormat
+
+	@trackFormat.setter
+	def trackFormat(self, trackFormat):
+		self._trackFormat = trackFormat
+
+	@property
+	def prefetchDepth(self):
+		return self._prefetchDepth
+
+	@prefetchDepth.setter
+	def prefetchDepth(self, depth):
+		self._prefetchDepth = depth
+
+	@property
+	def monitorCapacity(self):
+		return self._monitorCapacity
+
+	@monitorCapacity.setter
+	def monitorCapacity(self, numSamples):
+		self._monitorCapacity = numSamples
+
+	@property
+	def monitorSampleInterval(self):
+		return self._monitorSampleInterval
+
+	@monitorSampleInterval.setter
+	def monitorSampleInterval(self, numFrames):
+		self._monitorSampleInterval = numFrames
+
+	@property
+	def consoleInterval(self):
+		return self._consoleInterval
+
+	@consoleInterval.setter
+	def consoleInterval(self, seconds):
+		self._consoleInterval = seconds
+
+	@property
+	def verbose(self):
+		return self._verbose
+
+	@verbose.setter
+	def verbose(self, enabled):
+		self._verbose = enabled
+
+	@property
+	def streamTracks(self):
+		return self._streamTracks
+
+	@streamTracks.setter
+	def streamTracks(self, enabled):
+		self._streamTracks = enabled
+
+	@property
+	def streamQueueSize(self):
+		return self._streamQueueSize
+
+	@streamQueueSize.setter
+	def streamQueueSize(self, size):
+		self._streamQueueSize = size
+
+	@property
+	def streamChunkSize(self):
+		return self._streamChunkSize
+
+	@streamChunkSize.setter
+	def streamChunkSize(self, numTracks):
+		self._streamChunkSize = numTracks
+
+	@property
+	def checkpointInterval(self):
+		return self._checkpointInterval
+
+	@checkpointInterval.setter
+	def checkpointInterval(self, seconds):
+		self._checkpointInterval = seconds
+
+	@property
+	def checkpointsKept(self):
+		return self._checkpointsKept
+
+	@checkpointsKept.setter
+	def checkpointsKept(self, numCheckpoints):
+		self._checkpointsKept = numCheckpoints
+
 	@property
 	def windowSize(self):
 		return self._windowSize
@@ -0,0 +1,51 @@
+import numpy as np
+
+class ExclusionMask(object):
+	""" Builds detection search masks with a disc of the given radius
+		cleared around each point. All discs are stamped in a single
+		vectorized pass using a precomputed stencil and the result is
+		written into a reusable scratch buffer, so the returned mask is only
+		valid until the next call to build
+
+	"""
+
+	def __init__(self, baseMask, radius=5):
+		self._baseMask = baseMask
+		self._buffer = np.empty_like(baseMask)
+		self._height, self._width = baseMask.shape[:2]
+
+		self.radius = radius
+
+	def build(self, points):
+		""" Returns base mask with exclusion discs centered on points
+
+		"""
+		np.copyto(self._buffer, self._baseMask)
+
+		points = np.asarray(points).reshape(-1, 2)
+		if len(points) == 0:
+			return self._buffer
+
+		centers = np.rint(points).astype(np.intp)
+		xs = (centers[:, 0, np.newaxis] + self._offsetsX).ravel()
+		ys = (centers[:, 1, np.newaxis] + self._offsetsY).ravel()
+
+		valid = (xs >= 0) & (xs < self._width) & (ys >= 0) & (ys < self._height)
+		self._buffer[ys[valid], xs[valid]] = 0
+
+		return self._buffer
+
+	@property
+	def radius(self):
+		return self._radius
+
+	@radius.setter
+	def radius(self, radius):
+		self._radius = radius
+
+		# Pixel offsets of a filled disc around the origin
+		r = int(np.ceil(radius))
+		offsetsY, offsetsX = np.mgrid[-r:r+1, -r:r+1]
+		inside = offsetsX**2 + offsetsY**2 <= radius**2
+		self._offsetsX = offsetsX[inside]
+		self._offsetsY = offsetsY[inside]
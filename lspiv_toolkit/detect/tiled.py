@@ -0,0 +1,127 @@
+import cv2
+import numpy as np
+
+from concurrent.futures import ThreadPoolExecutor
+
+class TiledGridDetector(object):
+	""" Shi-Tomasi grid detector that splits the image into horizontal bands
+		of grid rows and detects features in each band on a thread pool.
+		OpenCV releases the GIL during detection so bands run concurrently.
+		The corner response is computed once per band on a crop padded by a
+		halo of neighbouring pixels, so responses at cell edges match a
+		full-frame pass. Quality level, minimum distance and the corner
+		limit are then applied per cell with array operations, giving the
+		same features as one goodFeaturesToTrack call per cell
+
+	"""
+
+	def __init__(self, imgSize, gridDim, detectionParams, maxFeatures, borderBuffer, numBands=8, numThreads=4, halo=None):
+		self._width, self._height = imgSize
+		self._params = dict(detectionParams)
+		self._quality = self._params.get('qualityLevel', 0.01)
+		self._maxCellFeatures = self._params.get('maxCorners', 0)
+		self._maxFeatures = maxFeatures
+		self._borderBuffer = borderBuffer
+		self._numThreads = max(1, numThreads)
+
+		# Cell boundaries along each axis
+		self._xEdges = np.linspace(0, self._width, gridDim[0] + 1).astype(int)
+		self._yEdges = np.linspace(0, self._height, gridDim[1] + 1).astype(int)
+
+		# Halo must cover the neighbourhood used for the corner response
+		if halo is None:
+			halo = self._params.get('blockSize', 3) + 1
+		self._halo = halo
+
+		# Split grid rows into bands of roughly equal size
+		numBands = max(1, min(numBands, gridDim[1]))
+		self._bands = np.array_split(np.arange(gridDim[1]), numBands)
+
+		# Features are not detected within borderBuffer of the image edge
+		self._borderMask = np.zeros((self._height, self._width), dtype=np.uint8)
+		self._borderMask[borderBuffer:self._height-borderBuffer, borderBuffer:self._width-borderBuffer] = 255
+
+		self._executor = None
+
+	def _detectBand(self, img, mask, rows):
+		h = self._halo
+		y0, y1 = self._yEdges[rows[0]], self._yEdges[rows[-1]+1]
+		cy0, cy1 = max(0, y0-h), min(self._height, y1+h)
+
+		bandMask = mask[y0:y1]
+		if not bandMask.any():
+			return np.empty((0, 2), dtype=np.float32)
+
+		# Corner response of the whole band, halo rows provide context
+		response = cv2.cornerMinEigenVal(img[cy0:cy1], self._params.get('blockSize', 3), 3)
+		peaks = response == cv2.dilate(response, None)
+		response = np.where(bandMask > 0, response[y0-cy0:y1-cy0], 0)
+
+		# Quality level is relative to the strongest response in each cell
+		rowEdges = self._yEdges[rows[0]:rows[-1]+2] - y0
+		cellMax = np.maximum.reduceat(np.maximum.reduceat(response, rowEdges[:-1], axis=0), self._xEdges[:-1], axis=1)
+
+		ys, xs = np.nonzero(peaks[y0-cy0:y1-cy0] & (response > 0))
+		values = response[ys, xs]
+		cells = (np.searchsorted(rowEdges, ys, side='right') - 1) * (len(self._xEdges) - 1) + np.searchsorted(self._xEdges, xs, side='right') - 1
+
+		candidates = values > cellMax.ravel()[cells] * self._quality
+		xs, ys, values, cells = xs[candidates], ys[candidates], values[candidates], cells[candidates]
+
+		# Group candidates by cell, strongest first within each cell
+		order = np.lexsort((-values, cells))
+		xs, ys, cells = xs[order], ys[order], cells[order]
+
+		# Greedy minimum distance selection, each round accepts the strongest
+		# remaining candidate of every cell and suppresses its neighbours
+		minDistance = self._params.get('minDistance', 0)
+		cellX = np.empty(cellMax.size)
+		cellY = np.empty(cellMax.size)
+		remaining = np.ones(len(cells), dtype=bool)
+		accepted = []
+
+		while remaining.any() and (self._maxCellFeatures <= 0 or len(accepted) < self._maxCellFeatures):
+			idx = np.flatnonzero(remaining)
+			first = idx[np.r_[True, cells[idx[1:]] != cells[idx[:-1]]]]
+			accepted.append(first)
+			remaining[first] = False
+
+			if minDistance > 0:
+				cellX[cells[first]] = xs[first]
+				cellY[cells[first]] = ys[first]
+				idx = np.flatnonzero(remaining)
+				near = (xs[idx] - cellX[cells[idx]])**2 + (ys[idx] - cellY[cells[idx]])**2 < minDistance**2
+				remaining[idx[near]] = False
+
+		if len(accepted) == 0:
+			return np.empty((0, 2), dtype=np.float32)
+
+		keep = np.sort(np.concatenate(accepted))
+		return np.column_stack((xs[keep], ys[keep] + y0)).astype(np.float32)
+
+	def detect(self, img, mask=None):
+		""" Returns (n,2) array of detected feature points
+
+		"""
+		if mask is None:
+			searchMask = self._borderMask
+		else:
+			searchMask = cv2.bitwise_and(mask, self._borderMask)
+
+		if self._executor is None:
+			self._executor = ThreadPoolExecutor(max_workers=self._numThreads)
+
+		bandPoints = list(self._executor.map(lambda rows: self._detectBand(img, searchMask, rows), self._bands))
+		points = np.concatenate(bandPoints)
+
+		# Respect overall feature limit, subsampling evenly across the image
+		if len(points) > self._maxFeatures:
+			keep = np.linspace(0, len(points)-1, self._maxFeatures).astype(int)
+			points = points[keep]
+
+		return points
+
+	def close(self):
+		if self._executor is not None:
+			self._executor.shutdown()
+			self._executor = None
@@ -0,0 +1,81 @@
+import heapq
+import numpy as np
+
+from scipy.sparse import csr_matrix
+
+class CoverageSelector(object):
+	""" Chooses the set of tracks that cover the most measurement cells using
+		lazy greedy max coverage. A sparse track x cell incidence matrix is
+		built once; each step picks the track with the largest number of
+		newly covered cells, only recomputing gains for tracks popped from
+		the priority queue. Ties are broken by the lowest track id, so the
+		result is independent of bin iteration order
+
+	"""
+
+	def __init__(self, trackIDs, cells):
+		trackIDs = np.asarray(trackIDs, dtype=np.int64)
+		cells = np.asarray(cells, dtype=np.int64)
+
+		self._trackIDs, rows = np.unique(trackIDs, return_inverse=True)
+		self._cellIDs, cols = np.unique(cells, return_inverse=True)
+
+		shape = (len(self._trackIDs), len(self._cellIDs))
+		incidence = csr_matrix((np.ones(len(rows), dtype=bool), (rows, cols)), shape=shape)
+
+		# Duplicate track/cell pairs are summed, keep structure only
+		incidence.sum_duplicates()
+		self._incidence = incidence
+
+	@classmethod
+	def from_measurement_db(cls, mDB, measurementsPerCell=None):
+		return cls(*mDB.getIncidence(measurementsPerCell))
+
+	def select(self, maxTracks=None, maxCells=None):
+		""" Returns list of (track id, marginal gain) in the order tracks were
+			chosen. Stops when the track or cell budget is reached or no
+			track adds coverage
+
+		"""
+		indptr, indices = self._incidence.indptr, self._incidence.indices
+		covered = np.zeros(len(self._cellIDs), dtype=bool)
+		numCovered = 0
+
+		# Max heap of (stale gain, track) pairs
+		gains = np.diff(indptr)
+		heap = [(-g, t) for t, g in enumerate(gains.tolist()) if g > 0]
+		heapq.heapify(heap)
+
+		selection = []
+		while heap:
+			if maxTracks is not None and len(selection) >= maxTracks:
+				break
+			if maxCells is not None and numCovered >= maxCells:
+				break
+
+			_, track = heapq.heappop(heap)
+			trackCells = indices[indptr[track]:indptr[track+1]]
+			gain = int(np.count_nonzero(~covered[trackCells]))
+
+			if gain == 0:
+				continue
+
+			# Gains only shrink, so a gain at least the next stale gain is best.
+			# Ties go to the lowest track id, as in a plain greedy scan
+			if heap and (-gain, track) > heap[0]:
+				heapq.heappush(heap, (-gain, track))
+				continue
+
+			covered[trackCells] = True
+			numCovered += gain
+			selection.append((int(self._trackIDs[track]), gain))
+
+		return selection
+
+	@property
+	def numTracks(self):
+		return len(self._trackIDs)
+
+	@property
+	def numCells(self):
+		return len(self._cellIDs)
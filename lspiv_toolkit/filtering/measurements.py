@@ -8,6 +8,25 @@ from sortedcontainers import SortedList
 from primitives.measurement import Measurement
 from primitives.grid import Grid
 
+def measurementsToArrays(measurements):
+	""" Pack measurements into compact arrays of points, vectors, scores and
+		track ids so they can be passed between processes cheaply
+
+	"""
+	numMeasurements = len(measurements)
+	points = np.asarray([m.point for m in measurements], dtype=np.float64).reshape(numMeasurements, 2)
+	vectors = np.asarray([m.vector for m in measurements], dtype=np.float64).reshape(numMeasurements, 2)
+	scores = np.fromiter((m.score for m in measurements), dtype=np.float64, count=numMeasurements)
+	ids = np.fromiter((m.id for m in measurements), dtype=np.int64, count=numMeasurements)
+
+	return points, vectors, scores, ids
+
+def arraysToMeasurements(points, vectors, scores, ids):
+	""" Inverse of measurementsToArrays
+
+	"""
+	return [Measurement(p, v, s, i) for p, v, s, i in zip(points, vectors, scores.tolist(), ids.tolist())]
+
 class MeasurementDB(object):
 
 	def __init__(self, grid, measurementBinCapacity, filteringMethod):
@@ -17,6 +36,10 @@ class MeasurementDB(object):
 
 		self._measurementBins = defaultdict(SortedList)
 
+		# Bumped whenever a bin changes, compared against named snapshots
+		self._binVersions = defaultdict(int)
+		self._snapshots = {}
+
 	def addMeasurements(self, measurements):
 
 		for m in measurements:
@@ -26,6 +49,7 @@ class MeasurementDB(object):
 		gridCoord = self._grid.bin(measurement.point)
 
 		bucket = self._measurementBins[gridCoord]
+		self._binVersions[gridCoord] += 1
 
 		if (len(bucket) >= self._binCapacity):
 			bucket.add(measurement)
@@ -36,51 +60,76 @@ class MeasurementDB(object):
 			#heapq.heappush(bucket, measurement)
 
 	def clearMeasurements(self):
+		for key in self._measurementBins.keys():
+			self._binVersions[key] += 1
+
 		self._measurementBins.clear()
 
+	def _selectBin(self, key, measurementsPerCell):
+		mBin = self._measurementBins.get(key)
+		if not mBin:
+			return []
+
+		# Only take as many measurements as are available
+		bound = min(measurementsPerCell, len(mBin))
+
+		# Best measurement, then unique tracks, then top scores to fill
+		positions = _selectFromBin([m.id for m in mBin], bound)
+		return [mBin[i] for i in positions]
+
 	def getMeasurements(self, measurementsPerCell=None):
 		measurements = []
 
+		if measurementsPerCell is None:
+			measurementsPerCell = self._binCapacity
+
+		for key in self._measurementBins.keys():
+			measurements.extend(self._selectBin(key, measurementsPerCell))
 
+		return measurements
+
+	def snapshot(self, name, measurementsPerCell=None):
+		""" Record the current selection of each bin under name so later
+			calls to getMeasurementDelta only revisit bins changed since
+
+		"""
 		if measurementsPerCell is None:
 			measurementsPerCell = self._binCapacity
 
-		for mBin in self._measurementBins.values():
+		selections = {key: self._selectBin(key, measurementsPerCell) for key in self._measurementBins.keys()}
+		self._snapshots[name] = (measurementsPerCell, dict(self._binVersions), selections)
 
-			# Only take as many measurements as are available
-			bound = min(measurementsPerCell, len(mBin))
-			numTaken = 0
-			indexLastTaken = 0
+	def getMeasurementDelta(self, name, advance=False):
+		""" Returns lists of measurements that entered and left the selected
+			set since snapshot name was taken. With advance the snapshot is
+			moved to the current state
 
-			mID = set()
+		"""
+		measurementsPerCell, versions, selections = self._snapshots[name]
 
-			while bound > numTaken:
-				# Always take highest score measurement
-				if (numTaken == 0):
-					measurements.append(mBin[0])
-					numTaken += 1
-					indexLastTaken = 0
-					mID.add(mBin[0].id)
-				elif indexLastTaken < len(mBin)-1:
-					# If we haven't sampled all unique tracks in the bucket yet
-					startPoint = indexLastTaken + 1
-					for i, m in enumerate(mBin[startPoint:]):
-						if m.id not in mID:
-							measurements.append(m)
-							numTaken += 1
-							indexLastTaken = startPoint + i
-							mID.add(m.id)
-							break
-					# No more measurements from unique tracks in bin
-					indexLastTaken = len(mBin)-1
-				else:
-					#just grab as many top scored measurements as we need
-					# this may choose the same measurements more than once
-					measurements.extend(mBin[1:(bound - numTaken + 1)])
-					indexLastTaken = bound - numTaken
-					numTaken = bound
+		added = []
+		removed = []
+		for key, version in self._binVersions.items():
+			if versions.get(key, 0) == version:
+				continue
 
-		return measurements
+			previous = selections.get(key, [])
+			current = self._selectBin(key, measurementsPerCell)
+
+			# Measurements are compared by identity, not by score
+			previousIDs = set(map(id, previous))
+			currentIDs = set(map(id, current))
+			added.extend(m for m in current if id(m) not in previousIDs)
+			removed.extend(m for m in previous if id(m) not in currentIDs)
+
+			if advance:
+				selections[key] = current
+				versions[key] = version
+
+		return added, removed
+
+	def removeSnapshot(self, name):
+		self._snapshots.pop(name, None)
 
 	def getUniqueCoverage(self, measurementsPerCell=None):
 		"""
@@ -129,10 +178,387 @@ class MeasurementDB(object):
 
 		return coverage
 
+	def getIncidence(self, measurementsPerCell=None):
+		""" Returns arrays of track ids and cell indices, one pair for each
+			of the top x measurements per bin where x is measurementsPerCell
+
+		"""
+		if measurementsPerCell is None:
+			measurementsPerCell = self._binCapacity
+
+		trackIDs = []
+		cells = []
+		for cell, mBin in enumerate(self._measurementBins.values()):
+			ids = [m.id for m in mBin[:measurementsPerCell]]
+			trackIDs.extend(ids)
+			cells.extend([cell] * len(ids))
+
+		return np.asarray(trackIDs, dtype=np.int64), np.asarray(cells, dtype=np.int64)
+
 	def getBinnedScores(self):
 		binScore = defaultdict(list)
 
 		for key in self._measurementBins.keys():
 			binScore[key] = [-m.score for m in self._measurementBins[key]]
 
-		return binScore
\ No newline at end of file
+		return binScore
+
+def _selectFromBin(binIDs, bound):
+	""" Positions of the measurements taken from a score sorted bin given
+		the track ids of its measurements. Takes the best measurement, then
+		the best measurement of each other track in score order, then fills
+		up to bound with the best remaining measurements. Single pass over
+		the bin
+
+	"""
+	unique = []
+	repeated = []
+	seen = set()
+
+	for i, tID in enumerate(binIDs):
+		if tID not in seen:
+			seen.add(tID)
+			unique.append(i)
+			if len(unique) == bound:
+				return unique
+		elif len(repeated) < bound:
+			repeated.append(i)
+
+	return unique + repeated[:bound - len(unique)]
+
+class ArrayMeasurementDB(object):
+	""" Array backed alternative to MeasurementDB. Measurements are binned in
+		batches with vectorized integer arithmetic and each cell keeps the
+		indices and scores of its top measurementBinCapacity measurements in
+		fixed size (cells x capacity) arrays, sorted by ascending score like
+		the SortedList bins of MeasurementDB. Grid geometry is passed as the
+		image size and grid dimensions used to construct the Grid
+
+	"""
+
+	def __init__(self, imgSize, gridDim, measurementBinCapacity, filteringMethod):
+		self._width, self._height = imgSize
+		self._gridDim = tuple(gridDim)
+		self._binCapacity = measurementBinCapacity
+		self._filteringMethod = filteringMethod
+
+		numCells = self._gridDim[0] * self._gridDim[1]
+		self._binScores = np.full((numCells, measurementBinCapacity), np.inf)
+		self._binIndices = np.full((numCells, measurementBinCapacity), -1, dtype=np.int64)
+		self._binCounts = np.zeros(numCells, dtype=np.int64)
+
+		# Bumped whenever a cell changes, compared against named snapshots
+		self._binVersions = np.zeros(numCells, dtype=np.int64)
+		self._snapshots = {}
+
+		# Flat store of all measurements referenced by the bins
+		self._points = np.empty((0, 2))
+		self._vectors = np.empty((0, 2))
+		self._scores = np.empty(0)
+		self._ids = np.empty(0, dtype=np.int64)
+		self._objects = np.empty(0, dtype=object)
+		self._size = 0
+
+	def _reserve(self, numMeasurements):
+		required = self._size + numMeasurements
+		if required <= len(self._scores):
+			return
+
+		capacity = max(required, 2 * len(self._scores), 1024)
+
+		def grow(array):
+			newArray = np.empty((capacity,) + array.shape[1:], dtype=array.dtype)
+			newArray[:self._size] = array[:self._size]
+			return newArray
+
+		self._points = grow(self._points)
+		self._vectors = grow(self._vectors)
+		self._scores = grow(self._scores)
+		self._ids = grow(self._ids)
+		self._objects = grow(self._objects)
+
+	def _compact(self):
+		""" Drop measurements that were pushed out of every bin
+
+		"""
+		filled = self._binIndices >= 0
+		live = np.unique(self._binIndices[filled])
+
+		remap = np.full(self._size, -1, dtype=np.int64)
+		remap[live] = np.arange(len(live))
+		self._binIndices[filled] = remap[self._binIndices[filled]]
+
+		for name in ('_points', '_vectors', '_scores', '_ids', '_objects'):
+			array = getattr(self, name)
+			array[:len(live)] = array[live]
+
+		self._size = len(live)
+
+	def binPoints(self, points):
+		""" Returns flat cell index of each point
+
+		"""
+		points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+		cols = np.clip((points[:, 0] * self._gridDim[0] / self._width).astype(np.int64), 0, self._gridDim[0]-1)
+		rows = np.clip((points[:, 1] * self._gridDim[1] / self._height).astype(np.int64), 0, self._gridDim[1]-1)
+		return rows * self._gridDim[0] + cols
+
+	def addMeasurements(self, measurements):
+		measurements = list(measurements)
+		if len(measurements) == 0:
+			return
+
+		objects = np.empty(len(measurements), dtype=object)
+		objects[:] = measurements
+		self.addMeasurementArrays(*measurementsToArrays(measurements), objects)
+
+	def addMeasurement(self, measurement):
+		self.addMeasurements([measurement])
+
+	def addMeasurementArrays(self, points, vectors, scores, ids, objects=None):
+		""" Bin a batch of measurements given as arrays, merging them into
+			the per cell top measurementBinCapacity tables
+
+		"""
+		numNew = len(scores)
+		if numNew == 0:
+			return
+
+		self._reserve(numNew)
+		newIndices = np.arange(self._size, self._size + numNew)
+		self._points[newIndices] = points
+		self._vectors[newIndices] = vectors
+		self._scores[newIndices] = scores
+		self._ids[newIndices] = ids
+		self._objects[newIndices] = objects
+		self._size += numNew
+
+		newCells = self.binPoints(points)
+		touched = np.unique(newCells)
+
+		# Existing entries of touched cells, in score order
+		existing = self._binIndices[touched]
+		keep = existing >= 0
+		oldCells = np.repeat(touched, keep.sum(axis=1))
+
+		# Existing entries come first so ties keep their position
+		cells = np.concatenate((oldCells, newCells))
+		indices = np.concatenate((existing[keep], newIndices))
+		candidateScores = self._scores[indices]
+
+		order = np.lexsort((candidateScores, cells))
+		cells = cells[order]
+		indices = indices[order]
+
+		# Rank of each candidate within its cell, keep best capacity of each
+		cellStarts = np.searchsorted(cells, cells, side='left')
+		ranks = np.arange(len(cells)) - cellStarts
+		accepted = ranks < self._binCapacity
+
+		self._binIndices[touched] = -1
+		self._binScores[touched] = np.inf
+		self._binIndices[cells[accepted], ranks[accepted]] = indices[accepted]
+		self._binScores[cells[accepted], ranks[accepted]] = self._scores[indices[accepted]]
+		self._binCounts[touched] = 0
+		np.add.at(self._binCounts, cells[accepted], 1)
+		self._binVersions[touched] += 1
+
+		if self._size > 2 * self._binCounts.sum() + 1024:
+			self._compact()
+
+	def clearMeasurements(self):
+		self._binVersions[self._binCounts > 0] += 1
+		self._binScores.fill(np.inf)
+		self._binIndices.fill(-1)
+		self._binCounts.fill(0)
+		self._size = 0
+
+	def _cellKey(self, cell):
+		return (int(cell % self._gridDim[0]), int(cell // self._gridDim[0]))
+
+	def _materialize(self, indices):
+		""" Measurement objects for store indices, built from arrays for
+			measurements that were added as arrays
+
+		"""
+		indices = np.asarray(indices, dtype=np.int64)
+		objects = self._objects[indices]
+
+		missing = np.flatnonzero([o is None for o in objects])
+		if len(missing) > 0:
+			built = arraysToMeasurements(self._points[indices[missing]], self._vectors[indices[missing]],
+										self._scores[indices[missing]], self._ids[indices[missing]])
+			for position, measurement in zip(missing, built):
+				objects[position] = measurement
+				self._objects[indices[position]] = measurement
+
+		return list(objects)
+
+	def getMeasurementIndices(self, measurementsPerCell=None):
+		""" Store indices of the selected measurements of all bins, computed
+			in one vectorized pass. Same selection as _selectFromBin: best
+			measurement, then unique tracks, then top scores to fill
+
+		"""
+		if measurementsPerCell is None:
+			measurementsPerCell = self._binCapacity
+
+		cells = np.flatnonzero(self._binCounts)
+		if len(cells) == 0:
+			return np.empty(0, dtype=np.int64)
+
+		binIndices = self._binIndices[cells]
+		filled = binIndices >= 0
+		binIDs = np.where(filled, self._ids[np.maximum(binIndices, 0)], np.iinfo(np.int64).max)
+
+		# First occurrence of each track id within its bin
+		order = np.argsort(binIDs, axis=1, kind='stable')
+		sortedIDs = np.take_along_axis(binIDs, order, axis=1)
+		firstSorted = np.ones(sortedIDs.shape, dtype=bool)
+		firstSorted[:, 1:] = sortedIDs[:, 1:] != sortedIDs[:, :-1]
+		first = np.empty_like(firstSorted)
+		np.put_along_axis(first, order, firstSorted, axis=1)
+
+		# Unique tracks in score order come before repeats in score order
+		capacity = binIndices.shape[1]
+		priority = np.where(first, 0, capacity) + np.arange(capacity)
+		priority[~filled] = 2 * capacity
+		selection = np.argsort(priority, axis=1, kind='stable')
+
+		bounds = np.minimum(measurementsPerCell, self._binCounts[cells])
+		taken = np.arange(capacity) < bounds[:, np.newaxis]
+
+		return np.take_along_axis(binIndices, selection, axis=1)[taken]
+
+	def getMeasurementArrays(self, measurementsPerCell=None):
+		""" Points, vectors, scores and track ids of the selected
+			measurements without building Measurement objects
+
+		"""
+		indices = self.getMeasurementIndices(measurementsPerCell)
+		return self._points[indices], self._vectors[indices], self._scores[indices], self._ids[indices]
+
+	def getMeasurements(self, measurementsPerCell=None):
+		return self._materialize(self.getMeasurementIndices(measurementsPerCell))
+
+	def _selectCells(self, cells, measurementsPerCell):
+		""" Returns dict from cell to its selected Measurement objects
+
+		"""
+		cellIndices = []
+		for cell in cells:
+			binIndices = self._binIndices[cell, :self._binCounts[cell]]
+			bound = min(measurementsPerCell, len(binIndices))
+			positions = _selectFromBin(self._ids[binIndices].tolist(), bound) if bound > 0 else []
+			cellIndices.append(binIndices[positions])
+
+		if len(cellIndices) == 0:
+			return {}
+
+		objects = self._materialize(np.concatenate(cellIndices))
+		offsets = np.cumsum([0] + [len(indices) for indices in cellIndices]).tolist()
+
+		return {int(cell): objects[offsets[i]:offsets[i+1]] for i, cell in enumerate(cells)}
+
+	def snapshot(self, name, measurementsPerCell=None):
+		""" Record the current selection of each cell under name so later
+			calls to getMeasurementDelta only revisit cells changed since
+
+		"""
+		if measurementsPerCell is None:
+			measurementsPerCell = self._binCapacity
+
+		selections = self._selectCells(np.flatnonzero(self._binCounts), measurementsPerCell)
+		self._snapshots[name] = (measurementsPerCell, self._binVersions.copy(), selections)
+
+	def getMeasurementDelta(self, name, advance=False):
+		""" Returns lists of measurements that entered and left the selected
+			set since snapshot name was taken. With advance the snapshot is
+			moved to the current state
+
+		"""
+		measurementsPerCell, versions, selections = self._snapshots[name]
+
+		changed = np.flatnonzero(self._binVersions != versions)
+		currentSelections = self._selectCells(changed, measurementsPerCell)
+
+		added = []
+		removed = []
+		for cell in changed.tolist():
+			previous = selections.get(cell, [])
+			current = currentSelections.get(cell, [])
+
+			# Measurements are compared by identity, not by score
+			previousIDs = set(map(id, previous))
+			currentIDs = set(map(id, current))
+			added.extend(m for m in current if id(m) not in previousIDs)
+			removed.extend(m for m in previous if id(m) not in currentIDs)
+
+			if advance:
+				selections[cell] = current
+
+		if advance:
+			versions[changed] = self._binVersions[changed]
+
+		return added, removed
+
+	def removeSnapshot(self, name):
+		self._snapshots.pop(name, None)
+
+	def getUniqueCoverage(self, measurementsPerCell=None):
+		"""
+			Iterate through all measurement bins and try to collect top
+			x unique measurement ids per bin where x is measurementsPerCell
+		"""
+		coverage = set()
+
+		if measurementsPerCell is None:
+			measurementsPerCell = self._binCapacity
+
+		for cell in np.flatnonzero(self._binCounts):
+			binIDs = self._ids[self._binIndices[cell, :self._binCounts[cell]]].tolist()
+			bound = min(measurementsPerCell, len(binIDs))
+			numTaken = 0
+
+			for mID in binIDs:
+				if numTaken >= bound:
+					break
+				if mID not in coverage:
+					coverage.add(mID)
+					numTaken += 1
+
+		return coverage
+
+	def getCoverage(self, measurementsPerCell=None):
+		"""
+			Collect top x measurement ids per bin where x is
+			measurementsPerCell
+		"""
+		if measurementsPerCell is None:
+			measurementsPerCell = self._binCapacity
+
+		topIndices = self._binIndices[:, :measurementsPerCell]
+		return set(self._ids[topIndices[topIndices >= 0]].tolist())
+
+	def getIncidence(self, measurementsPerCell=None):
+		""" Returns arrays of track ids and flat cell indices, one pair for
+			each of the top x measurements per bin where x is
+			measurementsPerCell
+
+		"""
+		if measurementsPerCell is None:
+			measurementsPerCell = self._binCapacity
+
+		topIndices = self._binIndices[:, :measurementsPerCell]
+		filled = topIndices >= 0
+		cells = np.broadcast_to(np.arange(len(topIndices))[:, np.newaxis], topIndices.shape)
+
+		return self._ids[topIndices[filled]], cells[filled]
+
+	def getBinnedScores(self):
+		binScore = defaultdict(list)
+
+		for cell in np.flatnonzero(self._binCounts):
+			binScore[self._cellKey(cell)] = (-self._binScores[cell, :self._binCounts[cell]]).tolist()
+
+		return binScore
@@ -1,10 +1,80 @@
+import json
+import numpy as np
+
 from sortedcontainers import SortedList
 
 from primitives.track import Track, TrackState
 
+from ..storage.archive import TrackBatch, buildTrack
+from ..storage.reader import TrackReader
+
+class TrackQualityFilter(object):
+	""" Batched quality gate for promoting tracks to the historical db.
+		Evaluates all candidate tracks at once from stacked arrays of their
+		ages, displacements, distances and average speeds
+
+	"""
+
+	# Rejection criteria in the order they are checked
+	criteria = ('stationary', 'age', 'displacement', 'speed', 'meandering')
+
+	def __init__(self, minAge=1.55, minDisplacement=100, minSpeed=1, meanderingRatio=0.9, minDistance=0.1):
+		self._minAge = minAge
+		self._minDisplacement = minDisplacement
+		self._minSpeed = minSpeed
+		self._meanderingRatio = meanderingRatio
+
+		# Tracks shorter than this are considered stationary
+		self._minDistance = minDistance
+
+	def evaluate(self, ages, displacements, distances, speeds=None):
+		""" Returns a mask of accepted tracks and a dict with the number of
+			tracks rejected by each criterion. Each rejected track is only
+			counted against the first criterion it fails
+
+		"""
+		ages = np.asarray(ages, dtype=np.float64)
+		displacements = np.asarray(displacements, dtype=np.float64)
+		distances = np.asarray(distances, dtype=np.float64)
+
+		with np.errstate(divide='ignore', invalid='ignore'):
+			if speeds is None:
+				speeds = distances / ages
+			meanderingRatios = displacements / distances
+
+		failures = (distances < self._minDistance,
+					ages < self._minAge,
+					displacements < self._minDisplacement,
+					np.asarray(speeds) < self._minSpeed,
+					~(meanderingRatios >= self._meanderingRatio))
+
+		accepted = np.ones(len(ages), dtype=bool)
+		rejections = {}
+		for criterion, failed in zip(self.criteria, failures):
+			rejected = accepted & failed
+			rejections[criterion] = int(np.count_nonzero(rejected))
+			accepted &= ~rejected
+
+		return accepted, rejections
+
+	def evaluateTracks(self, tracks):
+		""" Stack statistics from a list of Track objects and evaluate them
+
+		"""
+		numTracks = len(tracks)
+		ages = np.fromiter((t.age() for t in tracks), dtype=np.float64, count=numTracks)
+		displacements = np.fromiter((t.displacement() for t in tracks), dtype=np.float64, count=numTracks)
+		distances = np.fromiter((t.distance() for t in tracks), dtype=np.float64, count=numTracks)
+		speeds = np.fromiter((t.avgSpeedFast for t in tracks), dtype=np.float64, count=numTracks)
+
+		return self.evaluate(ages, displacements, distances, speeds)
+
 class TrackDB(object):
 
-	def __init__(self, threshold=0.004, minAge=1.55, minDisplacement=100, minSpeed=1, meanderingRatio=0.9, maxTracks=20000):
+	def __init__(self, threshold=0.004, minAge=1.55, minDisplacement=100, minSpeed=1, meanderingRatio=0.9, maxTracks=20000, verbose=False):
+		# Print track counts on every update
+		self._verbose = verbose
+
 		# Threshold for moving tracks to historical db
 		self._historicalThreshold = threshold # 0.004 Allows 1 frame drop with 30 fps video
 
@@ -20,12 +90,18 @@ class TrackDB(object):
 		# Min Meandering ratio: displacement/(avgSpeed * age)
 		self._meanderingRatio = meanderingRatio
 
-		print(threshold, minAge, minDisplacement, minSpeed, meanderingRatio)
+		if verbose:
+			print(threshold, minAge, minDisplacement, minSpeed, meanderingRatio)
+
+		# Batched quality gate for historical tracks and tally of rejections
+		self._qualityFilter = TrackQualityFilter(minAge, minDisplacement, minSpeed, meanderingRatio)
+		self._rejectionCounts = dict.fromkeys(TrackQualityFilter.criteria, 0)
 
 		# List of active tracks
 		self._activeList = []
 
-		# SortedList of historical tracks
+		# SortedList of historical tracks, or of (score, id) entries once
+		# tracks are streamed to a writer
 		self._historicalList = SortedList()
 
 		# Max number of historical tracks to maintain
@@ -34,10 +110,40 @@ class TrackDB(object):
 		# Don't save pruned tracks unless specified
 		self._savePruned = False
 		self._prunedDir = None
+		self._numPruned = 0
+		self._numPruneEvents = 0
+
+		# Background writer that receives tracks as they become historical,
+		# and a reader over its output refreshed as files are added
+		self._writer = None
+		self._reader = None
+
+		# Id of the next new track, saved with checkpoints so restored runs
+		# continue past the ids of restored and pruned tracks
+		self._nextID = 0
 
-	def savePrunedTracks(self, prunedDir):
+	def savePrunedTracks(self, prunedDir, trackFormat='json'):
 		self._prunedDir = prunedDir
+		self._prunedFormat = trackFormat
 		self._savePruned = True
+		self._numPruneEvents = 0
+
+	def streamTracks(self, writer):
+		""" Hand every track promoted to historical to writer. Historical
+			tracks are then already on disk, so only their score and id are
+			kept to rank them for pruning
+
+		"""
+		self._writer = writer
+		self._reader = None
+
+	def _addHistorical(self, tracks):
+		if self._writer is None:
+			self._historicalList.update(tracks)
+			return
+
+		self._writer.write(tracks)
+		self._historicalList.update((t.score, t.id) for t in tracks)
 
 	def getActiveTracks(self):
 		return self._activeList
@@ -46,13 +152,41 @@ class TrackDB(object):
 		return len(self._activeList)
 
 	def getHistoricalTracks(self):
-		return self._historicalList
+		""" Historical tracks in rank order, streamed tracks are read back
+			from the writer output
+
+		"""
+		if self._writer is None:
+			return self._historicalList
+
+		self._writer.flush()
+		if self._reader is None:
+			self._reader = TrackReader(self._writer.directory)
+		else:
+			self._reader.refresh()
+
+		return [self._reader[tID] for score, tID in self._historicalList]
+
+	def getHistoricalIDs(self):
+		if self._writer is None:
+			return [t.id for t in self._historicalList]
+
+		return [tID for score, tID in self._historicalList]
 
 	def getAllTracks(self):
 		tracks = list(self._activeList)
-		tracks.extend(self._historicalList)
+		tracks.extend(self.getHistoricalTracks())
 		return tracks
 
+	def getNumHistoricalTracks(self):
+		return len(self._historicalList)
+
+	def getNumPrunedTracks(self):
+		return self._numPruned
+
+	def getRejectionCounts(self):
+		return dict(self._rejectionCounts)
+
 	def getActiveEndpoints(self):
 		endpoints = [t.endPoint for t in self._activeList]
 		return endpoints
@@ -63,35 +197,35 @@ class TrackDB(object):
 	def addNewTracks(self, tracks):
 		self._activeList.extend(tracks)
 
+	def _newTrack(self, point, timestamp):
+		track = Track.from_point(point, timestamp)
+		track.id = self._nextID
+		self._nextID += 1
+		return track
+
+	def addNewPoints(self, points, timestamp):
+		self._activeList.extend([self._newTrack(p, timestamp) for p in points])
+
+	def _filterCandidates(self, candidates):
+		""" Run the quality gate over candidates, returning accepted tracks
+
+		"""
+		if len(candidates) == 0:
+			return []
+
+		accepted, rejections = self._qualityFilter.evaluateTracks(candidates)
+		for criterion, count in rejections.items():
+			self._rejectionCounts[criterion] += count
+
+		return [t for t, keep in zip(candidates, accepted) if keep]
+
 	def terminateActiveTracks(self):
 		activeList = self._activeList
 		del self._activeList
 		self._activeList = []
 
-		for t in activeList:
-			age = t.age()
-			displacement = t.displacement()
-			distance = t.distance()
-			if distance < 0.1:
-				del t
-				continue
-				
-			meanderingRatio = displacement / distance
-			if (age < self._minAge):
-				#print('track age too short')
-				del t
-			elif (displacement < self._minDisplacement):
-				#print('track displacement too short')
-				del t
-			elif (t.avgSpeedFast < self._minSpeed):
-				#print('track too slow')
-				del t
-			elif (meanderingRatio < self._meanderingRatio):
-				#print('track meanders')
-				del t
-			else:
-				# Don't set state to historical so we can tell it was still active
-				self._historicalList.add(t)
+		# Don't set state to historical so we can tell it was still active
+		self._addHistorical(self._filterCandidates(activeList))
 
 	def updateActiveTracks(self, points, timestamp):
 		#todo: check that length of points is same as number of active tracks
@@ -99,6 +233,9 @@ class TrackDB(object):
 		del self._activeList
 		self._activeList = []
 
+		# Tracks lost long enough to be considered for storage
+		candidates = []
+
 		for i, t in enumerate(activeList):
 
 			if (points[i] is not None):
@@ -108,36 +245,22 @@ class TrackDB(object):
 				#t.state = TrackState.ACTIVE
 				self._activeList.append(t)
 				#heapq.heappush(self._activeList, t)
+			elif (timestamp - t.lastSeen > self._historicalThreshold and t.size() > 1):
+				candidates.append(t)
 			else:
-				if (timestamp - t.lastSeen > self._historicalThreshold and t.size() > 1):
-					# Candidate for storage
-					age = t.age()
-					displacement = t.displacement()
-					distance = t.distance()
-					meanderingRatio = displacement / distance
-					if (age < self._minAge):
-						#print('track age too short')
-						del t
-					elif (displacement < self._minDisplacement):
-						#print('track displacement too short')
-						del t
-					elif (t.avgSpeedFast < self._minSpeed):
-						#print('track too slow')
-						del t
-					elif (meanderingRatio < self._meanderingRatio):
-						#print('track meanders')
-						del t
-					else:
-						#print('moving track to historical db', age, displacement)
-						t.state = TrackState.HISTORICAL
-						self._historicalList.add(t)
-				else:
-					t.state = TrackState.LOST
-					self._activeList.append(t)
+				t.state = TrackState.LOST
+				self._activeList.append(t)
 
 		del activeList
 
-		print(f"Updating tracks. Active: {len(self._activeList)}, Historical: {len(self._historicalList)}")
+		accepted = self._filterCandidates(candidates)
+		for t in accepted:
+			#print('moving track to historical db', t.age(), t.displacement())
+			t.state = TrackState.HISTORICAL
+		self._addHistorical(accepted)
+
+		if self._verbose:
+			print(f"Updating tracks. Active: {len(self._activeList)}, Historical: {len(self._historicalList)}")
 
 		if (len(self._historicalList) > self._maxTracks):
 			self.pruneTracks()
@@ -147,8 +270,380 @@ class TrackDB(object):
 		if numTracks is None:
 			numTracks = int(self._maxTracks/2)
 
-		if self._savePruned:
+		# Streamed tracks are on disk already, readers skip them once their
+		# ids are in the pruned manifest. Otherwise save the pruned tail
+		if self._writer is not None:
+			self._writer.prune([tID for score, tID in self._historicalList[numTracks:]])
+
+		savePruned = self._savePruned and self._writer is None
+
+		if savePruned and self._prunedFormat == 'archive':
+			# One archive per pruning event
+			batch = TrackBatch.from_tracks(self._historicalList[numTracks:])
+			batch.save(f"{self._prunedDir}/pruned_{self._numPruneEvents:04d}{TrackBatch.extension}")
+			self._numPruneEvents += 1
+		elif savePruned:
 			for track in self._historicalList[numTracks:]:
 				track.save(f"{self._prunedDir}/track_{track.id}.json")
 
-		del self._historicalList[numTracks:]
\ No newline at end of file
+		self._numPruned += max(len(self._historicalList) - numTracks, 0)
+		del self._historicalList[numTracks:]
+
+	def saveCheckpoint(self, directory):
+		""" Write active tracks with their states, historical tracks and the
+			track id and pruning and rejection counters to directory.
+			Historical tracks already streamed to disk are recorded by score
+			and id only
+
+		"""
+		checkpointTracks = [('active', self.getActiveTracks())]
+		if self._writer is None:
+			checkpointTracks.append(('historical', list(self._historicalList)))
+
+		for name, tracks in checkpointTracks:
+			metadata = {'states': [t.state.name for t in tracks]}
+			TrackBatch.from_tracks(tracks, metadata).save(f"{directory}/{name}{TrackBatch.extension}")
+
+		state = {'numPruned': self._numPruned, 'numPruneEvents': self._numPruneEvents,
+				'rejectionCounts': self._rejectionCounts, 'nextID': int(self._nextID)}
+		if self._writer is not None:
+			state['historicalRanking'] = [[float(score), int(tID)] for score, tID in self._historicalList]
+
+		with open(f"{directory}/trackdb.json", mode='w') as f:
+			json.dump(state, f)
+
+	def loadCheckpoint(self, directory):
+		""" Replace contents of the db with a checkpoint written by
+			saveCheckpoint. Restored tracks keep their ids
+
+		"""
+		with open(f"{directory}/trackdb.json", mode='r') as f:
+			state = json.load(f)
+
+		self._numPruned = state['numPruned']
+		self._numPruneEvents = state['numPruneEvents']
+		self._rejectionCounts.update(state['rejectionCounts'])
+
+		active = _loadTracks(f"{directory}/active{TrackBatch.extension}")
+
+		if 'historicalRanking' in state:
+			# Streamed checkpoint, historical tracks are in the writer output
+			self._historicalList = SortedList((score, tID) for score, tID in state['historicalRanking'])
+		else:
+			self._historicalList = SortedList(_loadTracks(f"{directory}/historical{TrackBatch.extension}"))
+
+		self._restoreActiveTracks(active)
+		self._nextID = state['nextID']
+
+	def _restoreActiveTracks(self, tracks):
+		self._activeList = list(tracks)
+
+class ColumnarTrackDB(TrackDB):
+	""" Drop in replacement for TrackDB that keeps active tracks in
+		preallocated numpy arrays indexed by slot. Endpoint fetches, updates
+		and the lost/historical decision are vectorized over all active
+		tracks. Observations are appended to a shared log where each entry
+		links to the previous observation of its track, so memory follows
+		the number of live observations rather than slots times the longest
+		track. Tracks are only instantiated as Track objects once they are
+		promoted to the historical db, with ids assigned when they start
+
+	"""
+
+	def __init__(self, threshold=0.004, minAge=1.55, minDisplacement=100, minSpeed=1, meanderingRatio=0.9, maxTracks=20000,
+				capacity=2048, historyLength=64, verbose=False):
+		super().__init__(threshold, minAge, minDisplacement, minSpeed, meanderingRatio, maxTracks, verbose)
+
+		# Active tracks are stored in slots, list is not used
+		self._activeList = None
+
+		# Slots of active tracks in the order their endpoints are reported
+		self._activeSlots = np.empty(0, dtype=np.intp)
+
+		self._capacity = 0
+		self._freeSlots = []
+
+		self._allocate(capacity)
+
+		# Observation log, initially historyLength entries per slot
+		self._minLogCapacity = capacity * historyLength
+		self._logSize = 0
+		self._allocateLog(self._minLogCapacity)
+
+	def _allocate(self, capacity):
+		""" Grow slot storage to capacity, preserving existing slot contents
+
+		"""
+		oldCapacity = self._capacity
+
+		def grow(array, shape, dtype, fill=0):
+			newArray = np.full(shape, fill, dtype=dtype)
+			if array is not None:
+				newArray[:oldCapacity] = array
+			return newArray
+
+		self._startPoints = grow(getattr(self, '_startPoints', None), (capacity, 2), np.float32)
+		self._endPoints = grow(getattr(self, '_endPoints', None), (capacity, 2), np.float32)
+		self._firstSeen = grow(getattr(self, '_firstSeen', None), capacity, np.float64)
+		self._lastSeen = grow(getattr(self, '_lastSeen', None), capacity, np.float64)
+		self._distances = grow(getattr(self, '_distances', None), capacity, np.float64)
+		self._lengths = grow(getattr(self, '_lengths', None), capacity, np.intp)
+		self._lost = grow(getattr(self, '_lost', None), capacity, bool, False)
+		self._trackIDs = grow(getattr(self, '_trackIDs', None), capacity, np.int64)
+
+		# Log index of the latest observation of each slot and a counter
+		# bumped on release so log entries of old tracks can be told apart
+		self._tails = grow(getattr(self, '_tails', None), capacity, np.intp, -1)
+		self._generations = grow(getattr(self, '_generations', None), capacity, np.int64)
+
+		# Hand out lowest slots first
+		self._freeSlots.extend(range(capacity-1, oldCapacity-1, -1))
+		self._capacity = capacity
+
+	def _allocateLog(self, logCapacity):
+		""" Resize the observation log, keeping the first logSize entries
+
+		"""
+		size = self._logSize
+
+		def resize(array, shape, dtype):
+			newArray = np.empty(shape, dtype=dtype)
+			if array is not None:
+				newArray[:size] = array[:size]
+			return newArray
+
+		self._logPoints = resize(getattr(self, '_logPoints', None), (logCapacity, 2), np.float32)
+		self._logTimes = resize(getattr(self, '_logTimes', None), logCapacity, np.float64)
+		self._logPrevious = resize(getattr(self, '_logPrevious', None), logCapacity, np.intp)
+		self._logSlots = resize(getattr(self, '_logSlots', None), logCapacity, np.intp)
+		self._logGenerations = resize(getattr(self, '_logGenerations', None), logCapacity, np.int64)
+		self._logCapacity = logCapacity
+
+	def _compactLog(self):
+		""" Drop log entries of released tracks, relinking the remaining
+			entries. Order of entries is preserved
+
+		"""
+		size = self._logSize
+		live = self._logGenerations[:size] == self._generations[self._logSlots[:size]]
+		newIndex = np.cumsum(live) - 1
+
+		previous = self._logPrevious[:size][live]
+		previous = np.where(previous >= 0, newIndex[np.maximum(previous, 0)], -1)
+
+		numLive = int(np.count_nonzero(live))
+		self._logPoints[:numLive] = self._logPoints[:size][live]
+		self._logTimes[:numLive] = self._logTimes[:size][live]
+		self._logSlots[:numLive] = self._logSlots[:size][live]
+		self._logGenerations[:numLive] = self._logGenerations[:size][live]
+		self._logPrevious[:numLive] = previous
+		self._logSize = numLive
+
+		hasTail = self._tails >= 0
+		self._tails[hasTail] = newIndex[self._tails[hasTail]]
+
+	def _reserveLog(self, numEntries):
+		if self._logSize + numEntries <= self._logCapacity:
+			return
+
+		self._compactLog()
+
+		# Keep half the log free after compaction so compactions stay rare,
+		# shrinking once long tracks have been released
+		required = 2 * (self._logSize + numEntries)
+		if required > self._logCapacity or 2 * required < self._logCapacity:
+			self._allocateLog(max(required, self._minLogCapacity))
+
+	def _acquireSlots(self, numSlots):
+		if numSlots > len(self._freeSlots):
+			self._allocate(max(2 * self._capacity, self._capacity + numSlots))
+
+		slots = np.asarray(self._freeSlots[-numSlots:][::-1], dtype=np.intp)
+		del self._freeSlots[len(self._freeSlots) - numSlots:]
+
+		self._trackIDs[slots] = np.arange(self._nextID, self._nextID + numSlots)
+		self._nextID += numSlots
+		return slots
+
+	def _releaseSlots(self, slots):
+		self._lengths[slots] = 0
+		self._lost[slots] = False
+		self._tails[slots] = -1
+		self._generations[slots] += 1
+		self._freeSlots.extend(slots.tolist())
+
+	def _appendObservations(self, slots, points, timestamps):
+		""" Append one observation to each slot in slots
+
+		"""
+		if len(slots) == 0:
+			return
+
+		lengths = self._lengths[slots]
+
+		# Accumulate path length for slots that already have observations
+		hasPrevious = lengths > 0
+		steps = np.linalg.norm(points - self._endPoints[slots], axis=1)
+		self._distances[slots] += np.where(hasPrevious, steps, 0.0)
+
+		self._reserveLog(len(slots))
+		entries = np.arange(self._logSize, self._logSize + len(slots))
+		self._logPoints[entries] = points
+		self._logTimes[entries] = timestamps
+		self._logPrevious[entries] = self._tails[slots]
+		self._logSlots[entries] = slots
+		self._logGenerations[entries] = self._generations[slots]
+		self._logSize += len(slots)
+		self._tails[slots] = entries
+
+		self._endPoints[slots] = points
+		self._lastSeen[slots] = timestamps
+
+		first = slots[~hasPrevious]
+		self._startPoints[first] = points[~hasPrevious]
+		self._distances[first] = 0.0
+		self._firstSeen[first] = np.broadcast_to(timestamps, slots.shape)[~hasPrevious]
+
+		self._lengths[slots] = lengths + 1
+
+	def _trackStatistics(self, slots):
+		""" Returns age, displacement and distance for each slot in slots
+
+		"""
+		ages = self._lastSeen[slots] - self._firstSeen[slots]
+		displacements = np.linalg.norm(self._endPoints[slots] - self._startPoints[slots], axis=1)
+		distances = self._distances[slots]
+		return ages, displacements, distances
+
+	def _buildTrack(self, slot, state=None):
+		# Walk the log back from the latest observation of the slot
+		entries = np.empty(self._lengths[slot], dtype=np.intp)
+		entry = self._tails[slot]
+		for i in range(len(entries) - 1, -1, -1):
+			entries[i] = entry
+			entry = self._logPrevious[entry]
+
+		track = buildTrack(int(self._trackIDs[slot]), self._logTimes[entries], self._logPoints[entries])
+
+		if state is not None:
+			track.state = state
+		elif self._lost[slot]:
+			track.state = TrackState.LOST
+
+		return track
+
+	def _promoteSlots(self, slots, state=None):
+		if len(slots) > 0:
+			accepted, rejections = self._qualityFilter.evaluate(*self._trackStatistics(slots))
+			for criterion, count in rejections.items():
+				self._rejectionCounts[criterion] += count
+
+			self._addHistorical([self._buildTrack(slot, state) for slot in slots[accepted]])
+
+		self._releaseSlots(slots)
+
+	def getActiveTracks(self):
+		return [self._buildTrack(slot) for slot in self._activeSlots]
+
+	def _restoreActiveTracks(self, tracks):
+		self._releaseSlots(self._activeSlots)
+		self._activeSlots = np.empty(0, dtype=np.intp)
+		self.addNewTracks(tracks)
+
+		lost = np.fromiter((t.state == TrackState.LOST for t in tracks), dtype=bool, count=len(tracks))
+		self._lost[self._activeSlots[lost]] = True
+
+	def getNumActiveTracks(self):
+		return len(self._activeSlots)
+
+	def getAllTracks(self):
+		tracks = self.getActiveTracks()
+		tracks.extend(self.getHistoricalTracks())
+		return tracks
+
+	def getActiveEndpoints(self):
+		return self._endPoints[self._activeSlots]
+
+	def addNewTrack(self, track):
+		self.addNewTracks([track])
+
+	def addNewTracks(self, tracks):
+		for t in tracks:
+			times = np.asarray(t.times, dtype=np.float64)
+			positions = np.asarray(t.positions, dtype=np.float32).reshape(-1, 2)
+
+			slot = self._acquireSlots(1)
+			self._trackIDs[slot] = t.id
+			for point, timestamp in zip(positions, times):
+				self._appendObservations(slot, point.reshape(1, 2), timestamp)
+
+			self._activeSlots = np.append(self._activeSlots, slot)
+
+	def addNewPoints(self, points, timestamp):
+		points = np.asarray(points, dtype=np.float32).reshape(-1, 2)
+		if len(points) == 0:
+			return
+
+		slots = self._acquireSlots(len(points))
+		self._appendObservations(slots, points, timestamp)
+
+		self._activeSlots = np.concatenate((self._activeSlots, slots))
+
+	def terminateActiveTracks(self):
+		activeSlots = self._activeSlots
+		self._activeSlots = np.empty(0, dtype=np.intp)
+
+		# Don't set state to historical so we can tell it was still active
+		self._promoteSlots(activeSlots)
+
+	def updateActiveTracks(self, points, timestamp):
+		found, trackedPoints = _unpackTrackedPoints(points, len(self._activeSlots))
+
+		activeSlots = self._activeSlots
+		trackedSlots = activeSlots[found]
+		self._appendObservations(trackedSlots, trackedPoints[found], timestamp)
+
+		# Tracks that were not found are either lost or candidates for storage
+		missing = ~found
+		self._lost[activeSlots[missing]] = True
+		expired = (missing & (timestamp - self._lastSeen[activeSlots] > self._historicalThreshold)
+			& (self._lengths[activeSlots] > 1))
+
+		self._activeSlots = activeSlots[~expired]
+		self._promoteSlots(activeSlots[expired], TrackState.HISTORICAL)
+
+		if self._verbose:
+			print(f"Updating tracks. Active: {len(self._activeSlots)}, Historical: {len(self._historicalList)}")
+
+		if (len(self._historicalList) > self._maxTracks):
+			self.pruneTracks()
+
+
+def _loadTracks(filename):
+	""" Tracks of a checkpoint archive with their saved states
+
+	"""
+	batch = TrackBatch.from_file(filename, mmap=False)
+	tracks = batch.toTracks()
+	for t, state in zip(tracks, batch.metadata['states']):
+		t.state = TrackState[state]
+
+	return tracks
+
+def _unpackTrackedPoints(points, numTracks):
+	""" Convert the output of the tracker into a found mask and an (n,2)
+		array of points. Accepts either a list with None for lost points or
+		an array with nan rows for lost points
+
+	"""
+	if isinstance(points, np.ndarray) and points.dtype != object:
+		trackedPoints = points.reshape(numTracks, 2).astype(np.float32)
+		found = ~np.isnan(trackedPoints).any(axis=1)
+		return found, trackedPoints
+
+	found = np.fromiter((p is not None for p in points), dtype=bool, count=numTracks)
+	trackedPoints = np.zeros((numTracks, 2), dtype=np.float32)
+	if found.any():
+		trackedPoints[found] = np.asarray([np.ravel(p) for p in points if p is not None], dtype=np.float32)
+
+	return found, trackedPoints
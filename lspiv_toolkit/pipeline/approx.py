@@ -2,30 +2,69 @@ import glob
 import time
 import os
 
+from concurrent.futures import ProcessPoolExecutor
+
 from primitives.track import Track
 from primitives.grid import Grid
 
 from cv_toolkit.cams import FisheyeCamera
-from cv_toolkit.transform.camera import UndistortionTransform
-from cv_toolkit.transform.common import PixelCoordinateTransform
 
-from ..filtering.measurements import MeasurementDB
+from ..filtering.measurements import MeasurementDB, ArrayMeasurementDB, measurementsToArrays, arraysToMeasurements
+from ..storage.reader import TrackReader
+from ..approx.online import OnlineGPApproximator
+from ..approx.tiled import TiledGPApproximator
+from ..approx.raster import RasterField
+from ..transform.camera import CameraTransform
+from ..transform.cache import CameraTransformCache
 
 import field_toolkit.approx as field_approx
 
+# Per process state for measurement workers, set up by initializer
+_worker = {}
+
+def _initMeasurementWorker(camera, measurementParams, cacheDir):
+	if cacheDir is not None:
+		_worker['camTrans'] = CameraTransformCache(camera, cacheDir)
+	else:
+		_worker['camTrans'] = CameraTransform(camera)
+	_worker['params'] = measurementParams
+	_worker['readers'] = {}
+
+def _measureShard(shard):
+	""" Load, transform and measure a shard of tracks in a worker process.
+		Measurements are returned as compact arrays rather than objects
+
+	"""
+	trackDir, ids = shard
+
+	readers = _worker['readers']
+	if trackDir not in readers:
+		readers[trackDir] = TrackReader(trackDir)
+
+	tracks = list(readers[trackDir].subset(ids))
+	transformedTracks = _worker['camTrans'].transformTracks(tracks)
+
+	measurements = []
+	for t in transformedTracks:
+		measurements.extend(t.measureVelocity(**_worker['params']))
+
+	return measurementsToArrays(measurements)
+
 class ApproximationPipeline(object):
 
-	def __init__(self, config=None):
+	def __init__(self, config=None, camera=None):
 		if config is not None:
-			self.load(config)
+			self.load(config, camera)
 		else:
 			self._config = None
 
-	def load(self, config):
+	def load(self, config, camera=None):
 		self._config = config
 
-		# Load camera from file
-		self._camera = FisheyeCamera.from_file(config.camFile)
+		# Load camera from file unless one is given, e.g. for synthetic data
+		if camera is None:
+			camera = FisheyeCamera.from_file(config.camFile)
+		self._camera = camera
 
 		# Set input and track directories
 		self._inputDir = config.inputDir		
@@ -35,11 +74,18 @@ class ApproximationPipeline(object):
 		self._measurementGrid = Grid(*self._camera.imgSize, *config.measurementGridDim)
 
 		# Initialize measurement filtering database
-		self._mDB = MeasurementDB(self._measurementGrid, **config.getFilteringParams())
+		if config.measurementStorage == 'array':
+			self._mDB = ArrayMeasurementDB(self._camera.imgSize, config.measurementGridDim, **config.getFilteringParams())
+		else:
+			self._mDB = MeasurementDB(self._measurementGrid, **config.getFilteringParams())
 
-		# Initialize transformations
-		self._unTrans = UndistortionTransform(self._camera)
-		self._pxTrans = PixelCoordinateTransform(self._camera.imgSize)
+		# Initialize fused undistortion and pixel coordinate transform
+		if config.cacheTransforms:
+			self._transformCacheDir = config.transformCacheDir or f"{self._inputDir}/transform_cache"
+			self._camTrans = CameraTransformCache(self._camera, self._transformCacheDir)
+		else:
+			self._transformCacheDir = None
+			self._camTrans = CameraTransform(self._camera)
 
 		# Initialize approximation object
 		if config.approximationMethod == 'simple':
@@ -50,6 +96,12 @@ class ApproximationPipeline(object):
 			self._gp = field_approx.gp.SparseGPApproximator()
 		elif config.approximationMethod == 'integral':
 			self._gp = field_approx.gp.IntegralGPApproximator()
+		elif config.approximationMethod == 'online':
+			bounds = [0, self._camera.imgSize[0], 0, self._camera.imgSize[1]]
+			self._gp = OnlineGPApproximator(bounds, **config.getOnlineParams())
+		elif config.approximationMethod == 'tiled':
+			bounds = [0, self._camera.imgSize[0], 0, self._camera.imgSize[1]]
+			self._gp = TiledGPApproximator(bounds, **config.getTiledParams())
 		else:
 			print("Error: Unknown approximation method")
 			exit()
@@ -71,26 +123,127 @@ class ApproximationPipeline(object):
 		self._mDB.clearMeasurements()
 		self._gp.clearMeasurements()
 
-	def run(self):
-		startTime = time.time()
+		# Online approximation follows changes to the selected measurements
+		self._online = isinstance(self._gp, OnlineGPApproximator)
+		if self._online:
+			self._mDB.snapshot('online', self._config.measurementsPerCell)
+		self._lastPublishTime = time.time()
 
-		# Load training tracks
-		trackFiles = []
-		for subset in self._config.trainingSets:
-			trackFiles.extend(glob.glob(f"{self._trackDir}/{subset}/track_*.json"))
+	def _extractMeasurements(self):
+		""" Load all training tracks at once, then transform and measure them
 
-		print(f"Loading {len(trackFiles)} tracks")
+		"""
+		# Load training tracks, skipping tracks pruned after they were streamed
+		readers = [TrackReader(f"{self._trackDir}/{subset}") for subset in self._config.trainingSets]
 
-		tracks = Track.from_file_list(trackFiles)
+		print(f"Loading {sum(len(reader) for reader in readers)} tracks")
 
-		transformedTracks = self._pxTrans.transformTracks(self._unTrans.transformTracks(tracks))
+		transformedTracks = self._camTrans.transformTracks(t for reader in readers for t in reader)
 
 		for t in transformedTracks:
 			self._mDB.addMeasurements(t.measureVelocity(**self._config.getMeasurementParams(), **self._config.measurementMethodParams))
 
+	def _trackChunks(self, chunkSize):
+		""" Generator over chunks of at most chunkSize training tracks, tracks
+			are only read from disk as each chunk is requested
+
+		"""
+		chunk = []
+		for subset in self._config.trainingSets:
+			for t in TrackReader(f"{self._trackDir}/{subset}"):
+				chunk.append(t)
+				if len(chunk) >= chunkSize:
+					yield chunk
+					chunk = []
+
+		if len(chunk) > 0:
+			yield chunk
+
+	def _streamMeasurements(self, chunkSize):
+		""" Generator pipeline that loads, undistorts, converts to pixel
+			coordinates and measures one chunk of tracks at a time so only a
+			single chunk of tracks and its measurements are held in memory
+
+		"""
+		numTracks = 0
+		for chunk in self._trackChunks(chunkSize):
+			numTracks += len(chunk)
+			print(f"Measuring tracks {numTracks-len(chunk)}-{numTracks}")
+
+			transformedTracks = self._camTrans.transformTracks(chunk)
+			del chunk
+
+			measurements = []
+			for t in transformedTracks:
+				measurements.extend(t.measureVelocity(**self._config.getMeasurementParams(), **self._config.measurementMethodParams))
+
+			yield measurements
+
+	def _parallelMeasurements(self, numWorkers, shardSize):
+		""" Shard training tracks across a process pool, workers return
+			measurement arrays which are merged into the database as they
+			arrive
+
+		"""
+		shards = []
+		for subset in self._config.trainingSets:
+			trackDir = f"{self._trackDir}/{subset}"
+			ids = TrackReader(trackDir).ids
+			shards.extend((trackDir, ids[i:i+shardSize]) for i in range(0, len(ids), shardSize))
+
+		print(f"Measuring {len(shards)} shards of tracks with {numWorkers} workers")
+
+		measurementParams = dict(**self._config.getMeasurementParams(), **self._config.measurementMethodParams)
+
+		with ProcessPoolExecutor(max_workers=numWorkers, initializer=_initMeasurementWorker,
+								initargs=(self._camera, measurementParams, self._transformCacheDir)) as executor:
+			for arrays in executor.map(_measureShard, shards):
+				if isinstance(self._mDB, ArrayMeasurementDB):
+					self._mDB.addMeasurementArrays(*arrays)
+				else:
+					self._mDB.addMeasurements(arraysToMeasurements(*arrays))
+
+				self._publishField()
+
+	def _publishField(self, force=False):
+		""" Update online approximation with the measurements that entered or
+			left the selected set since the last update and save the
+			refreshed field, at most once every publishInterval seconds
+
+		"""
+		if not self._online:
+			return
+
+		if not force and time.time() - self._lastPublishTime < self._config.publishInterval:
+			return
+
+		added, removed = self._mDB.getMeasurementDelta('online', advance=True)
+		self._gp.updateMeasurements(added, removed)
+		self._lastPublishTime = time.time()
+
+		if self._gp.numMeasurements > 0:
+			self._fieldApprox = self._gp.approximate()
+			self.saveApproximation(raster=False)
+			print(f"Published field from {self._gp.numMeasurements} measurements (+{len(added)}/-{len(removed)})")
+
+	def run(self):
+		startTime = time.time()
+
+		if self._config.measurementWorkers > 0:
+			shardSize = self._config.streamingChunkSize if self._config.streamingChunkSize > 0 else 500
+			self._parallelMeasurements(self._config.measurementWorkers, shardSize)
+		elif self._config.streamingChunkSize > 0:
+			for measurements in self._streamMeasurements(self._config.streamingChunkSize):
+				self._mDB.addMeasurements(measurements)
+				self._publishField()
+		else:
+			self._extractMeasurements()
+
 		self._trainingMeasurements = self._mDB.getMeasurements(self._config.measurementsPerCell)
 
-		if len(self._trainingMeasurements) > 0:
+		if self._online:
+			self._publishField(force=True)
+		elif len(self._trainingMeasurements) > 0:
 			self._gp.clearMeasurements()
 			self._gp.addMeasurements(self._trainingMeasurements)
 			self._fieldApprox = self._gp.approximate()
@@ -98,9 +251,23 @@ class ApproximationPipeline(object):
 		totalTime = time.time() - startTime
 		print(f"Approximation complete in {totalTime} seconds")
 
-	def saveApproximation(self):
+	def saveApproximation(self, raster=True):
+		""" Save approximated field, along with a RasterField when enabled in
+			the config and raster is set. Intermediate online publishes skip
+			the raster
+
+		"""
 		self._fieldApprox.save(f"{self._runDir}/approx.field")
 
+		if raster and self._config.saveRaster:
+			bounds = [0, self._camera.imgSize[0], 0, self._camera.imgSize[1]]
+			try:
+				raster = RasterField.from_field(self._fieldApprox, bounds, **self._config.getRasterParams())
+				raster.save(f"{self._runDir}/approx_raster.npz")
+			except ValueError as e:
+				# Only the exact field is saved
+				print(f"Warning: raster not saved, {e}")
+
 	def saveMeasurements(self):
 		# Saves tracks used for approximation
 		for i, m in enumerate(self._trainingMeasurements):
@@ -110,4 +277,12 @@ class ApproximationPipeline(object):
 
 	@property
 	def runDir(self):
-		return self._runDir
\ No newline at end of file
+		return self._runDir
+
+	@property
+	def trainingMeasurements(self):
+		return self._trainingMeasurements
+
+	@property
+	def fieldApprox(self):
+		return self._fieldApprox
\ No newline at end of file
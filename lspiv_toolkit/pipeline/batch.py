@@ -0,0 +1,134 @@
+import copy
+import glob
+import json
+import os
+import time
+import traceback
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from .lspiv import SlimPipeline
+
+def _runDataset(config):
+	""" Run the full slim pipeline for a single dataset config and return a
+		summary of the run. Runs in a worker process so errors are caught and
+		reported in the summary instead of taking down the batch
+
+	"""
+	summary = {'dataset': config.datasetFile, 'outputDir': config.outputDir, 'runDir': None,
+				'status': 'ok', 'error': None, 'timings': {}, 'numTracks': 0}
+	timings = summary['timings']
+	startTime = time.time()
+
+	try:
+		stageTime = time.time()
+		pipeline = SlimPipeline(config)
+		timings['load'] = time.time() - stageTime
+
+		stageTime = time.time()
+		pipeline.initialize()
+		summary['runDir'] = pipeline.runDir
+		timings['initialize'] = time.time() - stageTime
+
+		stageTime = time.time()
+		pipeline.run()
+		timings['run'] = time.time() - stageTime
+
+		stageTime = time.time()
+		pipeline.saveTracks()
+		config.save(f"{pipeline.runDir}/config.yaml")
+		timings['save'] = time.time() - stageTime
+
+		summary['numTracks'] = pipeline.trackDB.getNumHistoricalTracks() + pipeline.trackDB.getNumPrunedTracks()
+		summary['monitor'] = pipeline.monitor.summary()
+	except Exception:
+		summary['status'] = 'failed'
+		summary['error'] = traceback.format_exc()
+
+	timings['total'] = time.time() - startTime
+
+	return summary
+
+class BatchRunner(object):
+	""" Runs the slim pipeline over many datasets in a process pool using a
+		shared base config. Each dataset gets its own output directory inside
+		the batch directory so concurrent runs never share a run directory
+
+	"""
+
+	def __init__(self, config, datasetFiles, numWorkers=None):
+		self._config = config
+		self._datasetFiles = [os.path.abspath(f) for f in datasetFiles]
+		self._numWorkers = numWorkers
+
+		self._batchDir = f"{config.outputDir}/batch_{time.strftime('%Y_%m_%d_%H_%M_%S')}"
+		self._summaries = []
+
+	@classmethod
+	def from_glob(cls, config, pattern, numWorkers=None):
+		return cls(config, sorted(glob.glob(pattern)), numWorkers)
+
+	def _datasetConfigs(self):
+		configs = []
+		for i, datasetFile in enumerate(self._datasetFiles):
+			datasetName = os.path.splitext(os.path.basename(datasetFile))[0]
+
+			config = copy.deepcopy(self._config)
+			config.datasetFile = datasetFile
+			config.outputDir = f"{self._batchDir}/{i:03d}_{datasetName}"
+			configs.append(config)
+
+		return configs
+
+	def run(self):
+		if not os.path.exists(self._batchDir):
+			os.makedirs(self._batchDir)
+
+		self._config.save(f"{self._batchDir}/pipeline_config.yaml")
+
+		startTime = time.time()
+		numDatasets = len(self._datasetFiles)
+		self._summaries = []
+
+		print(f"Processing {numDatasets} datasets with {self._numWorkers or os.cpu_count()} workers")
+
+		with ProcessPoolExecutor(max_workers=self._numWorkers) as executor:
+			futures = [executor.submit(_runDataset, c) for c in self._datasetConfigs()]
+
+			for future in as_completed(futures):
+				summary = future.result()
+				self._summaries.append(summary)
+
+				timeElapsed = time.time() - startTime
+				numDone = len(self._summaries)
+				eta = timeElapsed / numDone * (numDatasets - numDone)
+				print(f"[{numDone}/{numDatasets}] {summary['status']}: {summary['dataset']} "
+					f"({summary['numTracks']} tracks in {summary['timings']['total']:.1f}s), Estimated Time Left: {eta:.1f}s")
+
+		self._summaries.sort(key=lambda s: s['outputDir'])
+
+		totalTime = time.time() - startTime
+		print(f"Batch complete in {totalTime} seconds")
+
+		self.saveManifest()
+
+	def saveManifest(self, filename=None):
+		if filename is None:
+			filename = f"{self._batchDir}/manifest.json"
+
+		manifest = {'created': time.strftime('%Y-%m-%d %H:%M:%S'),
+					'numDatasets': len(self._datasetFiles),
+					'numFailed': sum(s['status'] != 'ok' for s in self._summaries),
+					'totalTracks': sum(s['numTracks'] for s in self._summaries),
+					'runs': self._summaries}
+
+		with open(filename, mode='w') as f:
+			json.dump(manifest, f, indent=4)
+
+	@property
+	def batchDir(self):
+		return self._batchDir
+
+	@property
+	def summaries(self):
+		return self._summaries
@@ -1,6 +1,8 @@
 import cv2
+import json
 import numpy as np
 import os
+import shutil
 import time
 import glob
 import time
@@ -19,8 +21,15 @@ import field_toolkit.approx as field_approx
 
 from primitives import Track, Grid
 
-from ..filtering.tracks import TrackDB
+from ..filtering.tracks import TrackDB, ColumnarTrackDB
 from ..filtering.measurements import MeasurementDB
+from ..detect.masks import ExclusionMask
+from ..detect.tiled import TiledGridDetector
+from ..storage.archive import TrackBatch
+from ..storage.writer import TrackWriter
+
+from .prefetch import FramePrefetcher
+from .monitor import PipelineMonitor
 
 class SlimPipeline(object):
 	""" A slim version of the lspiv pipeline that just processes the entire
@@ -28,18 +37,24 @@ class SlimPipeline(object):
 
 	"""
 
-	def __init__(self, config=None):
+	def __init__(self, config=None, data=None):
 		if (config is not None):
-			self.load(config)
+			self.load(config, data)
 		else:
 			self._config = None
 
 
-	def load(self, config):
+	def load(self, config, data=None):
+		""" Setup pipeline components from config. An already constructed
+			dataset object can be passed in place of the config dataset file
+
+		"""
 		self._config = config
 
 		# Load Dataset
-		self._data = Dataset.from_file(config.datasetFile)
+		if data is None:
+			data = Dataset.from_file(config.datasetFile)
+		self._data = data
 		#self._imgWidth, self._imgHeight = self._data.imgSize
 
 		# Setup transformation objects - not needed anymore
@@ -53,14 +68,30 @@ class SlimPipeline(object):
 		self._detector = ShiTomasiDetector(**config.getFeatureDetectionParams())
 
 		# Setup Track and Measurement databases
-		self._tDB = TrackDB(**config.getTrackFilteringParams())
+		if config.trackStorage == 'columnar':
+			self._tDB = ColumnarTrackDB(**config.getTrackFilteringParams(), **config.getTrackStorageParams(), verbose=config.verbose)
+		else:
+			self._tDB = TrackDB(**config.getTrackFilteringParams(), verbose=config.verbose)
+
+		# Setup Grid Detector, tiled detection runs bands of the grid in parallel
+		if config.detectionThreads > 0:
+			self._gd = TiledGridDetector(self._data.imgSize, config.detectionGridDim, config.getFeatureDetectionParams(),
+				config.maxFeatures, config.borderBuffer, **config.getTiledDetectionParams())
+		else:
+			self._gd = GridDetector.from_grid(self._detector, self._detectionGrid, config.maxFeatures, config.borderBuffer)
 
-		# Setup Grid Detector
-		self._gd = GridDetector.from_grid(self._detector, self._detectionGrid, config.maxFeatures, config.borderBuffer)
+		# Setup reusable mask for excluding active tracks from detection
+		self._exclusionMask = ExclusionMask(self._data.mask, config.exclusionRadius)
 
 		# Setup LKTracker with default params
 		self._lk = LKOpticalFlowTracker(**config.getLKFlowParams())
 
+		# Per stage timings and track counters
+		self._monitor = PipelineMonitor(**config.getMonitorParams())
+
+		# Background writer for streamed tracks, started with the run dir
+		self._writer = None
+
 	def initialize(self):
 		""" Initialize new output folder and prepare pipeline for execution
 
@@ -75,7 +106,37 @@ class SlimPipeline(object):
 			self._data.camera.save(f"{self._outputDir}/camera.yaml")
 			self._data.save(f"{self._outputDir}/dataset.yaml")
 
-		self._runDir =  f"{self._outputDir}/lspiv_{time.strftime('%Y_%m_%d_%H_%M_%S')}"
+		self._setupRunDir(f"{self._outputDir}/lspiv_{time.strftime('%Y_%m_%d_%H_%M_%S')}")
+		self._startWriter()
+
+		# Save pipeline config file to run dir
+		self._config.save(f"{self._runDir}/pipeline_config.yaml")
+
+		# Detect Initial Features
+		img, timestamp = self._data.read()
+		grayImg = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+		points = self._gd.detect(grayImg, self._data.mask)
+
+		# Instantiate tracks 
+		self._tDB.addNewPoints(points, timestamp)
+
+		# Initialize LK Tracker with first image
+		self._lk.loadImage(grayImg)
+
+		# Initialize timestamps for pipeline control
+		self._lastDetectionTime = timestamp
+		self._lastTimestamp = timestamp
+
+		# Number of dataset frames consumed so far
+		self._frameIndex = 1
+		self._lastCheckpointTime = time.time()
+
+	def _setupRunDir(self, runDir):
+		""" Create run and track output folders and direct pruned tracks
+			into them
+
+		"""
+		self._runDir = runDir
 		if not os.path.exists(self._runDir):
 			os.makedirs(self._runDir)
 
@@ -91,84 +152,249 @@ class SlimPipeline(object):
 		if not os.path.exists(self._prunedTrackDir):
 			os.makedirs(self._prunedTrackDir)
 
+		self._checkpointDir = f"{self._runDir}/checkpoints"
+
 		# Save pruned historical tracks to file
-		self._tDB.savePrunedTracks(self._prunedTrackDir)
+		self._tDB.savePrunedTracks(self._prunedTrackDir, self._config.trackFormat)
 
-		# Save pipeline config file to run dir
-		self._config.save(f"{self._runDir}/pipeline_config.yaml")
+	def _startWriter(self, files=None, numPruneEvents=0):
+		""" Stream historical tracks to the raw track folder if configured,
+			continuing after files and prune events when resuming
 
-		# Detect Initial Features
-		img, timestamp = self._data.read()
-		grayImg = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-		points = self._gd.detect(grayImg, self._data.mask)
-		tracks = [Track.from_point(p, timestamp) for p in points]
+		"""
+		if not self._config.streamTracks:
+			return
 
-		# Instantiate tracks 
-		self._tDB.addNewTracks(tracks)
+		self._writer = TrackWriter(self._rawTrackDir, self._config.trackFormat, files=files, numPruneEvents=numPruneEvents,
+			**self._config.getStreamParams()).start()
+		self._tDB.streamTracks(self._writer)
 
-		# Initialize LK Tracker with first image
-		self._lk.loadImage(grayImg)
+	def checkpoint(self):
+		""" Save track db state, detection time and dataset frame index to
+			a new checkpoint folder in the run dir. The state file is
+			written last so incomplete checkpoints are never resumed from
 
-		# Initialize timestamps for pipeline control
-		self._lastDetectionTime = timestamp
+		"""
+		directory = f"{self._checkpointDir}/checkpoint_{self._frameIndex:08d}"
+		if not os.path.exists(directory):
+			os.makedirs(directory)
+
+		self._tDB.saveCheckpoint(directory)
+
+		state = {'dataset': self._data.name, 'frameIndex': self._frameIndex,
+				'lastDetectionTime': self._lastDetectionTime, 'lastTimestamp': self._lastTimestamp}
+
+		# Pruned and streamed tracks written so far belong to this checkpoint
+		state['prunedFiles'] = sorted(os.listdir(self._prunedTrackDir))
+		if self._writer is not None:
+			self._writer.flush()
+			state['streamedFiles'] = [os.path.basename(f) for f in self._writer.files]
+			state['streamedPruneEvents'] = self._writer.numPruneEvents
+		with open(f"{directory}/state.json", mode='w') as f:
+			json.dump(state, f)
+
+		# Drop older checkpoints beyond the number kept
+		for old in sorted(glob.glob(f"{self._checkpointDir}/checkpoint_*"))[:-self._config.checkpointsKept]:
+			shutil.rmtree(old, ignore_errors=True)
+
+		self._lastCheckpointTime = time.time()
+
+	@staticmethod
+	def latestCheckpoint(runDir):
+		""" Most recent complete checkpoint folder in runDir, None if there
+			is none
+
+		"""
+		checkpoints = sorted(glob.glob(f"{runDir}/checkpoints/checkpoint_*"))
+		complete = [c for c in checkpoints if os.path.exists(f"{c}/state.json")]
+
+		return complete[-1] if len(complete) > 0 else None
+
+	@staticmethod
+	def _removeUnlisted(filenames, listed):
+		""" Delete output files written after a checkpoint, which did not
+			list them
+
+		"""
+		listed = set(listed)
+		for filename in filenames:
+			if os.path.basename(filename) not in listed:
+				os.remove(filename)
+
+	def _skipFrames(self, numFrames):
+		""" Advance the dataset past numFrames frames. Datasets that can
+			seek or grab frames skip them without decoding
+
+		"""
+		if hasattr(self._data, 'seek'):
+			self._data.seek(numFrames)
+		elif hasattr(self._data, 'grab'):
+			for _ in range(numFrames):
+				self._data.grab()
+		else:
+			print("Warning: dataset cannot seek, decoding frames up to the checkpoint")
+			for _ in range(numFrames):
+				self._data.read()
+
+	def resume(self, runDir):
+		""" Prepare pipeline to continue an interrupted run from the latest
+			checkpoint in runDir, in place of initialize. Output written after
+			the checkpoint is removed, the dataset skips to the checkpointed
+			frame and the LK tracker is loaded with that frame
+
+		"""
+		runDir = os.path.abspath(runDir)
+		checkpoint = self.latestCheckpoint(runDir)
+		if checkpoint is None:
+			raise FileNotFoundError(f"No checkpoint found in {runDir}")
+
+		with open(f"{checkpoint}/state.json", mode='r') as f:
+			state = json.load(f)
+
+		self._outputDir = os.path.dirname(runDir)
+		self._setupRunDir(runDir)
+		self._tDB.loadCheckpoint(checkpoint)
+
+		# Tracks pruned or streamed after the checkpoint will be written again
+		if 'prunedFiles' in state:
+			self._removeUnlisted(glob.glob(f"{self._prunedTrackDir}/*"), state['prunedFiles'])
+
+		if self._config.streamTracks:
+			streamedFiles = state.get('streamedFiles', [])
+			self._removeUnlisted(glob.glob(f"{self._rawTrackDir}/track_*.json") + glob.glob(f"{self._rawTrackDir}/tracks_*{TrackBatch.extension}"), streamedFiles)
+			self._startWriter([f"{self._rawTrackDir}/{f}" for f in streamedFiles], state.get('streamedPruneEvents', 0))
+
+		# Skip to the last processed frame and reload it into the tracker
+		self._skipFrames(state['frameIndex'] - 1)
+		img, timestamp = self._data.read()
+		self._lk.loadImage(cv2.cvtColor(img, cv2.COLOR_BGR2GRAY))
+
+		if timestamp != state['lastTimestamp']:
+			print(f"Warning: resumed at timestamp {timestamp}, checkpoint was taken at {state['lastTimestamp']}")
+
+		self._lastDetectionTime = state['lastDetectionTime']
 		self._lastTimestamp = timestamp
+		self._frameIndex = state['frameIndex']
+		self._lastCheckpointTime = time.time()
+
+		print(f"Resumed from {checkpoint} at frame {self._frameIndex}")
+
+	def _frames(self):
+		""" Generator over remaining grayscale frames, timestamps and dataset
+			progress. Frames are decoded on a background thread when a
+			prefetch queue depth is configured
+
+		"""
+		if self._config.prefetchDepth > 0:
+			with FramePrefetcher(self._data, self._config.prefetchDepth) as prefetcher:
+				for frame in prefetcher:
+					# Decoding happens in the background, only waiting is timed
+					self._monitor.mark('read')
+					yield frame
+		else:
+			while(self._data.more()):
+				img, timestamp = self._data.read()
+				self._monitor.mark('read')
+				grayImg = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+				self._monitor.mark('gray')
+				yield grayImg, timestamp, self._data.progress
 
 	def run(self):
 		startTime = time.time()
-		while(self._data.more()):
-			# Load next image
-			img, timestamp = self._data.read()
-			progress = self._data.progress
-			
-			timeElapsed = time.time() - startTime
-			executionRate = progress / timeElapsed
-			eta = (100.0 - progress) / executionRate
-			print(f"Dataset {progress:.2f}% Processed, Current Timestamp: {timestamp:.3f}, Estimated Time Left: {eta:.3f}s")
-
-			# Convert image to grayscale for detection and tracking
-			grayImg = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-
-			# Get current track end points
-			endPoints = np.asarray(self._tDB.getActiveEndpoints())
-			# Attempt to track end points using LK optical flow
-			newPoints = self._lk.trackPoints(endPoints, grayImg)
+		monitor = self._monitor
+		monitor.reset()
+
+		try:
+			for grayImg, timestamp, progress in self._frames():
+				# Get current track end points
+				endPoints = np.asarray(self._tDB.getActiveEndpoints())
+				# Attempt to track end points using LK optical flow
+				newPoints = self._lk.trackPoints(endPoints, grayImg)
+				monitor.mark('track')
 		
-			# Update track end points with results from LK tracker
-			self._tDB.updateActiveTracks(newPoints, timestamp)
-
-			# If active tracks are low or it is time to run a detection, do so
-			if (self._tDB.getNumActiveTracks() < self._config.numDesiredTracks or timestamp - self._lastDetectionTime > self._config.detectionInterval):
-				# Mask active track end points
-				searchMask = np.copy(self._data.mask)
-				endPoints = self._tDB.getActiveEndpoints()
+				# Update track end points with results from LK tracker
+				self._tDB.updateActiveTracks(newPoints, timestamp)
+				monitor.mark('update')
 
-				for point in endPoints:
-					cv2.circle(searchMask, tuple(point), 5, 0, -1)
+				# If active tracks are low or it is time to run a detection, do so
+				if (self._tDB.getNumActiveTracks() < self._config.numDesiredTracks or timestamp - self._lastDetectionTime > self._config.detectionInterval):
+					# Mask active track end points
+					searchMask = self._exclusionMask.build(self._tDB.getActiveEndpoints())
 
-				detections = self._gd.detect(grayImg, searchMask)
+					detections = self._gd.detect(grayImg, searchMask)
 				
-				self._tDB.addNewTracks([Track.from_point(p, timestamp) for p in detections])
-				self._lastDetectionTime = timestamp
-				del searchMask, detections
+					self._tDB.addNewPoints(detections, timestamp)
+					self._lastDetectionTime = timestamp
+					monitor.count('detected', len(detections))
+					del detections
+					monitor.mark('detect')
+
+				self._lastTimestamp = timestamp
+				self._frameIndex += 1
 
-			self._lastTimestamp = timestamp
+				del grayImg
 
-			del grayImg, img
+				if self._config.checkpointInterval > 0 and time.time() - self._lastCheckpointTime >= self._config.checkpointInterval:
+					self.checkpoint()
+					monitor.mark('checkpoint')
+
+				monitor.count('active', self._tDB.getNumActiveTracks())
+				monitor.count('historical', self._tDB.getNumHistoricalTracks())
+				monitor.count('pruned', self._tDB.getNumPrunedTracks())
+				monitor.endFrame(timestamp, progress)
+		finally:
+			# Detection threads are not needed past the last frame
+			self.closeDetector()
 
 		self._tDB.terminateActiveTracks()
+		if self._writer is not None:
+			self._writer.flush()
 
 		totalTime = time.time() -  startTime
 		print(f"Pipeline run complete in {totalTime} seconds")
 
+		monitor.save(self._runDir)
+
+	def closeDetector(self):
+		""" Shut down the thread pool of a tiled detector. It is started
+			again on the next detection if the pipeline is run again
+
+		"""
+		if hasattr(self._gd, 'close'):
+			self._gd.close()
+
 	def saveTracks(self, timestamp=None):
 		if timestamp is None:
 			timestamp = self._lastTimestamp
 
+		# Streamed tracks only need the writer to finish
+		if self._writer is not None:
+			self._writer.close()
+			self._writer = None
+			return
+
 		tracks = self._tDB.getHistoricalTracks()
+
+		if self._config.trackFormat == 'archive':
+			metadata = {'dataset': self._data.name, 'timestamp': timestamp}
+			TrackBatch.from_tracks(tracks, metadata).save(f"{self._rawTrackDir}/tracks{TrackBatch.extension}")
+			return
 		
 		for t in tracks:
 			t.save(f"{self._rawTrackDir}/track_{t.id}.json")
 
+	@property
+	def monitor(self):
+		return self._monitor
+
+	@property
+	def trackDB(self):
+		return self._tDB
+
+	@property
+	def frameIndex(self):
+		return self._frameIndex
+
 	@property
 	def runDir(self):
 		return self._runDir
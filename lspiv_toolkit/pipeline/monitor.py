@@ -0,0 +1,140 @@
+import json
+import time
+import numpy as np
+
+class PipelineMonitor(object):
+	""" Low overhead per frame instrumentation. Stage durations are taken as
+		laps between consecutive mark calls and counters are set directly.
+		Totals are accumulated every frame while every sampleInterval-th
+		frame is also written to a fixed size ring buffer, which is dumped
+		to csv alongside a json summary. Console progress is printed at
+		most once every consoleInterval seconds, 0 disables it
+
+	"""
+
+	stages = ('read', 'gray', 'track', 'update', 'detect', 'checkpoint')
+	counters = ('active', 'historical', 'pruned', 'detected')
+
+	def __init__(self, capacity=10000, sampleInterval=1, consoleInterval=1.0):
+		self._capacity = capacity
+		self._sampleInterval = max(int(sampleInterval), 1)
+		self._consoleInterval = consoleInterval
+
+		self._stageIndex = {s: i for i, s in enumerate(self.stages)}
+		self._counterIndex = {c: i for i, c in enumerate(self.counters)}
+
+		# Ring buffer rows: frame, timestamp, stage durations, counters
+		self._columns = ('frame', 'timestamp') + tuple(f"{s}_time" for s in self.stages) + self.counters
+		self._buffer = np.zeros((capacity, len(self._columns)))
+		self._numSamples = 0
+
+		self.reset()
+
+	def reset(self):
+		self._frame = 0
+		self._numSamples = 0
+		self._stageTimes = np.zeros(len(self.stages))
+		self._counterValues = np.zeros(len(self.counters))
+		self._stageTotals = np.zeros(len(self.stages))
+		self._stageMax = np.zeros(len(self.stages))
+		self._detectedTotal = 0
+
+		self._startTime = time.perf_counter()
+		self._lapTime = self._startTime
+		self._lastConsoleTime = -np.inf
+
+	def mark(self, stage):
+		""" Attribute time since the previous mark to stage
+
+		"""
+		now = time.perf_counter()
+		self._stageTimes[self._stageIndex[stage]] += now - self._lapTime
+		self._lapTime = now
+
+	def count(self, counter, value):
+		self._counterValues[self._counterIndex[counter]] = value
+		if counter == 'detected':
+			self._detectedTotal += value
+
+	def endFrame(self, timestamp, progress=None):
+		""" Close the current frame, sampling it into the ring buffer and
+			reporting progress if due
+
+		"""
+		self._stageTotals += self._stageTimes
+		np.maximum(self._stageMax, self._stageTimes, out=self._stageMax)
+
+		if self._frame % self._sampleInterval == 0:
+			row = self._buffer[self._numSamples % self._capacity]
+			row[0] = self._frame
+			row[1] = timestamp
+			row[2:2+len(self.stages)] = self._stageTimes
+			row[2+len(self.stages):] = self._counterValues
+			self._numSamples += 1
+
+		self._frame += 1
+		self._stageTimes.fill(0.0)
+		self._counterValues[self._counterIndex['detected']] = 0
+
+		now = time.perf_counter()
+		if self._consoleInterval and progress is not None and now - self._lastConsoleTime >= self._consoleInterval:
+			self._lastConsoleTime = now
+			self._report(timestamp, progress, now)
+
+		self._lapTime = time.perf_counter()
+
+	def _report(self, timestamp, progress, now):
+		timeElapsed = now - self._startTime
+		eta = (100.0 - progress) / (progress / timeElapsed) if progress > 0 else float('inf')
+		fps = self._frame / timeElapsed
+		active, historical = (self._counterValues[self._counterIndex[c]] for c in ('active', 'historical'))
+		print(f"Dataset {progress:.2f}% Processed, Current Timestamp: {timestamp:.3f}, {fps:.1f} fps, "
+			f"Active: {active:.0f}, Historical: {historical:.0f}, Estimated Time Left: {eta:.3f}s")
+
+	def samples(self):
+		""" Sampled rows in frame order, oldest first
+
+		"""
+		if self._numSamples <= self._capacity:
+			return self._buffer[:self._numSamples]
+
+		start = self._numSamples % self._capacity
+		return np.concatenate((self._buffer[start:], self._buffer[:start]))
+
+	def summary(self):
+		samples = self.samples()
+		stageSamples = samples[:, 2:2+len(self.stages)]
+
+		stages = {}
+		for i, stage in enumerate(self.stages):
+			stats = {'total': float(self._stageTotals[i]),
+					'mean': float(self._stageTotals[i] / max(self._frame, 1)),
+					'max': float(self._stageMax[i])}
+			if len(samples) > 0:
+				stats['p50'] = float(np.percentile(stageSamples[:, i], 50))
+				stats['p95'] = float(np.percentile(stageSamples[:, i], 95))
+			stages[stage] = stats
+
+		lastCounters = samples[-1, 2+len(self.stages):] if len(samples) > 0 else self._counterValues
+		counters = {c: float(v) for c, v in zip(self.counters, lastCounters)}
+		counters['detected'] = float(self._detectedTotal)
+
+		elapsed = time.perf_counter() - self._startTime
+		return {'numFrames': self._frame, 'numSamples': min(self._numSamples, self._capacity),
+				'sampleInterval': self._sampleInterval, 'elapsed': elapsed,
+				'fps': self._frame / elapsed if elapsed > 0 else 0.0,
+				'stages': stages, 'counters': counters}
+
+	def save(self, directory, name='timings'):
+		""" Write sampled frames to {name}.csv and summary to {name}.json
+
+		"""
+		np.savetxt(f"{directory}/{name}.csv", self.samples(), delimiter=',',
+					header=','.join(self._columns), comments='', fmt='%.9g')
+
+		with open(f"{directory}/{name}.json", mode='w') as f:
+			json.dump(self.summary(), f, indent=4)
+
+	@property
+	def numFrames(self):
+		return self._frame
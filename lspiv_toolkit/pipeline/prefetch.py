@@ -0,0 +1,81 @@
+import cv2
+import queue
+import threading
+
+class FramePrefetcher(object):
+	""" Reads and decodes frames from a dataset on a background thread and
+		hands them to the consumer through a bounded queue as grayscale
+		images. OpenCV releases the GIL while decoding and converting, so
+		reading overlaps with tracking on the main thread
+
+	"""
+
+	# Marks the end of the dataset in the queue
+	_done = object()
+
+	def __init__(self, dataset, queueDepth=4):
+		self._data = dataset
+		self._queue = queue.Queue(maxsize=max(1, queueDepth))
+		self._stopEvent = threading.Event()
+		self._thread = None
+
+	def start(self):
+		self._stopEvent.clear()
+		self._thread = threading.Thread(target=self._read, name='FramePrefetcher', daemon=True)
+		self._thread.start()
+
+	def stop(self):
+		# Reader gives up on a full queue once stop is requested
+		self._stopEvent.set()
+
+		if self._thread is not None:
+			self._thread.join()
+			self._thread = None
+
+	def _put(self, item):
+		while not self._stopEvent.is_set():
+			try:
+				self._queue.put(item, timeout=0.1)
+				return True
+			except queue.Full:
+				pass
+
+		return False
+
+	def _read(self):
+		try:
+			while self._data.more() and not self._stopEvent.is_set():
+				img, timestamp = self._data.read()
+				progress = self._data.progress
+
+				grayImg = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+				del img
+
+				if not self._put((grayImg, timestamp, progress)):
+					return
+		except Exception as e:
+			# Forward errors to the consumer thread
+			self._put(e)
+			return
+
+		self._put(self._done)
+
+	def __iter__(self):
+		return self
+
+	def __next__(self):
+		item = self._queue.get()
+
+		if item is self._done:
+			raise StopIteration
+		elif isinstance(item, Exception):
+			raise item
+
+		return item
+
+	def __enter__(self):
+		self.start()
+		return self
+
+	def __exit__(self, *args):
+		self.stop()
@@ -0,0 +1,209 @@
+import json
+import numpy as np
+
+from primitives.track import Track
+
+# Archive layout: magic, version, header length, json header, then each
+# array stored raw and aligned so it can be memory mapped in place
+_MAGIC = b'LSPIVTRK'
+_VERSION = 1
+_ALIGNMENT = 64
+_PREAMBLE = np.dtype([('magic', 'S8'), ('version', '<u4'), ('headerLength', '<u4')])
+
+def _align(offset):
+	return -(-offset // _ALIGNMENT) * _ALIGNMENT
+
+def buildTrack(tID, times, positions):
+	""" Instantiate a Track object from arrays of observation times and
+		positions, preserving the original track id
+
+	"""
+	track = Track.from_point(np.array(positions[0]), float(times[0]))
+	for timestamp, point in zip(times[1:], positions[1:]):
+		track.addObservation(np.array(point), float(timestamp))
+
+	track.id = tID
+	return track
+
+class TrackBatch(object):
+	""" Columnar storage for a set of tracks. Times and positions of all
+		tracks are concatenated into flat arrays and offsets[i]:offsets[i+1]
+		indexes the observations of the track with id ids[i]. Can be saved
+		to and loaded from a single binary archive file, optionally memory
+		mapped
+
+	"""
+
+	extension = '.trk'
+
+	def __init__(self, ids, offsets, times, positions, metadata=None):
+		self._ids = ids
+		self._offsets = offsets
+		self._times = times
+		self._positions = positions
+
+		if metadata is None:
+			metadata = {}
+		self._metadata = metadata
+
+		self._index = None
+
+	@classmethod
+	def from_tracks(cls, tracks, metadata=None):
+		lengths = [len(t.times) for t in tracks]
+
+		offsets = np.zeros(len(tracks) + 1, dtype=np.int64)
+		np.cumsum(lengths, out=offsets[1:])
+
+		ids = np.fromiter((t.id for t in tracks), dtype=np.int64, count=len(tracks))
+		times = np.empty(offsets[-1], dtype=np.float64)
+		positions = np.empty((offsets[-1], 2), dtype=np.float64)
+
+		for i, t in enumerate(tracks):
+			times[offsets[i]:offsets[i+1]] = t.times
+			positions[offsets[i]:offsets[i+1]] = np.asarray(t.positions).reshape(-1, 2)
+
+		return cls(ids, offsets, times, positions, metadata)
+
+	@classmethod
+	def concatenate(cls, batches, metadata=None):
+		batches = list(batches)
+		if len(batches) == 0:
+			return cls.from_tracks([], metadata)
+
+		starts = np.cumsum([0] + [len(b.times) for b in batches[:-1]])
+		offsets = np.concatenate([[0]] + [b.offsets[1:] + s for b, s in zip(batches, starts)])
+
+		ids = np.concatenate([b.ids for b in batches])
+		times = np.concatenate([b.times for b in batches])
+		positions = np.concatenate([b.positions for b in batches])
+
+		return cls(ids, offsets.astype(np.int64), times, positions, metadata)
+
+	@classmethod
+	def from_file(cls, filename, mmap=True):
+		""" Load archive from file. When mmap is set arrays are memory mapped
+			read only instead of being read into memory
+
+		"""
+		with open(filename, mode='rb') as f:
+			preamble = np.fromfile(f, dtype=_PREAMBLE, count=1)[0]
+			if preamble['magic'] != _MAGIC:
+				raise ValueError(f"{filename} is not a track archive")
+			if preamble['version'] > _VERSION:
+				raise ValueError(f"Unsupported track archive version {preamble['version']}")
+
+			header = json.loads(f.read(int(preamble['headerLength'])).decode('utf-8'))
+
+			arrays = {}
+			for name, spec in header['arrays'].items():
+				dtype = np.dtype(spec['dtype'])
+				shape = tuple(spec['shape'])
+
+				if mmap and np.prod(shape) > 0:
+					arrays[name] = np.memmap(filename, dtype=dtype, mode='r', offset=spec['offset'], shape=shape)
+				else:
+					f.seek(spec['offset'])
+					arrays[name] = np.fromfile(f, dtype=dtype, count=int(np.prod(shape))).reshape(shape)
+
+		return cls(arrays['ids'], arrays['offsets'], arrays['times'], arrays['positions'], header['metadata'])
+
+	def save(self, filename):
+		arrays = {'ids': np.ascontiguousarray(self._ids, dtype='<i8'),
+					'offsets': np.ascontiguousarray(self._offsets, dtype='<i8'),
+					'times': np.ascontiguousarray(self._times, dtype='<f8'),
+					'positions': np.ascontiguousarray(self._positions, dtype='<f8')}
+
+		# Header size depends on offsets, so grow estimate until it fits
+		headerSize = _ALIGNMENT
+		while True:
+			offset = _align(_PREAMBLE.itemsize + headerSize)
+			specs = {}
+			for name, array in arrays.items():
+				specs[name] = {'dtype': array.dtype.str, 'shape': list(array.shape), 'offset': offset}
+				offset = _align(offset + array.nbytes)
+
+			header = json.dumps({'metadata': self._metadata, 'numTracks': len(self),
+								'numPoints': len(self._times), 'arrays': specs}).encode('utf-8')
+			if len(header) <= headerSize:
+				break
+			headerSize = _align(len(header))
+
+		preamble = np.array([(_MAGIC, _VERSION, len(header))], dtype=_PREAMBLE)
+
+		with open(filename, mode='wb') as f:
+			f.write(preamble.tobytes())
+			f.write(header)
+			for name, array in arrays.items():
+				f.seek(specs[name]['offset'])
+				f.write(array.tobytes())
+
+	def __len__(self):
+		return len(self._ids)
+
+	def __contains__(self, tID):
+		return tID in self.index
+
+	def indexOf(self, tID):
+		return self.index[tID]
+
+	def getObservations(self, i):
+		""" Returns times and positions of the i-th track in the batch
+
+		"""
+		start, end = self._offsets[i], self._offsets[i+1]
+		return self._times[start:end], self._positions[start:end]
+
+	def getTrack(self, i):
+		times, positions = self.getObservations(i)
+		return buildTrack(int(self._ids[i]), times, positions)
+
+	def getTrackByID(self, tID):
+		return self.getTrack(self.indexOf(tID))
+
+	def toTracks(self):
+		return [self.getTrack(i) for i in range(len(self))]
+
+	def subset(self, indices):
+		""" Returns a new in-memory batch with the tracks at indices
+
+		"""
+		indices = np.asarray(indices, dtype=np.intp)
+		lengths = np.diff(self._offsets)[indices]
+
+		offsets = np.zeros(len(indices) + 1, dtype=np.int64)
+		np.cumsum(lengths, out=offsets[1:])
+
+		# Gather observation rows of selected tracks in order
+		rows = np.repeat(self._offsets[indices] - offsets[:-1], lengths) + np.arange(offsets[-1])
+
+		return TrackBatch(self._ids[indices], offsets, self._times[rows], self._positions[rows], dict(self._metadata))
+
+	@property
+	def index(self):
+		""" Map from track id to position in the batch, built on first use
+
+		"""
+		if self._index is None:
+			self._index = {tID: i for i, tID in enumerate(self._ids.tolist())}
+		return self._index
+
+	@property
+	def ids(self):
+		return self._ids
+
+	@property
+	def offsets(self):
+		return self._offsets
+
+	@property
+	def times(self):
+		return self._times
+
+	@property
+	def positions(self):
+		return self._positions
+
+	@property
+	def metadata(self):
+		return self._metadata
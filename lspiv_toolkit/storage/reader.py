@@ -0,0 +1,239 @@
+import glob
+import json
+import os
+import shutil
+
+from primitives.track import Track
+
+from .archive import TrackBatch
+
+class TrackReader(object):
+	""" Lazy, random access reader over all tracks saved below a directory,
+		either as individual track files or as track archives. An index from
+		track id to file (or archive and position) is built on construction,
+		Track objects are only instantiated when accessed. Only the directory
+		itself is searched unless recursive is set, checkpoint folders are
+		never searched. With cacheIndex set the index is cached in the
+		directory and reused while the source files are unchanged. Tracks
+		listed in the pruned manifest of their folder were dropped after
+		they were written and are skipped
+
+	"""
+
+	indexFilename = '.track_index.json'
+
+	# One json list of track ids per line, appended by TrackWriter.prune
+	prunedFilename = '.pruned_ids.json'
+
+	# Folders holding pipeline state rather than results
+	excludedDirs = ('checkpoints',)
+
+	def __init__(self, directory, patterns=('track_*.json', 'track_*.yaml'), recursive=False, cacheIndex=False, rebuild=False):
+		self._dir = os.path.abspath(directory)
+		self._patterns = patterns
+		self._recursive = recursive
+
+		# Memory mapped archives opened so far, shared with subsets
+		self._archives = {}
+
+		self._index = None
+		if cacheIndex and not rebuild:
+			self._index = self._loadIndex()
+
+		if self._index is None:
+			self._index = self._buildIndex()
+			if cacheIndex:
+				self._saveIndex()
+
+		# Source files indexed so far, including those of pruned tracks
+		self._sources = {filename for filename, position in self._index.values()}
+		self._removePruned()
+
+	@classmethod
+	def _from_index(cls, parent, index):
+		reader = cls.__new__(cls)
+		reader._dir = parent._dir
+		reader._patterns = parent._patterns
+		reader._recursive = parent._recursive
+		reader._archives = parent._archives
+		reader._sources = set(parent._sources)
+		reader._index = index
+		reader._ids = sorted(index.keys())
+		return reader
+
+	def _glob(self, pattern):
+		if not self._recursive:
+			return glob.glob(f"{self._dir}/{pattern}")
+
+		files = glob.glob(f"{self._dir}/**/{pattern}", recursive=True)
+		return [f for f in files if not set(os.path.relpath(f, self._dir).split(os.sep)[:-1]) & set(self.excludedDirs)]
+
+	def _sourceFiles(self):
+		files = []
+		for pattern in self._patterns:
+			files.extend(self._glob(pattern))
+
+		archives = self._glob(f"*{TrackBatch.extension}")
+		return sorted(files), sorted(archives)
+
+	def _addEntry(self, index, tID, entry):
+		if tID in index:
+			raise ValueError(f"Track {tID} found in both {index[tID][0]} and {entry[0]}")
+		index[tID] = entry
+
+	def _buildIndex(self):
+		""" Returns dict mapping track id to (filename, position), position
+			is None for individual track files
+
+		"""
+		return self._indexFiles(*self._sourceFiles(), {})
+
+	def _indexFiles(self, files, archives, index):
+		for filename in files:
+			stem = os.path.splitext(os.path.basename(filename))[0]
+			tID = stem[len('track_'):]
+			if tID.isdigit():
+				self._addEntry(index, int(tID), (filename, None))
+
+		for filename in archives:
+			batch = self._openArchive(filename)
+			for i, tID in enumerate(batch.ids.tolist()):
+				self._addEntry(index, tID, (filename, i))
+
+		return index
+
+	def _loadPruned(self, directory):
+		prunedFile = f"{directory}/{self.prunedFilename}"
+		if not os.path.exists(prunedFile):
+			return set()
+
+		pruned = set()
+		with open(prunedFile, mode='r') as f:
+			for line in f:
+				if line.strip():
+					pruned.update(json.loads(line))
+		return pruned
+
+	def _removePruned(self):
+		""" Drop tracks listed in the pruned manifest of the folder they
+			were read from
+
+		"""
+		directories = {os.path.dirname(filename) for filename in self._sources}
+		pruned = {directory: self._loadPruned(directory) for directory in directories}
+
+		for tID, (filename, position) in list(self._index.items()):
+			if tID in pruned[os.path.dirname(filename)]:
+				del self._index[tID]
+
+		self._ids = sorted(self._index.keys())
+
+	def refresh(self):
+		""" Index source files added since the index was built and drop
+			newly pruned tracks, for directories that are still being
+			written. Files are assumed to be complete and never removed
+
+		"""
+		files, archives = self._sourceFiles()
+		self._indexFiles([f for f in files if f not in self._sources],
+						[f for f in archives if f not in self._sources], self._index)
+
+		self._sources.update(filename for filename, position in self._index.values())
+		self._removePruned()
+		return self
+
+	def _signature(self):
+		""" Summary of source files used to detect a stale cached index
+
+		"""
+		files, archives = self._sourceFiles()
+		sources = files + archives
+		return {'numFiles': len(sources),
+				'lastModified': max((os.path.getmtime(f) for f in sources), default=0.0)}
+
+	def _loadIndex(self):
+		indexFile = f"{self._dir}/{self.indexFilename}"
+		if not os.path.exists(indexFile):
+			return None
+
+		with open(indexFile, mode='r') as f:
+			cached = json.load(f)
+
+		if cached.get('signature') != self._signature():
+			return None
+
+		return {int(tID): (os.path.join(self._dir, filename), position)
+				for tID, (filename, position) in cached['tracks'].items()}
+
+	def _saveIndex(self):
+		tracks = {tID: (os.path.relpath(filename, self._dir), position)
+					for tID, (filename, position) in self._index.items()}
+
+		try:
+			with open(f"{self._dir}/{self.indexFilename}", mode='w') as f:
+				json.dump({'signature': self._signature(), 'tracks': tracks}, f)
+		except OSError:
+			# Read only directories just rebuild the index each time
+			pass
+
+	def _openArchive(self, filename):
+		if filename not in self._archives:
+			self._archives[filename] = TrackBatch.from_file(filename)
+		return self._archives[filename]
+
+	def __len__(self):
+		return len(self._ids)
+
+	def __contains__(self, tID):
+		return tID in self._index
+
+	def __getitem__(self, tID):
+		filename, position = self._index[tID]
+
+		if position is None:
+			return Track.from_file(filename)
+
+		return self._openArchive(filename).getTrack(position)
+
+	def __iter__(self):
+		for tID in self._ids:
+			yield self[tID]
+
+	def subset(self, ids):
+		""" Returns a reader restricted to the given track ids
+
+		"""
+		return TrackReader._from_index(self, {tID: self._index[tID] for tID in ids})
+
+	def filter(self, predicate):
+		""" Returns a reader with only the tracks whose id satisfies predicate
+
+		"""
+		return self.subset([tID for tID in self._ids if predicate(tID)])
+
+	def export(self, directory, ids=None, extension='.json'):
+		""" Write selected tracks to directory as individual track files.
+			Track files are copied directly without being parsed
+
+		"""
+		if not os.path.exists(directory):
+			os.makedirs(directory)
+
+		if ids is None:
+			ids = self._ids
+
+		for tID in ids:
+			filename, position = self._index[tID]
+
+			if position is None:
+				shutil.copyfile(filename, f"{directory}/{os.path.basename(filename)}")
+			else:
+				self[tID].save(f"{directory}/track_{tID}{extension}")
+
+	@property
+	def ids(self):
+		return self._ids
+
+	@property
+	def directory(self):
+		return self._dir
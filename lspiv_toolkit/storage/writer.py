@@ -0,0 +1,171 @@
+import json
+import os
+import queue
+import threading
+
+from .archive import TrackBatch
+from .reader import TrackReader
+
+class TrackWriter(object):
+	""" Appends tracks to a directory from a background thread. Tracks are
+		handed over through a bounded queue, so a producer that outruns the
+		disk blocks instead of buffering without limit. Tracks are written
+		as individual json files or gathered into numbered archive chunks
+		of chunkSize tracks. Errors on the writer thread are raised on the
+		next call from the producer. Ids of written tracks that are dropped
+		later are appended to a pruned manifest that TrackReader honors
+
+	"""
+
+	# Queue markers for writing the pending chunk and for stopping
+	_flush = object()
+	_done = object()
+
+	def __init__(self, directory, trackFormat='json', queueSize=16, chunkSize=1000, files=None, numPruneEvents=0):
+		self._dir = directory
+		self._format = trackFormat
+		self._chunkSize = chunkSize
+
+		# Files written so far, passed in to continue a previous writer
+		self._files = list(files) if files is not None else []
+		self._numChunks = len(self._files)
+		self._numWritten = 0
+
+		# Lines of the pruned manifest written so far, later lines belong
+		# to the previous writer's discarded output
+		self._prunedFile = f"{directory}/{TrackReader.prunedFilename}"
+		self._numPruneEvents = numPruneEvents
+
+		self._pending = []
+		self._error = None
+
+		self._queue = queue.Queue(maxsize=max(1, queueSize))
+		self._thread = None
+
+	def start(self):
+		if not os.path.exists(self._dir):
+			os.makedirs(self._dir)
+
+		self._truncatePruned()
+
+		self._thread = threading.Thread(target=self._write, name='TrackWriter', daemon=True)
+		self._thread.start()
+		return self
+
+	def _checkError(self):
+		if self._error is not None:
+			error, self._error = self._error, None
+			raise error
+
+	def write(self, tracks):
+		""" Queue tracks for writing, blocks while the queue is full
+
+		"""
+		self._checkError()
+		if len(tracks) > 0:
+			self._queue.put(list(tracks))
+
+	def flush(self):
+		""" Wait until all queued tracks, including a partial archive chunk,
+			are on disk
+
+		"""
+		if self._thread is None:
+			return
+
+		self._queue.put(self._flush)
+		self._queue.join()
+		self._checkError()
+
+	def prune(self, ids):
+		""" Record ids of written or queued tracks that were dropped, as
+			one line of the pruned manifest
+
+		"""
+		self._checkError()
+		ids = [int(tID) for tID in ids]
+		if len(ids) == 0:
+			return
+
+		with open(self._prunedFile, mode='a') as f:
+			f.write(json.dumps(ids) + '\n')
+		self._numPruneEvents += 1
+
+	def _truncatePruned(self):
+		if not os.path.exists(self._prunedFile):
+			return
+
+		with open(self._prunedFile, mode='r') as f:
+			lines = f.readlines()[:self._numPruneEvents]
+
+		with open(self._prunedFile, mode='w') as f:
+			f.writelines(lines)
+
+	def close(self):
+		if self._thread is None:
+			return
+
+		self._queue.put(self._done)
+		self._thread.join()
+		self._thread = None
+		self._checkError()
+
+	def _write(self):
+		while True:
+			item = self._queue.get()
+			try:
+				if item is self._flush or item is self._done:
+					self._writeChunk()
+				elif self._format == 'archive':
+					self._pending.extend(item)
+					while len(self._pending) >= self._chunkSize:
+						self._writeChunk()
+				else:
+					for track in item:
+						filename = f"{self._dir}/track_{track.id}.json"
+						track.save(filename)
+						self._files.append(filename)
+					self._numWritten += len(item)
+			except Exception as e:
+				# Forward errors to the producer thread
+				self._error = e
+			finally:
+				self._queue.task_done()
+
+			if item is self._done:
+				return
+
+	def _writeChunk(self):
+		if len(self._pending) == 0:
+			return
+
+		tracks = self._pending[:self._chunkSize]
+		del self._pending[:self._chunkSize]
+
+		filename = f"{self._dir}/tracks_{self._numChunks:04d}{TrackBatch.extension}"
+		TrackBatch.from_tracks(tracks).save(filename)
+		self._files.append(filename)
+		self._numChunks += 1
+		self._numWritten += len(tracks)
+
+	def __enter__(self):
+		return self.start()
+
+	def __exit__(self, *args):
+		self.close()
+
+	@property
+	def files(self):
+		return list(self._files)
+
+	@property
+	def numWritten(self):
+		return self._numWritten
+
+	@property
+	def numPruneEvents(self):
+		return self._numPruneEvents
+
+	@property
+	def directory(self):
+		return self._dir
@@ -0,0 +1,199 @@
+import cv2
+import hashlib
+import os
+import tempfile
+import numpy as np
+
+from cv_toolkit.cams import FisheyeCamera
+
+from .camera import CameraTransform
+
+class CameraTransformCache(CameraTransform):
+	""" Fused undistortion and pixel coordinate transform backed by lookup
+		tables persisted on disk. The exact transforms are evaluated once on
+		a regular grid of points spanning the image and later point and
+		track transforms are bilinear lookups into that grid. Image
+		transforms use remap tables derived from the exact image
+		transforms. Tables are written to cacheDir, normally under the run
+		or input directory, keyed by camera parameters, image size and grid
+		step
+
+	"""
+
+	def __init__(self, camera, cacheDir, imgSize=None, step=4, tolerance=0.05):
+		super().__init__(camera, imgSize)
+		self._tolerance = tolerance
+
+		self._cacheFile = f"{cacheDir}/{self._cacheKey(step)}.npz"
+
+		self._imageMaps = {}
+		if not self._load():
+			self._buildLookup(step)
+			self.save()
+
+	@classmethod
+	def from_file(cls, camFile, cacheDir, imgSize=None, step=4, tolerance=0.05):
+		return cls(FisheyeCamera.from_file(camFile), cacheDir, imgSize, step, tolerance)
+
+	def _cacheKey(self, step):
+		""" Digest of the saved camera parameters, image size and grid step
+
+		"""
+		with tempfile.TemporaryDirectory() as tmpDir:
+			self._camera.save(f"{tmpDir}/camera.yaml")
+			with open(f"{tmpDir}/camera.yaml", mode='rb') as f:
+				digest = hashlib.sha1(f.read())
+
+		digest.update(f"{self._imgSize}_{step}".encode('utf-8'))
+		return digest.hexdigest()
+
+	def _load(self):
+		""" Load tables from the cache file, unreadable or incomplete cache
+			files count as a cache miss
+
+		"""
+		if not os.path.exists(self._cacheFile):
+			return False
+
+		try:
+			with np.load(self._cacheFile) as cache:
+				self._step = int(cache['step'])
+				self._lookup = cache['lookup']
+				self._maxError = float(cache['maxError'])
+
+				for name in cache.files:
+					if name.startswith('imageMap_'):
+						shape = tuple(int(s) for s in name[len('imageMap_'):].split('x'))
+						self._imageMaps[shape] = cache[name]
+		except Exception as e:
+			print(f"Ignoring unreadable transform cache {self._cacheFile}: {e}")
+			self._imageMaps = {}
+			return False
+
+		return True
+
+	def save(self):
+		""" Write tables to a temporary file next to the cache file and move
+			it into place, so concurrent readers never see a partial file
+
+		"""
+		arrays = {'step': self._step, 'lookup': self._lookup, 'maxError': self._maxError}
+		for (h, w), imageMap in self._imageMaps.items():
+			arrays[f"imageMap_{h}x{w}"] = imageMap
+
+		try:
+			cacheDir = os.path.dirname(self._cacheFile)
+			os.makedirs(cacheDir, exist_ok=True)
+
+			fd, tmpFile = tempfile.mkstemp(suffix='.npz', dir=cacheDir)
+			try:
+				with os.fdopen(fd, mode='wb') as f:
+					np.savez(f, **arrays)
+				os.replace(tmpFile, self._cacheFile)
+			except BaseException:
+				os.remove(tmpFile)
+				raise
+		except OSError:
+			# Read only cache directories just rebuild the tables each time
+			pass
+
+	def _buildLookup(self, step):
+		""" Evaluate exact transforms on a grid with spacing step covering the
+			image, halving the spacing until bilinear lookups of random points
+			are within tolerance pixels of the exact transform
+
+		"""
+		width, height = self._imgSize
+		rng = np.random.default_rng(0)
+		samples = rng.uniform(0, (width - 1, height - 1), size=(1000, 2))
+		exact = super().transformPoints(samples)
+
+		while True:
+			self._step = step
+			xs = np.arange(0, width + step, step, dtype=np.float64)
+			ys = np.arange(0, height + step, step, dtype=np.float64)
+			gridX, gridY = np.meshgrid(xs, ys)
+
+			gridPoints = np.column_stack((gridX.ravel(), gridY.ravel()))
+			self._lookup = super().transformPoints(gridPoints).reshape(len(ys), len(xs), 2)
+
+			self._maxError = float(np.abs(self._interpolate(samples) - exact).max())
+			if self._maxError <= self._tolerance or step == 1:
+				break
+
+			step = max(step // 2, 1)
+
+		print(f"Built transform lookup with step {self._step}, max error {self._maxError:.4f} px")
+
+	def _interpolate(self, points):
+		rows, cols = self._lookup.shape[:2]
+
+		fx = points[:, 0] / self._step
+		fy = points[:, 1] / self._step
+		i = np.clip(np.floor(fx).astype(np.intp), 0, cols - 2)
+		j = np.clip(np.floor(fy).astype(np.intp), 0, rows - 2)
+		tx = (fx - i)[:, np.newaxis]
+		ty = (fy - j)[:, np.newaxis]
+
+		lookup = self._lookup
+		top = (1 - tx) * lookup[j, i] + tx * lookup[j, i+1]
+		bottom = (1 - tx) * lookup[j+1, i] + tx * lookup[j+1, i+1]
+		return (1 - ty) * top + ty * bottom
+
+	def transformPoints(self, points):
+		""" Transform an (N,2) array of image points. Points outside the
+			lookup grid fall back to the exact transforms
+
+		"""
+		points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+		result = self._interpolate(points)
+
+		xMax = (self._lookup.shape[1] - 1) * self._step
+		yMax = (self._lookup.shape[0] - 1) * self._step
+		outside = np.flatnonzero((points[:, 0] < 0) | (points[:, 0] > xMax) | (points[:, 1] < 0) | (points[:, 1] > yMax))
+		if len(outside) > 0:
+			result[outside] = super().transformPoints(points[outside])
+
+		return result
+
+	def _buildImageMap(self, shape):
+		""" Remap table for images of the given shape. Images holding the
+			x and y coordinate of each pixel, plus a constant image to mark
+			pixels sampled from outside the source, are passed through the
+			exact image transforms
+
+		"""
+		h, w = shape
+		coordX, coordY = np.meshgrid(np.arange(w, dtype=np.float32), np.arange(h, dtype=np.float32))
+		ones = np.ones((h, w), dtype=np.float32)
+
+		mapX, mapY, coverage = [CameraTransform.transformImage(self, img) for img in (coordX, coordY, ones)]
+
+		# Partially covered pixels were blended with zeros, renormalize
+		valid = coverage > 0.5
+		imageMap = np.full(mapX.shape + (2,), -1.0, dtype=np.float32)
+		imageMap[valid, 0] = mapX[valid] / coverage[valid]
+		imageMap[valid, 1] = mapY[valid] / coverage[valid]
+
+		return imageMap
+
+	def transformImage(self, img):
+		shape = tuple(img.shape[:2])
+		if shape not in self._imageMaps:
+			self._imageMaps[shape] = self._buildImageMap(shape)
+			self.save()
+
+		imageMap = self._imageMaps[shape]
+		return cv2.remap(img, imageMap[..., 0], imageMap[..., 1], cv2.INTER_LINEAR, borderMode=cv2.BORDER_CONSTANT)
+
+	@property
+	def step(self):
+		return self._step
+
+	@property
+	def maxError(self):
+		return self._maxError
+
+	@property
+	def cacheFile(self):
+		return self._cacheFile
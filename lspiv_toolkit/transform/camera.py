@@ -0,0 +1,81 @@
+import cv2
+import numpy as np
+
+from cv_toolkit.transform.camera import UndistortionTransform
+from cv_toolkit.transform.common import PixelCoordinateTransform
+
+from ..storage.archive import TrackBatch, buildTrack
+
+class CameraTransform(object):
+	""" Undistortion followed by conversion to pixel coordinates, applied
+		to whole arrays of points. Points are undistorted with the fisheye
+		model of the camera, keeping the camera matrix as projection, and
+		flipped so the y axis points up from the bottom of the image. Track
+		transforms concatenate the positions of all tracks into one array,
+		transform it in a single pass and split the result back into tracks.
+		Images go through the cv_toolkit transforms
+
+	"""
+
+	def __init__(self, camera, imgSize=None):
+		self._camera = camera
+		self._imgSize = tuple(int(s) for s in (camera.imgSize if imgSize is None else imgSize))
+
+		# Exact image transforms, applied in order
+		self._transforms = [UndistortionTransform(camera), PixelCoordinateTransform(self._imgSize)]
+
+	def transformPoints(self, points):
+		""" Transform an (N,2) array of image points
+
+		"""
+		points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+		if len(points) == 0:
+			return points
+
+		camMatrix = np.asarray(self._camera.camMatrix, dtype=np.float64)
+		distCoeffs = np.asarray(self._camera.distCoeffs, dtype=np.float64)
+		undistorted = cv2.fisheye.undistortPoints(points.reshape(-1, 1, 2), camMatrix, distCoeffs, P=camMatrix).reshape(-1, 2)
+
+		# Pixel coordinates have their origin at the bottom of the image
+		undistorted[:, 1] = self._imgSize[1] - undistorted[:, 1]
+		return undistorted
+
+	def transformTrack(self, track):
+		positions = self.transformPoints(track.positions)
+		return buildTrack(track.id, track.times, positions)
+
+	def transformBatch(self, batch):
+		""" Transform all tracks of a TrackBatch in one pass over its
+			concatenated positions, returns a new batch
+
+		"""
+		positions = self.transformPoints(batch.positions)
+		return TrackBatch(batch.ids, batch.offsets, batch.times, positions, dict(batch.metadata))
+
+	def transformTracks(self, tracks):
+		""" Transform a list of tracks in one pass over their concatenated
+			positions, returns new tracks with the original ids
+
+		"""
+		tracks = list(tracks)
+		if len(tracks) == 0:
+			return []
+
+		positions = [np.asarray(t.positions, dtype=np.float64).reshape(-1, 2) for t in tracks]
+		lengths = np.fromiter((len(p) for p in positions), dtype=np.intp, count=len(positions))
+		transformed = np.split(self.transformPoints(np.concatenate(positions)), np.cumsum(lengths)[:-1])
+
+		return [buildTrack(t.id, t.times, p) for t, p in zip(tracks, transformed)]
+
+	def transformImage(self, img):
+		for transform in self._transforms:
+			img = transform.transformImage(img)
+		return img
+
+	@property
+	def camera(self):
+		return self._camera
+
+	@property
+	def imgSize(self):
+		return self._imgSize
@@ -0,0 +1,84 @@
+import shutil
+import tempfile
+import unittest
+import numpy as np
+
+from context import lspiv_toolkit
+
+from cv_toolkit.transform.camera import UndistortionTransform
+from cv_toolkit.transform.common import PixelCoordinateTransform
+
+from lspiv_toolkit.storage.archive import TrackBatch, buildTrack
+from lspiv_toolkit.transform.camera import CameraTransform
+from lspiv_toolkit.transform.cache import CameraTransformCache
+
+class CalibratedCamera(object):
+	""" Fisheye calibration of a 1920x1080 action camera, as saved by
+		cv_toolkit
+
+	"""
+
+	def __init__(self):
+		self.imgSize = (1920, 1080)
+		self.camMatrix = np.array([[876.3, 0.0, 958.2], [0.0, 874.9, 541.7], [0.0, 0.0, 1.0]])
+		self.distCoeffs = np.array([0.0412, -0.0108, 0.0047, -0.0012])
+
+	def save(self, filename):
+		with open(filename, mode='w') as f:
+			f.write(f"{self.imgSize} {self.camMatrix.tolist()} {self.distCoeffs.tolist()}")
+
+def randomTracks(rng, numTracks, imgSize):
+	tracks = []
+	for i in range(numTracks):
+		length = int(rng.integers(1, 30))
+		times = np.cumsum(rng.uniform(0.01, 0.1, size=length))
+		positions = rng.uniform((0, 0), imgSize, size=(length, 2))
+		tracks.append(buildTrack(i * 3, times, positions))
+	return tracks
+
+def libraryTransform(camera, tracks):
+	""" Reference transform, each track through the cv_toolkit undistortion
+		and pixel coordinate transforms one at a time
+
+	"""
+	unTrans = UndistortionTransform(camera)
+	pxTrans = PixelCoordinateTransform(camera.imgSize)
+	return [pxTrans.transformTrack(unTrans.transformTrack(t)) for t in tracks]
+
+class CameraTransformTest(unittest.TestCase):
+
+	def setUp(self):
+		self.camera = CalibratedCamera()
+		self.tracks = randomTracks(np.random.default_rng(0), 200, self.camera.imgSize)
+		self.expected = libraryTransform(self.camera, self.tracks)
+
+	def assertTracksClose(self, tracks, expected, tolerance):
+		self.assertEqual([t.id for t in tracks], [t.id for t in self.tracks])
+		for t, e in zip(tracks, expected):
+			np.testing.assert_array_equal(np.asarray(t.times), np.asarray(e.times))
+			np.testing.assert_allclose(np.asarray(t.positions).reshape(-1, 2), np.asarray(e.positions).reshape(-1, 2), atol=tolerance)
+
+	def test_matches_library_transforms(self):
+		camTrans = CameraTransform(self.camera)
+		self.assertTracksClose(camTrans.transformTracks(self.tracks), self.expected, 1e-6)
+		self.assertTracksClose([camTrans.transformTrack(t) for t in self.tracks], self.expected, 1e-6)
+
+		batch = camTrans.transformBatch(TrackBatch.from_tracks(self.tracks))
+		self.assertTracksClose(batch.toTracks(), self.expected, 1e-6)
+
+		self.assertEqual(camTrans.transformTracks([]), [])
+
+	def test_cache_matches_library_transforms(self):
+		cacheDir = tempfile.mkdtemp()
+		try:
+			camTrans = CameraTransformCache(self.camera, cacheDir, tolerance=0.05)
+			self.assertTracksClose(camTrans.transformTracks(self.tracks), self.expected, 0.05)
+
+			# Tables loaded back from disk give the same result
+			cached = CameraTransformCache(self.camera, cacheDir, tolerance=0.05)
+			np.testing.assert_array_equal(cached._lookup, camTrans._lookup)
+		finally:
+			shutil.rmtree(cacheDir, ignore_errors=True)
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,136 @@
+import glob
+import json
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+
+from context import lspiv_toolkit
+
+from lspiv_toolkit.config import PipelineConfig
+from lspiv_toolkit.pipeline.lspiv import SlimPipeline
+from lspiv_toolkit.storage.reader import TrackReader
+
+from benchmarks.synthetic import SyntheticDataset
+
+numFrames = 120
+crashFrame = 80
+resumeFrame = 50
+
+def makePipeline(outputDir, storage, maxTracks, checkpointInterval=0., streamTracks=False):
+	config = PipelineConfig('synthetic', outputDir)
+	config.detectionGridDim = (20, 15)
+	config.maxCellFeatures = 20
+	config.borderBuffer = 10
+	config.minDisplacement = 20
+	config.consoleInterval = 0
+	config.trackFormat = 'archive'
+	config.trackStorage = storage
+	config.maxTracks = maxTracks
+	config.checkpointInterval = checkpointInterval
+	config.checkpointsKept = numFrames
+	config.streamTracks = streamTracks
+	config.streamChunkSize = 20
+	return SlimPipeline(config, SyntheticDataset((640, 360), numFrames))
+
+def trackKeys(tracks):
+	return sorted((t.id, tuple(np.round(np.asarray(t.times, dtype=np.float64), 6)),
+				tuple(np.round(np.asarray(t.positions, dtype=np.float64).ravel(), 3))) for t in tracks)
+
+class CheckpointResumeTest(unittest.TestCase):
+
+	def setUp(self):
+		self.tmpDir = tempfile.mkdtemp()
+
+	def tearDown(self):
+		shutil.rmtree(self.tmpDir, ignore_errors=True)
+
+	def interruptedRun(self, storage, maxTracks, streamTracks):
+		""" Run with a checkpoint after every frame, stop at crashFrame and
+			drop checkpoints after resumeFrame so output written after the
+			remaining checkpoint has to be discarded on resume
+
+		"""
+		pipeline = makePipeline(f"{self.tmpDir}/{storage}_{maxTracks}_resumed", storage, maxTracks, 1e-9, streamTracks)
+		pipeline._data = SyntheticDataset((640, 360), crashFrame)
+		pipeline.initialize()
+		pipeline.run()
+
+		for checkpoint in glob.glob(f"{pipeline.runDir}/checkpoints/checkpoint_*"):
+			if int(checkpoint.rsplit('_', 1)[-1]) > resumeFrame:
+				shutil.rmtree(checkpoint)
+
+		return pipeline.runDir
+
+	def assertResumeMatches(self, storage, maxTracks, streamTracks=False):
+		reference = makePipeline(f"{self.tmpDir}/{storage}_{maxTracks}_reference", storage, maxTracks, streamTracks=streamTracks)
+		reference.initialize()
+		reference.run()
+
+		runDir = self.interruptedRun(storage, maxTracks, streamTracks)
+		resumed = makePipeline(f"{self.tmpDir}/{storage}_{maxTracks}_resumed", storage, maxTracks, streamTracks=streamTracks)
+		resumed.resume(runDir)
+		self.assertEqual(resumed.frameIndex, resumeFrame)
+
+		# Pruned files written after the checkpoint were removed
+		checkpoint = SlimPipeline.latestCheckpoint(runDir)
+		with open(f"{checkpoint}/state.json", mode='r') as f:
+			state = json.load(f)
+		self.assertEqual(sorted(os.listdir(f"{runDir}/tracks/pruned")), state['prunedFiles'])
+
+		# Streamed tracks are already on disk, the checkpoint only ranks them by id
+		self.assertEqual(os.path.exists(f"{checkpoint}/historical.trk"), not streamTracks)
+
+		resumed.run()
+
+		self.assertEqual(resumed.frameIndex, reference.frameIndex)
+		self.assertEqual(resumed.trackDB.getNumPrunedTracks(), reference.trackDB.getNumPrunedTracks())
+		self.assertEqual(resumed.trackDB.getRejectionCounts(), reference.trackDB.getRejectionCounts())
+
+		# Historical tracks match including ids, the id counter is restored
+		referenceTracks = list(reference.trackDB.getHistoricalTracks())
+		resumedTracks = list(resumed.trackDB.getHistoricalTracks())
+		self.assertEqual(trackKeys(resumedTracks), trackKeys(referenceTracks))
+
+		# Pruned output matches, nothing from the discarded frames is left
+		referencePruned = sorted(os.listdir(f"{reference.runDir}/tracks/pruned"))
+		resumedPruned = sorted(os.listdir(f"{resumed.runDir}/tracks/pruned"))
+		self.assertEqual(len(resumedPruned), len(referencePruned))
+
+		return reference
+
+	def test_list_storage(self):
+		self.assertResumeMatches('list', 20000)
+
+	def test_list_storage_with_pruning(self):
+		reference = self.assertResumeMatches('list', 10)
+		self.assertGreater(reference.trackDB.getNumPrunedTracks(), 0)
+
+	def test_columnar_storage_with_pruning(self):
+		reference = self.assertResumeMatches('columnar', 10)
+		self.assertGreater(reference.trackDB.getNumPrunedTracks(), 0)
+
+	def test_list_storage_streamed(self):
+		reference = self.assertResumeMatches('list', 10, streamTracks=True)
+		self.assertGreater(reference.trackDB.getNumPrunedTracks(), 0)
+
+	def test_columnar_storage_streamed(self):
+		reference = self.assertResumeMatches('columnar', 10, streamTracks=True)
+		self.assertGreater(reference.trackDB.getNumPrunedTracks(), 0)
+
+	def test_streamed_raw_tracks_match(self):
+		# Streamed tracks pruned later are skipped when reading raw tracks
+		rawTracks = []
+		for streamTracks in (False, True):
+			pipeline = makePipeline(f"{self.tmpDir}/streamed_{streamTracks}", 'list', 10, streamTracks=streamTracks)
+			pipeline.initialize()
+			pipeline.run()
+			pipeline.saveTracks()
+			self.assertGreater(pipeline.trackDB.getNumPrunedTracks(), 0)
+			rawTracks.append(list(TrackReader(f"{pipeline.runDir}/tracks/raw")))
+
+		self.assertEqual(trackKeys(rawTracks[1]), trackKeys(rawTracks[0]))
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,112 @@
+import unittest
+import numpy as np
+
+from context import lspiv_toolkit
+
+from primitives.measurement import Measurement
+from primitives.grid import Grid
+
+from lspiv_toolkit.filtering.coverage import CoverageSelector
+from lspiv_toolkit.filtering.measurements import MeasurementDB, ArrayMeasurementDB
+
+imgSize = (400, 200)
+gridDim = (8, 4)
+binCapacity = 6
+
+def naiveGreedy(coverage, maxTracks=None):
+	""" Reference max coverage, recomputing the gain of every track at each
+		step and taking the lowest track id on ties. coverage maps track ids
+		to sets of cells
+
+	"""
+	covered = set()
+	selection = []
+	while maxTracks is None or len(selection) < maxTracks:
+		gain, tID = max(((len(coverage[tID] - covered), -tID) for tID in coverage), default=(0, 0))
+		if gain == 0:
+			break
+		selection.append((-tID, gain))
+		covered |= coverage[-tID]
+	return selection
+
+class CoverageSelectorTest(unittest.TestCase):
+
+	def setUp(self):
+		self.rng = np.random.default_rng(0)
+
+	def randomCoverage(self, numTracks, numCells):
+		trackIDs, cells = [], []
+		for tID in range(numTracks):
+			trackCells = self.rng.choice(numCells, size=self.rng.integers(1, 12), replace=False)
+			trackIDs.extend([tID * 7] * len(trackCells))
+			cells.extend(trackCells)
+		return np.asarray(trackIDs), np.asarray(cells)
+
+	def coverageSets(self, trackIDs, cells):
+		coverage = {}
+		for tID, cell in zip(trackIDs.tolist(), cells.tolist()):
+			coverage.setdefault(tID, set()).add(cell)
+		return coverage
+
+	def assertGreedy(self, selection, coverage):
+		""" Every chosen track has the largest gain over the tracks chosen
+			before it and its reported gain is its number of new cells
+
+		"""
+		covered = set()
+		for tID, gain in selection:
+			best = max(len(cells - covered) for cells in coverage.values())
+			self.assertEqual(gain, best)
+			self.assertEqual(len(coverage[tID] - covered), gain)
+			covered |= coverage[tID]
+		return covered
+
+	def test_matches_naive_greedy(self):
+		trackIDs, cells = self.randomCoverage(200, 150)
+		coverage = self.coverageSets(trackIDs, cells)
+
+		selector = CoverageSelector(trackIDs, cells)
+		selection = selector.select()
+
+		covered = self.assertGreedy(selection, coverage)
+		self.assertEqual(covered, set(cells.tolist()))
+		self.assertEqual(selection, naiveGreedy(coverage))
+
+	def test_budgets(self):
+		trackIDs, cells = self.randomCoverage(100, 80)
+		coverage = self.coverageSets(trackIDs, cells)
+		selector = CoverageSelector(trackIDs, cells)
+
+		self.assertEqual(selector.select(maxTracks=5), naiveGreedy(coverage, 5))
+
+		selection = selector.select(maxCells=30)
+		self.assertGreaterEqual(sum(gain for tID, gain in selection), 30)
+		self.assertLess(sum(gain for tID, gain in selection[:-1]), 30)
+
+	def test_measurements_per_cell(self):
+		points = self.rng.uniform(0, imgSize, size=(600, 2))
+		scores = self.rng.permutation(600).astype(float)
+		ids = self.rng.integers(0, 50, size=600)
+		measurements = [Measurement(p, np.zeros(2), s, int(i)) for p, s, i in zip(points, scores, ids)]
+
+		arrayDB = ArrayMeasurementDB(imgSize, gridDim, binCapacity, None)
+		databases = [MeasurementDB(Grid(*imgSize, *gridDim), binCapacity, None), arrayDB]
+		for mDB in databases:
+			mDB.addMeasurements(measurements)
+
+		binCells = arrayDB.binPoints(points)
+		for measurementsPerCell in (1, 2, binCapacity):
+			# Only the best measurementsPerCell measurements of a cell cover it
+			coverage = {}
+			for cell in np.unique(binCells):
+				inCell = sorted((m for m, c in zip(measurements, binCells) if c == cell), key=lambda m: m.score)
+				for m in inCell[:measurementsPerCell]:
+					coverage.setdefault(m.id, set()).add(int(cell))
+
+			for mDB in databases:
+				selection = CoverageSelector.from_measurement_db(mDB, measurementsPerCell).select()
+				self.assertEqual(len(self.assertGreedy(selection, coverage)), len(np.unique(binCells)))
+				self.assertEqual(selection, naiveGreedy(coverage))
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,129 @@
+import os
+import tempfile
+import unittest
+import numpy as np
+
+from context import lspiv_toolkit
+
+from field_toolkit.core.fields import VectorField
+from field_toolkit.analysis.drift import DriftAnalysis
+
+from lspiv_toolkit.analysis.drift import DriftEvaluator
+from lspiv_toolkit.analysis.integrate import LockstepDriftAnalysis
+from lspiv_toolkit.approx.fields import GPMeanField
+from lspiv_toolkit.approx.raster import RasterField
+from lspiv_toolkit.storage.archive import buildTrack
+
+# Lockstep and serial drift analysis only differ by round-off of vectorized field queries
+tolerance = {'rtol': 1e-9, 'atol': 1e-9}
+
+class RotationField(VectorField):
+	""" Analytic rotation about the centre of a 1000x500 image
+
+	"""
+
+	def __init__(self):
+		super().__init__([(0, 1000), (0, 500)])
+
+	def sampleAtPoints(self, points):
+		offsets = np.asarray(points, dtype=np.float64).reshape(-1, 2) - (500., 250.)
+		return np.column_stack((-offsets[:, 1], offsets[:, 0])) * 0.01
+
+	def sampleAtPoint(self, point):
+		return tuple(self.sampleAtPoints(point)[0])
+
+	def __getitem__(self, point):
+		return self.sampleAtPoint(point)
+
+class CountingField(VectorField):
+	""" Wraps a field and counts the queries made to it
+
+	"""
+
+	def __init__(self, field):
+		super().__init__([(0, 1000), (0, 500)])
+		self.field = field
+		self.numQueries = 0
+
+	def sampleAtPoints(self, points):
+		self.numQueries += 1
+		return self.field.sampleAtPoints(points)
+
+	def sampleAtPoint(self, point):
+		return tuple(self.sampleAtPoints(point)[0])
+
+	def __getitem__(self, point):
+		return self.sampleAtPoint(point)
+
+class FailingField(RotationField):
+
+	def sampleAtPoints(self, points):
+		raise RuntimeError("field query failed")
+
+def gpField(rng):
+	""" GP mean field through random weights at random support points
+
+	"""
+	points = rng.uniform((0, 0), (1000, 500), size=(300, 2))
+	alpha = rng.normal(size=(300, 2))
+	return GPMeanField(points, alpha, np.array([5., 0.]), np.eye(300), {'lengthScale': 80., 'signalVariance': 4.}, [(0, 1000), (0, 500)])
+
+def randomTracks(rng, numTracks):
+	tracks = []
+	for i in range(numTracks):
+		length = int(rng.integers(1, 40))
+		times = np.cumsum(rng.uniform(0.02, 0.1, size=length))
+		positions = rng.uniform((100, 50), (900, 450)) + np.cumsum(rng.normal(size=(length, 2)), axis=0)
+		tracks.append(buildTrack(i, times, positions))
+	return tracks
+
+class LockstepDriftAnalysisTest(unittest.TestCase):
+
+	def setUp(self):
+		self.rng = np.random.default_rng(0)
+		self.tracks = randomTracks(self.rng, 60)
+
+	def test_matches_drift_analysis(self):
+		for field in (RotationField(), gpField(self.rng)):
+			lockstepField, serialField = CountingField(field), CountingField(field)
+			batched = LockstepDriftAnalysis(lockstepField, maxParticles=25).evaluateBatch(self.tracks, mass=0.01)
+			serial = [DriftAnalysis(serialField).evaluate(t, mass=0.01) for t in self.tracks]
+
+			self.assertEqual(len(batched), len(self.tracks))
+			for (bTrack, bx, by, bErrors, bNormErrors), (sTrack, sx, sy, sErrors, sNormErrors) in zip(batched, serial):
+				np.testing.assert_allclose(np.asarray(bTrack.positions, dtype=np.float64), np.asarray(sTrack.positions, dtype=np.float64), **tolerance)
+				np.testing.assert_allclose(bErrors, sErrors, **tolerance)
+				np.testing.assert_allclose(bNormErrors, sNormErrors, **tolerance)
+
+			# Queries of all live particles are answered together
+			self.assertLess(lockstepField.numQueries, serialField.numQueries / 5)
+
+	def test_field_errors_are_raised(self):
+		with self.assertRaises(RuntimeError):
+			LockstepDriftAnalysis(FailingField()).evaluateBatch(self.tracks[:10])
+
+class DriftEvaluatorTest(unittest.TestCase):
+
+	def setUp(self):
+		self.tmpDir = tempfile.TemporaryDirectory()
+		self.fieldFile = os.path.join(self.tmpDir.name, 'field.npz')
+		RasterField.from_field(RotationField(), [0, 1000, 0, 500], gridDim=(40, 20)).save(self.fieldFile)
+		self.tracks = randomTracks(np.random.default_rng(1), 30)
+
+	def tearDown(self):
+		self.tmpDir.cleanup()
+
+	def test_pool_matches_in_process(self):
+		inProcess = DriftEvaluator(self.fieldFile, mass=0.01, numWorkers=1).evaluate(self.tracks)
+		pooled = DriftEvaluator(self.fieldFile, mass=0.01, numWorkers=2, method='lockstep').evaluate(self.tracks)
+
+		self.assertEqual(pooled.method, 'lockstep')
+		self.assertEqual(pooled.summary()['method'], 'lockstep')
+
+		self.assertEqual([r['id'] for r in pooled], [t.id for t in self.tracks])
+		for a, b in zip(inProcess.table(), pooled.table()):
+			self.assertEqual(a['id'], b['id'])
+			np.testing.assert_allclose([a[c] for c in inProcess.columns[1:]], [b[c] for c in pooled.columns[1:]], **tolerance)
+
+if __name__ == '__main__':
+	unittest.main()
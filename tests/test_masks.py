@@ -0,0 +1,41 @@
+import unittest
+import cv2
+import numpy as np
+
+from context import lspiv_toolkit
+
+from lspiv_toolkit.detect.masks import ExclusionMask
+
+class ExclusionMaskTest(unittest.TestCase):
+
+	def setUp(self):
+		rng = np.random.default_rng(0)
+		self.baseMask = np.full((120, 160), 255, dtype=np.uint8)
+		self.baseMask[:, :20] = 0
+
+		# Points inside the image and overlapping its edges
+		self.points = rng.uniform((-4, -4), (164, 124), size=(300, 2)).astype(np.float32)
+
+	def circleMask(self, points, radius):
+		""" Reference mask drawn with one cv2.circle per point
+
+		"""
+		mask = np.copy(self.baseMask)
+		for point in np.rint(points).astype(int):
+			cv2.circle(mask, tuple(int(c) for c in point), radius, 0, -1)
+		return mask
+
+	def test_matches_cv2_circles(self):
+		for radius in (1, 5, 9):
+			exclusionMask = ExclusionMask(self.baseMask, radius)
+			np.testing.assert_array_equal(exclusionMask.build(self.points), self.circleMask(self.points, radius))
+
+	def test_base_mask_is_restored(self):
+		exclusionMask = ExclusionMask(self.baseMask, 5)
+		exclusionMask.build(self.points)
+
+		np.testing.assert_array_equal(exclusionMask.build(np.empty((0, 2))), self.baseMask)
+		self.assertEqual(int(self.baseMask[60, 80]), 255)
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,79 @@
+import unittest
+import numpy as np
+
+from context import lspiv_toolkit
+
+from primitives.measurement import Measurement
+from primitives.grid import Grid
+
+from lspiv_toolkit.filtering.measurements import MeasurementDB, ArrayMeasurementDB
+
+imgSize = (1000, 500)
+gridDim = (10, 5)
+binCapacity = 8
+
+def randomMeasurements(rng, numMeasurements, numTracks=40):
+	points = rng.uniform(0, imgSize, size=(numMeasurements, 2))
+	vectors = rng.normal(size=(numMeasurements, 2))
+	scores = rng.permutation(numMeasurements) + rng.uniform(0, 1)
+	ids = rng.integers(0, numTracks, size=numMeasurements)
+	return [Measurement(p, v, float(s), int(i)) for p, v, s, i in zip(points, vectors, scores, ids)]
+
+def selectionKeys(measurements):
+	return sorted((m.id, m.score) for m in measurements)
+
+class MeasurementDBTest(unittest.TestCase):
+
+	def setUp(self):
+		self.rng = np.random.default_rng(0)
+		self.databases = [MeasurementDB(Grid(*imgSize, *gridDim), binCapacity, None),
+						ArrayMeasurementDB(imgSize, gridDim, binCapacity, None)]
+
+	def addAll(self, measurements):
+		for mDB in self.databases:
+			mDB.addMeasurements(measurements)
+
+	def test_bins_keep_lowest_scores(self):
+		measurements = randomMeasurements(self.rng, 2000)
+		self.addAll(measurements)
+
+		# Reference top k of each cell by brute force
+		arrayDB = self.databases[1]
+		cells = arrayDB.binPoints([m.point for m in measurements])
+		expected = []
+		for cell in np.unique(cells):
+			inCell = [m for m, c in zip(measurements, cells) if c == cell]
+			expected.extend(sorted(inCell, key=lambda m: m.score)[:binCapacity])
+
+		for mDB in self.databases:
+			self.assertEqual(selectionKeys(mDB.getMeasurements()), selectionKeys(expected))
+
+	def test_databases_select_same_measurements(self):
+		self.addAll(randomMeasurements(self.rng, 2000))
+
+		for measurementsPerCell in (1, 3, binCapacity):
+			selections = [selectionKeys(mDB.getMeasurements(measurementsPerCell)) for mDB in self.databases]
+			self.assertEqual(selections[0], selections[1])
+
+	def test_delta_tracks_selection_changes(self):
+		self.addAll(randomMeasurements(self.rng, 500))
+		for mDB in self.databases:
+			mDB.snapshot('test', 3)
+
+		for _ in range(3):
+			before = [set(map(id, mDB.getMeasurements(3))) for mDB in self.databases]
+			self.addAll(randomMeasurements(self.rng, 200))
+
+			for mDB, previous in zip(self.databases, before):
+				current = set(map(id, mDB.getMeasurements(3)))
+				added, removed = mDB.getMeasurementDelta('test', advance=True)
+
+				self.assertEqual(set(map(id, added)), current - previous)
+				self.assertEqual(set(map(id, removed)), previous - current)
+
+			# Advanced snapshot has no pending changes
+			for mDB in self.databases:
+				self.assertEqual(mDB.getMeasurementDelta('test'), ([], []))
+
+if __name__ == '__main__':
+	unittest.main()
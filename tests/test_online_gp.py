@@ -0,0 +1,75 @@
+import unittest
+import numpy as np
+
+from scipy.linalg import cholesky
+
+from context import lspiv_toolkit
+
+from primitives.measurement import Measurement
+
+from lspiv_toolkit.approx.online import OnlineGPApproximator, _cholUpdate
+
+def randomMeasurements(rng, numMeasurements, idOffset=0):
+	points = rng.uniform(0, 1000, size=(numMeasurements, 2))
+	vectors = rng.normal(1.0, 0.5, size=(numMeasurements, 2))
+	return [Measurement(p, v, 0.0, idOffset + i) for i, (p, v) in enumerate(zip(points, vectors))]
+
+class CholeskyUpdateTest(unittest.TestCase):
+
+	def setUp(self):
+		rng = np.random.default_rng(0)
+		A = rng.normal(size=(20, 20))
+		self.K = A @ A.T + 20 * np.eye(20)
+		self.x = rng.normal(size=20)
+
+	def test_rank_one_update(self):
+		L = cholesky(self.K, lower=True)
+		_cholUpdate(L, self.x)
+
+		np.testing.assert_allclose(L @ L.T, self.K + np.outer(self.x, self.x), atol=1e-10)
+		np.testing.assert_allclose(L, np.tril(L))
+
+	def test_delete_matches_factor_of_reduced_matrix(self):
+		gp = OnlineGPApproximator([0, 1000, 0, 1000])
+		gp._L = cholesky(self.K, lower=True)
+
+		rows = [0, 7, 19]
+		gp._delete(rows)
+
+		keep = np.setdiff1d(np.arange(20), rows)
+		np.testing.assert_allclose(gp._L, cholesky(self.K[np.ix_(keep, keep)], lower=True), atol=1e-10)
+
+class OnlineGPTest(unittest.TestCase):
+
+	def test_incremental_updates_match_fresh_fit(self):
+		rng = np.random.default_rng(1)
+		measurements = randomMeasurements(rng, 300)
+
+		gp = OnlineGPApproximator([0, 1000, 0, 1000], refitInterval=100, maxDeleteFraction=0.05)
+		gp.addMeasurements(measurements[:100])
+		for i in range(5):
+			gp.updateMeasurements(added=measurements[100+40*i:140+40*i], removed=measurements[3*i:3*i+3])
+
+		# No refit happened, every update went through the factor updates
+		self.assertEqual(gp._numUpdates, 5)
+
+		reference = OnlineGPApproximator([0, 1000, 0, 1000])
+		reference.addMeasurements(gp._measurements)
+
+		np.testing.assert_allclose(gp._mean, reference._mean, atol=1e-12)
+		np.testing.assert_allclose(gp._L, reference._L, atol=1e-10)
+		np.testing.assert_allclose(gp._alpha, reference._alpha, atol=1e-8)
+
+	def test_large_delete_refits(self):
+		rng = np.random.default_rng(2)
+		measurements = randomMeasurements(rng, 200)
+
+		gp = OnlineGPApproximator([0, 1000, 0, 1000], refitInterval=100, maxDeleteFraction=0.1)
+		gp.addMeasurements(measurements)
+		gp.updateMeasurements(added=measurements[:0], removed=measurements[:50])
+
+		self.assertEqual(gp._numUpdates, 0)
+		self.assertEqual(gp.numMeasurements, 150)
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,58 @@
+import unittest
+import numpy as np
+
+from context import lspiv_toolkit
+
+from lspiv_toolkit.filtering.tracks import TrackQualityFilter
+
+params = {'minAge': 1.55, 'minDisplacement': 100, 'minSpeed': 1, 'meanderingRatio': 0.9}
+
+def firstFailure(age, displacement, distance, speed):
+	""" Per track checks in the order of the original TrackDB loop
+
+	"""
+	if distance < 0.1:
+		return 'stationary'
+	if age < params['minAge']:
+		return 'age'
+	if displacement < params['minDisplacement']:
+		return 'displacement'
+	if speed < params['minSpeed']:
+		return 'speed'
+	if displacement / distance < params['meanderingRatio']:
+		return 'meandering'
+	return None
+
+class TrackQualityFilterTest(unittest.TestCase):
+
+	def setUp(self):
+		rng = np.random.default_rng(0)
+		numTracks = 2000
+
+		self.ages = rng.uniform(0, 4, numTracks)
+		self.distances = rng.uniform(0, 400, numTracks)
+		self.displacements = self.distances * rng.uniform(0.5, 1.0, numTracks)
+		self.speeds = self.distances / np.maximum(self.ages, 1e-3)
+
+		# Exercise the stationary and slow branches too
+		self.distances[:50] = rng.uniform(0, 0.1, 50)
+		self.displacements[:50] = self.distances[:50]
+		self.speeds[50:100] = rng.uniform(0, 1, 50)
+
+	def test_matches_per_track_checks(self):
+		accepted, rejections = TrackQualityFilter(**params).evaluate(self.ages, self.displacements, self.distances, self.speeds)
+
+		failures = [firstFailure(*stats) for stats in zip(self.ages, self.displacements, self.distances, self.speeds)]
+		np.testing.assert_array_equal(accepted, [f is None for f in failures])
+
+		for criterion in TrackQualityFilter.criteria:
+			self.assertEqual(rejections[criterion], failures.count(criterion))
+			self.assertGreater(rejections[criterion], 0)
+
+	def test_empty_input(self):
+		accepted, rejections = TrackQualityFilter(**params).evaluate([], [], [])
+		self.assertEqual(len(accepted), 0)
+		self.assertEqual(sum(rejections.values()), 0)
+
+if __name__ == '__main__':
+	unittest.main()
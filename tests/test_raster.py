@@ -0,0 +1,46 @@
+import os
+import tempfile
+import unittest
+import numpy as np
+
+from context import lspiv_toolkit
+
+from lspiv_toolkit.approx.raster import RasterField, loadField
+
+class WaveField(object):
+	""" Analytic field varying on a 100 pixel scale over a 1000x500 image
+
+	"""
+
+	def sampleAtPoints(self, points):
+		points = np.asarray(points, dtype=np.float64)
+		return np.column_stack((np.sin(points[:, 0] / 100.), np.cos(points[:, 1] / 100.)))
+
+class RasterFieldTest(unittest.TestCase):
+
+	bounds = [0, 1000, 0, 500]
+
+	def test_refines_until_within_tolerance(self):
+		raster = RasterField.from_field(WaveField(), self.bounds, gridDim=(10, 5), tolerance=0.01, maxRefinements=4)
+
+		self.assertLessEqual(raster.maxError, 0.01)
+		self.assertLessEqual(raster.checkError(WaveField())['maxError'], 0.01)
+
+	def test_raises_above_tolerance(self):
+		with self.assertRaises(ValueError):
+			RasterField.from_field(WaveField(), self.bounds, gridDim=(4, 2), tolerance=0.01, maxRefinements=1)
+
+	def test_file_round_trip(self):
+		raster = RasterField.from_field(WaveField(), self.bounds, gridDim=(40, 20))
+		points = np.random.default_rng(0).uniform((0, 0), (1000, 500), size=(100, 2))
+
+		with tempfile.TemporaryDirectory() as tmpDir:
+			filename = os.path.join(tmpDir, 'raster.npz')
+			raster.save(filename)
+			loaded = loadField(filename)
+
+		np.testing.assert_array_equal(loaded.sampleAtPoints(points), raster.sampleAtPoints(points))
+		self.assertEqual(loaded.maxError, raster.maxError)
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,104 @@
+import shutil
+import tempfile
+import unittest
+import cv2
+import numpy as np
+
+from context import lspiv_toolkit
+
+from lspiv_toolkit.config import PipelineConfig
+from lspiv_toolkit.detect.tiled import TiledGridDetector
+from lspiv_toolkit.pipeline.lspiv import SlimPipeline
+
+from benchmarks.synthetic import SyntheticDataset
+
+imgSize = (640, 360)
+gridDim = (40, 15)
+borderBuffer = 20
+params = {'maxCorners': 5, 'qualityLevel': 0.3, 'minDistance': 10., 'blockSize': 10}
+
+def cellDetections(img, mask):
+	""" Reference features from one goodFeaturesToTrack call per grid cell
+		on the full image with the mask restricted to the cell
+
+	"""
+	width, height = imgSize
+	xEdges = np.linspace(0, width, gridDim[0] + 1).astype(int)
+	yEdges = np.linspace(0, height, gridDim[1] + 1).astype(int)
+
+	points = []
+	for r in range(gridDim[1]):
+		for c in range(gridDim[0]):
+			cellMask = np.zeros_like(mask)
+			cellMask[yEdges[r]:yEdges[r+1], xEdges[c]:xEdges[c+1]] = mask[yEdges[r]:yEdges[r+1], xEdges[c]:xEdges[c+1]]
+			if not cellMask.any():
+				continue
+
+			corners = cv2.goodFeaturesToTrack(img, mask=cellMask, **params)
+			if corners is not None:
+				points.append(corners.reshape(-1, 2))
+
+	return np.concatenate(points)
+
+def pointSet(points):
+	return set(map(tuple, np.rint(points).astype(int).tolist()))
+
+class TiledGridDetectorTest(unittest.TestCase):
+
+	def setUp(self):
+		rng = np.random.default_rng(0)
+		width, height = imgSize
+		self.img = cv2.GaussianBlur((rng.random((height, width)) * 255).astype(np.uint8), (5, 5), 0)
+
+		self.borderMask = np.zeros((height, width), dtype=np.uint8)
+		self.borderMask[borderBuffer:height-borderBuffer, borderBuffer:width-borderBuffer] = 255
+
+		self.detector = TiledGridDetector(imgSize, gridDim, params, 100000, borderBuffer, numBands=4, numThreads=2)
+
+	def tearDown(self):
+		self.detector.close()
+
+	def test_matches_per_cell_detection(self):
+		points = self.detector.detect(self.img)
+		expected = cellDetections(self.img, self.borderMask)
+
+		self.assertEqual(len(points), len(expected))
+		self.assertEqual(pointSet(points), pointSet(expected))
+
+	def test_search_mask(self):
+		mask = np.full(self.img.shape, 255, dtype=np.uint8)
+		mask[100:200, 200:400] = 0
+
+		points = self.detector.detect(self.img, mask)
+		expected = cellDetections(self.img, cv2.bitwise_and(mask, self.borderMask))
+		self.assertEqual(pointSet(points), pointSet(expected))
+
+		inside = (points[:, 0] >= 200) & (points[:, 0] < 400) & (points[:, 1] >= 100) & (points[:, 1] < 200)
+		self.assertFalse(inside.any())
+
+	def test_close_releases_threads(self):
+		self.detector.detect(self.img)
+		self.detector.close()
+		self.assertIsNone(self.detector._executor)
+
+		# Detector can still be used after close
+		self.assertGreater(len(self.detector.detect(self.img)), 0)
+
+	def test_pipeline_closes_detector(self):
+		outputDir = tempfile.mkdtemp()
+		try:
+			config = PipelineConfig('synthetic', outputDir)
+			config.detectionGridDim = (20, 15)
+			config.detectionThreads = 2
+			config.consoleInterval = 0
+
+			pipeline = SlimPipeline(config, SyntheticDataset(imgSize, 10))
+			pipeline.initialize()
+			pipeline.run()
+
+			self.assertIsNone(pipeline._gd._executor)
+		finally:
+			shutil.rmtree(outputDir, ignore_errors=True)
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,54 @@
+import unittest
+import numpy as np
+
+from context import lspiv_toolkit
+
+import field_toolkit.approx as field_approx
+from primitives.measurement import Measurement
+
+from lspiv_toolkit.analysis.integrate import sampleField
+from lspiv_toolkit.approx.tiled import TiledGPApproximator
+
+bounds = [0, 1280, 0, 720]
+
+def channelMeasurements(rng, numMeasurements):
+	points = rng.uniform((0, 0), (1280, 720), size=(numMeasurements, 2))
+	speeds = 60.0 * (1.0 - ((points[:, 1] - 360.0) / 360.0)**2)
+	vectors = np.column_stack((speeds, np.zeros(numMeasurements))) + rng.normal(size=(numMeasurements, 2))
+	return [Measurement(p, v, float(i), i) for i, (p, v) in enumerate(zip(points, vectors))]
+
+class TiledGPApproximatorTest(unittest.TestCase):
+
+	def setUp(self):
+		self.rng = np.random.default_rng(0)
+		self.measurements = channelMeasurements(self.rng, 400)
+		self.queries = self.rng.uniform((0, 0), (1280, 720), size=(200, 2))
+
+	def test_single_tile_matches_approximator(self):
+		tiled = TiledGPApproximator(bounds, tileGridDim=(1, 1), numWorkers=1)
+		tiled.addMeasurements(self.measurements)
+
+		gp = field_approx.gp.GPApproximator()
+		gp.addMeasurements(self.measurements)
+
+		np.testing.assert_allclose(tiled.approximate().sampleAtPoints(self.queries),
+									sampleField(gp.approximate(), self.queries), rtol=1e-6, atol=1e-6)
+
+	def test_ramps_sum_to_one(self):
+		tiled = TiledGPApproximator(bounds, tileGridDim=(4, 2), tileOverlap=0.25, numWorkers=1)
+		tiled.addMeasurements(self.measurements)
+		field = tiled.approximate()
+
+		weights = np.array([field._tileWeights(self.queries, tile) for tile in field._tiles])
+		np.testing.assert_allclose(weights.sum(axis=0), 1.0)
+
+		# Half weight on the core edge between the first two tiles
+		edge = np.array([[320.0, 100.0]])
+		np.testing.assert_allclose([field._tileWeights(edge, field._tiles[i])[0] for i in (0, 1)], [0.5, 0.5])
+
+	def test_unknown_tile_method(self):
+		with self.assertRaises(ValueError):
+			TiledGPApproximator(bounds, tileMethod='exact')
+
+if __name__ == '__main__':
+	unittest.main()
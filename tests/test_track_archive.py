@@ -0,0 +1,124 @@
+import os
+import tempfile
+import unittest
+import numpy as np
+
+from context import lspiv_toolkit
+
+from lspiv_toolkit.storage.archive import TrackBatch, buildTrack
+from lspiv_toolkit.storage.reader import TrackReader
+from lspiv_toolkit.storage.writer import TrackWriter
+
+def randomTracks(rng, numTracks, idOffset=0):
+	tracks = []
+	for i in range(numTracks):
+		length = int(rng.integers(1, 30))
+		times = np.cumsum(rng.uniform(0.01, 0.1, size=length))
+		positions = rng.uniform(0, 1000, size=(length, 2))
+		tracks.append(buildTrack(idOffset + i, times, positions))
+	return tracks
+
+class TrackBatchTest(unittest.TestCase):
+
+	def setUp(self):
+		self.tracks = randomTracks(np.random.default_rng(0), 50)
+		self.batch = TrackBatch.from_tracks(self.tracks, {'source': 'test'})
+
+	def assertTracksEqual(self, tracks, expected):
+		self.assertEqual([t.id for t in tracks], [t.id for t in expected])
+		for t, e in zip(tracks, expected):
+			np.testing.assert_array_equal(np.asarray(t.times), np.asarray(e.times))
+			np.testing.assert_array_equal(np.asarray(t.positions).reshape(-1, 2), np.asarray(e.positions).reshape(-1, 2))
+
+	def test_tracks_round_trip(self):
+		self.assertEqual(len(self.batch), len(self.tracks))
+		self.assertTracksEqual(self.batch.toTracks(), self.tracks)
+
+	def test_file_round_trip(self):
+		with tempfile.TemporaryDirectory() as tmpDir:
+			filename = os.path.join(tmpDir, f"tracks{TrackBatch.extension}")
+			self.batch.save(filename)
+
+			for mmap in (True, False):
+				loaded = TrackBatch.from_file(filename, mmap=mmap)
+				self.assertEqual(loaded.metadata, {'source': 'test'})
+				np.testing.assert_array_equal(loaded.offsets, self.batch.offsets)
+				self.assertTracksEqual(loaded.toTracks(), self.tracks)
+				del loaded
+
+	def test_empty_round_trip(self):
+		with tempfile.TemporaryDirectory() as tmpDir:
+			filename = os.path.join(tmpDir, f"empty{TrackBatch.extension}")
+			TrackBatch.from_tracks([]).save(filename)
+			self.assertEqual(len(TrackBatch.from_file(filename)), 0)
+
+	def test_subset_and_concatenate(self):
+		indices = [3, 0, 41]
+		self.assertTracksEqual(self.batch.subset(indices).toTracks(), [self.tracks[i] for i in indices])
+
+		other = TrackBatch.from_tracks(randomTracks(np.random.default_rng(1), 5, idOffset=100))
+		combined = TrackBatch.concatenate([self.batch, other])
+		self.assertTracksEqual(combined.toTracks(), self.tracks + other.toTracks())
+		self.assertEqual(combined.getTrackByID(102).id, 102)
+
+class StreamedTrackReaderTest(unittest.TestCase):
+
+	def setUp(self):
+		self.tracks = randomTracks(np.random.default_rng(0), 60)
+		self.tmpDir = tempfile.TemporaryDirectory()
+		self.dir = self.tmpDir.name
+
+	def tearDown(self):
+		self.tmpDir.cleanup()
+
+	def test_pruned_tracks_are_skipped(self):
+		for trackFormat in ('json', 'archive'):
+			directory = f"{self.dir}/{trackFormat}"
+			with TrackWriter(directory, trackFormat, chunkSize=7) as writer:
+				writer.write(self.tracks[:40])
+				writer.prune([3, 17])
+				writer.write(self.tracks[40:])
+				writer.prune([])
+				writer.prune([41, 0])
+				self.assertEqual(writer.numPruneEvents, 2)
+
+			reader = TrackReader(directory)
+			expected = [t for t in self.tracks if t.id not in (0, 3, 17, 41)]
+			self.assertEqual(reader.ids, [t.id for t in expected])
+			self.assertNotIn(17, reader)
+			self.assertEqual([t.id for t in reader], [t.id for t in expected])
+
+	def test_refresh(self):
+		writer = TrackWriter(self.dir, 'archive', chunkSize=10).start()
+		writer.write(self.tracks[:20])
+		writer.flush()
+		reader = TrackReader(self.dir)
+		self.assertEqual(len(reader), 20)
+
+		writer.write(self.tracks[20:35])
+		writer.prune([5, 25])
+		writer.flush()
+		self.assertEqual(len(reader.refresh()), 33)
+		self.assertNotIn(5, reader)
+		self.assertEqual(reader[30].id, 30)
+		writer.close()
+
+		self.assertEqual(reader.ids, TrackReader(self.dir).ids)
+
+	def test_resumed_writer_drops_later_prune_events(self):
+		with TrackWriter(self.dir, 'archive', chunkSize=10) as writer:
+			writer.write(self.tracks[:30])
+			writer.prune([1])
+			writer.flush()
+			files = writer.files
+			writer.prune([2])
+
+		# Continue after the first prune event, the second is discarded
+		with TrackWriter(self.dir, 'archive', chunkSize=10, files=files, numPruneEvents=1) as writer:
+			writer.prune([4])
+
+		reader = TrackReader(self.dir)
+		self.assertEqual([tID for tID in range(5) if tID not in reader], [1, 4])
+
+if __name__ == '__main__':
+	unittest.main()